@@ -2,6 +2,9 @@
 """
 PTK engine launch file - used for launching engines.
 """
+import time
+t_start = time.time()       #for the startup trace
+
 import argparse
 
 parser = argparse.ArgumentParser(description='''Start a new PTK engine.''')
@@ -24,7 +27,16 @@ group.add_argument('-l','--listen', nargs=2,
 
 parser.add_argument('-f','--file', nargs=1, 
                     help='Execute file after starting')
+
+parser.add_argument('-p','--preload', nargs=1, metavar='MODULES',
+                    help='Comma separated list of modules to import before connecting')
+
+parser.add_argument('-s','--shared', nargs=1, metavar='PATH',
+                    help='Shared memory ring buffer file created by PTK for a local engine')
                     
+parser.add_argument('--startup-trace', nargs='?', const='-', metavar='FILE',
+                    help='Report the time taken by each startup phase and import up to the first prompt to FILE (default stderr)')
+
 parser.add_argument('-d','--debug', action='store_true', 
                     default=False, 
                     help='Enable debug log')
@@ -42,13 +54,25 @@ englabel = args.get('label',None)
 connect = args.get('connect',None)
 listen = args.get('listen',None)
 file = args.get('file', None )
+preload = args.get('preload', None)
+shared = args.get('shared', None)
 debug = args.get('debug', False)
+trace = args.get('startup_trace', None)
 
 #check if args has a connect/listen
 if (listen is None) and (connect is None):
     parser.print_help()
 else:
 
+    #time the startup phases and imports (eng_startup.mark does nothing if the
+    #trace is not running)
+    from ptk_lib.engine import eng_startup
+    if trace is not None:
+        if trace == '-':
+            trace = None
+        eng_startup.start(t_start, trace)
+        eng_startup.mark('Arguments parsed')
+
     #set up the debug log
     import ptk_lib.misc as misc
     if debug is True:
@@ -59,6 +83,7 @@ else:
         LOGLEVEL = misc.WARNING
     misc.setup_log(filename=LOGFILE, level=LOGLEVEL)
     del LOGFILE, LOGLEVEL, misc
+    eng_startup.mark('Log set up')
 
     #---------------------------------------------------------------------------
     import logging
@@ -91,10 +116,28 @@ else:
     else:
         raise Exception('Unknown engine type: '+str(engtype))
 
+    eng_startup.mark('Engine modules imported')
+
     #create the engine
     log.info('Creating engine process.')
     eng = Engine(englabel)
+    eng_startup.mark('Engine created')
+
+    #use the shared memory transport if launched locally by PTK
+    if shared is not None:
+        log.info('Opening shared memory ring: '+str(shared[0]))
+        eng.open_shared_ring(shared[0])
     
+    #import modules so they are ready when the engine is used (pooled engines)
+    if preload is not None:
+        for modname in preload[0].split(','):
+            log.info('Preloading module: '+modname)
+            try:
+                __import__(modname)
+            except:
+                log.exception('Could not preload module: '+modname)
+        eng_startup.mark('Modules preloaded')
+
     #connect to message bus
     if connect is not None:
         log.info('Connecting to messagebus'+str(connect) )
@@ -108,6 +151,7 @@ else:
 
     else:
         raise Exception('Need to specifiy -c [--connect] or -l [--listen]')
+    eng_startup.mark('Connected')
 
     #run a file
     if file is not None:
@@ -4,7 +4,8 @@ Namespace browser and Inspector.
 
 Features autocompletion of addresses fetched from the active engine.
 Use the EVT_ENGINE_ADDRESS to get address changes
-Automatically sends an EVT_ENGINE_ADDRESS when the engine state changes
+Automatically sends an EVT_ENGINE_ADDRESS when the engine state changes (the
+refresh is scheduled with the console tool's RefreshScheduler)
 to allow windows to refresh.
 
 The engine name and address can be found from the event as event.engname and 
@@ -24,6 +25,7 @@ import wx
 from wx.lib.newevent import NewEvent
 
 from ptk_lib.engine import eng_messages
+from ptk_lib.engine import eng_namespace
 from ptk_lib.message_bus import mb_protocol
 import console_messages
 
@@ -65,7 +67,16 @@ class AddressCtrl(wx.TextCtrl):
         self.msg_node.subscribe( eng_messages.ENGINE_STATE_CHANGE, 
                                  self.msg_eng_change)
         self.msg_node.subscribe( eng_messages.ENGINE_STATE_DONE, 
-                                 self.msg_eng_change)
+                                 self.msg_eng_done)
+        self.msg_node.subscribe( eng_messages.ENGINE_NAMESPACE_CHANGED, 
+                                 self.msg_ns_changed)
+
+        #engine state refreshes are debounced/batched by the console tool
+        self._refresh_name = 'AddressCtrl.%d'%id(self)
+        self.contool.refresher.add( self._refresh_name, self._OnRefresh,
+                                    visible=self.IsShownOnScreen,
+                                    queries=self._GetRefreshItems)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy)
 
     def __del__(self):
         self.msg_node.unsubscribe( console_messages.CONSOLE_SWITCHED, 
@@ -75,7 +86,9 @@ class AddressCtrl(wx.TextCtrl):
         self.msg_node.unsubscribe( eng_messages.ENGINE_STATE_CHANGE, 
                                  self.msg_eng_change)
         self.msg_node.unsubscribe( eng_messages.ENGINE_STATE_DONE, 
-                                 self.msg_eng_change)
+                                 self.msg_eng_done)
+        self.msg_node.unsubscribe( eng_messages.ENGINE_NAMESPACE_CHANGED, 
+                                 self.msg_ns_changed)
 
     #---Interfaces--------------------------------------------------------------
     def SetEngine(self,engname):
@@ -126,15 +139,7 @@ class AddressCtrl(wx.TextCtrl):
             self.memory[engname] = address
             return
 
-        #set address in text control, store the new address as current
-        self.dropdown.Hide()#hide autocomplete list
-        self.dropdown.UpdateAutoComps(address)
-        self.SetValue(address)
-        self.cur_add = address
-
-        #raise address event
-        evt = EvtEngineAddress(engname=self.cur_eng, address=address)
-        wx.PostEvent(self, evt)
+        self._SetCurrent(address)
 
     def GetAddress(self, engname=None):
         """
@@ -167,6 +172,43 @@ class AddressCtrl(wx.TextCtrl):
         self._autoupdate = flag
 
     #---internal methods--------------------------------------------------------
+    def _SetCurrent(self, address):
+        """
+        Set the (checked) address for the current engine and send an address
+        event.
+        """
+        #set address in text control, store the new address as current
+        self.dropdown.Hide()#hide autocomplete list
+        self.dropdown.UpdateAutoComps(address)
+        self.SetValue(address)
+        self.cur_add = address
+
+        #raise address event
+        evt = EvtEngineAddress(engname=self.cur_eng, address=address)
+        wx.PostEvent(self, evt)
+
+    def _GetRefreshItems(self, engname):
+        """
+        Batch items for a scheduled refresh - check the current address still
+        exists.
+        """
+        if (engname != self.cur_eng) or (self.cur_add == ''):
+            return None
+        return [('object_exists',(self.cur_add,))]
+
+    def _OnRefresh(self, engname, results):
+        """
+        Scheduled refresh callback, results is [exists] for the current address
+        if the check was batched.
+        """
+        if engname != self.cur_eng:
+            return
+        if (self.cur_add != '') and (results != [True]):
+            #not batched or the address no longer exists - check and fall back
+            self.RefreshAddress()
+            return
+        self._SetCurrent(self.cur_add)
+
     def _CheckAddress(self, engname, address):
         """
         Check an address. Returns True if ok, False if the address is invalid or
@@ -189,6 +231,12 @@ class AddressCtrl(wx.TextCtrl):
         address = self.GetValue()
         self.SetAddress(address)
 
+    def OnDestroy(self, event):
+        """Unregister the scheduled refresh"""
+        if event.GetEventObject() is self:
+            self.contool.refresher.remove(self._refresh_name)
+        event.Skip()
+
     #---message handlers--------------------------------------------------------
     def msg_con_switched(self,msg):
         """
@@ -220,12 +268,33 @@ class AddressCtrl(wx.TextCtrl):
 
     def msg_eng_change(self,msg):
         """
-        Message handler for Engine.State.Done / Engine.State.Changed.
+        Message handler for Engine.State.Changed.
         Refresh the dropdown list
         """
         if self._autoupdate is False:
             return
-        self.RefreshAddress()
+        self.contool.refresher.schedule(self._refresh_name, self.cur_eng)
+
+    def msg_eng_done(self,msg):
+        """
+        Message handler for Engine.State.Done.
+        Refresh if the debugger was enabled as the scope shown returns to the 
+        user namespace, otherwise changes are handled by msg_ns_changed.
+        """
+        debug, profile = msg.get_data()
+        if (self._autoupdate is False) or (debug is False):
+            return
+        self.contool.refresher.schedule(self._refresh_name, self.cur_eng)
+
+    def msg_ns_changed(self,msg):
+        """
+        Message handler for Engine.Namespace.Changed.
+        Refresh if the names changed affect the current address.
+        """
+        if (self._autoupdate is False) or (msg.get_from() != self.cur_eng):
+            return
+        if eng_namespace.affects(msg.get_data(), self.cur_add):
+            self.contool.refresher.schedule(self._refresh_name, self.cur_eng)
 
 
 
@@ -282,7 +351,7 @@ class AddressPopup(wx.PopupWindow):
         #use  get_auto_comps task to get possible names
         eng = self.Parent.contool.get_engine_console(self.Parent.cur_eng)
         if eng is not None:
-            items = eng.run_task('get_autocomps_names',(self.objname,))
+            items = eng.run_task(autocomps.get_autocomps_names,(self.objname,))
         else:
             items = []
             
@@ -702,7 +771,16 @@ class SimpleAddressCtrl(wx.TextCtrl):
         self.msg_node.subscribe( eng_messages.ENGINE_STATE_CHANGE,
                                  self.msg_eng_change)
         self.msg_node.subscribe( eng_messages.ENGINE_STATE_DONE, 
-                                 self.msg_eng_change)
+                                 self.msg_eng_done)
+        self.msg_node.subscribe( eng_messages.ENGINE_NAMESPACE_CHANGED, 
+                                 self.msg_ns_changed)
+
+        #engine state refreshes are debounced/batched by the console tool
+        self._refresh_name = 'AddressCtrl.%d'%id(self)
+        self.contool.refresher.add( self._refresh_name, self._OnRefresh,
+                                    visible=self.IsShownOnScreen,
+                                    queries=self._GetRefreshItems)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.OnDestroy)
 
     def __del__(self):
         self.msg_node.unsubscribe( console_messages.CONSOLE_SWITCHED, 
@@ -712,7 +790,9 @@ class SimpleAddressCtrl(wx.TextCtrl):
         self.msg_node.unsubscribe( eng_messages.ENGINE_STATE_CHANGE, 
                                  self.msg_eng_change)
         self.msg_node.unsubscribe( eng_messages.ENGINE_STATE_DONE, 
-                                 self.msg_eng_change)
+                                 self.msg_eng_done)
+        self.msg_node.unsubscribe( eng_messages.ENGINE_NAMESPACE_CHANGED, 
+                                 self.msg_ns_changed)
 
     #---Interfaces--------------------------------------------------------------
     def SetEngine(self,engname):
@@ -763,13 +843,7 @@ class SimpleAddressCtrl(wx.TextCtrl):
             self.memory[engname] = address
             return
 
-        #set address in text control, store the new address as current
-        self.SetValue(address)
-        self.cur_add = address
-
-        #raise address event
-        evt = EvtEngineAddress(engname=self.cur_eng, address=address)
-        wx.PostEvent(self, evt)
+        self._SetCurrent(address)
 
     def GetAddress(self, engname=None):
         """
@@ -802,6 +876,41 @@ class SimpleAddressCtrl(wx.TextCtrl):
         self._autoupdate = flag
 
     #---internal methods--------------------------------------------------------
+    def _SetCurrent(self, address):
+        """
+        Set the (checked) address for the current engine and send an address
+        event.
+        """
+        #set address in text control, store the new address as current
+        self.SetValue(address)
+        self.cur_add = address
+
+        #raise address event
+        evt = EvtEngineAddress(engname=self.cur_eng, address=address)
+        wx.PostEvent(self, evt)
+
+    def _GetRefreshItems(self, engname):
+        """
+        Batch items for a scheduled refresh - check the current address still
+        exists.
+        """
+        if (engname != self.cur_eng) or (self.cur_add == ''):
+            return None
+        return [('object_exists',(self.cur_add,))]
+
+    def _OnRefresh(self, engname, results):
+        """
+        Scheduled refresh callback, results is [exists] for the current address
+        if the check was batched.
+        """
+        if engname != self.cur_eng:
+            return
+        if (self.cur_add != '') and (results != [True]):
+            #not batched or the address no longer exists - check and fall back
+            self.RefreshAddress()
+            return
+        self._SetCurrent(self.cur_add)
+
     def _CheckAddress(self, engname, address):
         """
         Check an address. Returns True if ok, False if the address is invalid or
@@ -824,6 +933,12 @@ class SimpleAddressCtrl(wx.TextCtrl):
         address = self.GetValue()
         self.SetAddress(address)
 
+    def OnDestroy(self, event):
+        """Unregister the scheduled refresh"""
+        if event.GetEventObject() is self:
+            self.contool.refresher.remove(self._refresh_name)
+        event.Skip()
+
     #---message handlers--------------------------------------------------------
     def msg_con_switched(self,msg):
         """
@@ -854,12 +969,33 @@ class SimpleAddressCtrl(wx.TextCtrl):
 
     def msg_eng_change(self,msg):
         """
-        Message handler for Engine.State.Done / Engine.State.Changed.
+        Message handler for Engine.State.Changed.
         Refresh the dropdown list
         """
         if self._autoupdate is False:
             return
-        self.RefreshAddress()
+        self.contool.refresher.schedule(self._refresh_name, self.cur_eng)
+
+    def msg_eng_done(self,msg):
+        """
+        Message handler for Engine.State.Done.
+        Refresh if the debugger was enabled as the scope shown returns to the 
+        user namespace, otherwise changes are handled by msg_ns_changed.
+        """
+        debug, profile = msg.get_data()
+        if (self._autoupdate is False) or (debug is False):
+            return
+        self.contool.refresher.schedule(self._refresh_name, self.cur_eng)
+
+    def msg_ns_changed(self,msg):
+        """
+        Message handler for Engine.Namespace.Changed.
+        Refresh if the names changed affect the current address.
+        """
+        if (self._autoupdate is False) or (msg.get_from() != self.cur_eng):
+            return
+        if eng_namespace.affects(msg.get_data(), self.cur_add):
+            self.contool.refresher.schedule(self._refresh_name, self.cur_eng)
 
 
 #use simple address ctrl on mac
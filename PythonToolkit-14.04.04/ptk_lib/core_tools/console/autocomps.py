@@ -1,11 +1,16 @@
 """
 Console autocompletion popup, engine tasks and logic.
 """
+import logging
+log = logging.getLogger(__name__)
+
 import os
 import wx
 import wx.stc as stc #for test function
 from wx.lib.embeddedimage import PyEmbeddedImage
 
+from ptk_lib.engine.eng_tasks import cacheable
+
 from console_icons import autocomp_arg,autocomp_key, autocomp_folder, autocomp_file, autocomp_dbg
 #%%-----------------------------------------------------------------------------
 #Algorithm:
@@ -17,6 +22,9 @@ ETC_SEPS = ('\n', ',', ';', ':' ,
         '&', '|', '^', '~',
         '=', '<', '>' )
 ALL_SEPS = BRK_SEPS+ETC_SEPS+WHT_SEPS
+
+#time allowed for the autocomp engine tasks (seconds)
+AUTOCOMPS_TIMEOUT = 2.0
   
   
     
@@ -193,6 +201,7 @@ def scan_line(line):
 # Engine tasks
 #-------------------------------------------------------------------------------
 #Autocomp_names:
+@cacheable
 def get_autocomps_names(globals, locals, objname):
     """
     Engine task to get autocomplete names for the objname given.
@@ -436,6 +445,8 @@ class AutoComp(wx.PopupWindow):
         self.sep = '/'       #for path completions store the engine os.sep
         self.quote='"'       #and oepn string quotations
 
+        self.request = None  #outstanding autocomps request
+
 
         app = wx.GetApp()
         self.nsb = app.toolmgr.get_tool('NSBrowser')
@@ -494,7 +505,13 @@ class AutoComp(wx.PopupWindow):
                 
         #print self.mode
 
-        ##Get autocomps
+        ##Get autocomps - the requests are sent without blocking and the popup
+        ##is shown when the results arrive
+        #cancel any outstanding request
+        if self.request is not None:
+            self.request.cancel()
+            self.request = None
+
         #get string keys for object only (mode=0)
         if self.mode==0:
             if len(remainder)>0:
@@ -504,19 +521,21 @@ class AutoComp(wx.PopupWindow):
                     quote = remainder[0]
             else:
                 quote = '"'
-            items = self.Parent.run_task('get_autocomps_keys', (objname,quote))
+            reqs = [ self.Parent.run_task_async(get_autocomps_keys, 
+                                                (objname,quote),
+                                                timeout=AUTOCOMPS_TIMEOUT) ]
         
         #paths only
         elif self.mode==1:
-            items, quote, sep = self.Parent.run_task('get_autocomps_path',(remainder,) )
-            self.quote = quote
-            self.sep = sep
+            reqs = [ self.Parent.run_task_async(get_autocomps_path,
+                                                (remainder,),
+                                                timeout=AUTOCOMPS_TIMEOUT) ]
 
         #names only
         elif self.mode==2:
             #check if string is a number
             if number_check(remainder) is True:
-                items = []
+                reqs = []
             else:
                 parts = remainder.rsplit('.',1)
                 if len(parts)>1:
@@ -525,17 +544,23 @@ class AutoComp(wx.PopupWindow):
                     name_obj= ''
                     remainder = parts[0]
                     #get items
-                items = self.Parent.run_task('get_autocomps_names', (name_obj,))
+                reqs = [ self.Parent.run_task_async(get_autocomps_names, 
+                                                    (name_obj,),
+                                                    timeout=AUTOCOMPS_TIMEOUT) ]
 
         #names and args
         elif self.mode==3:
-            items = self.Parent.run_task('get_autocomps_args', (objname,))
+            reqs = [ self.Parent.run_task_async(get_autocomps_args, 
+                                                (objname,),
+                                                timeout=AUTOCOMPS_TIMEOUT) ]
             #top level names only
             #check if string is a number
             if number_check(remainder) is True:
                 pass
             else:
-                items = items + self.Parent.run_task('get_autocomps_names', ('',))
+                reqs.append( self.Parent.run_task_async(get_autocomps_names,
+                                                        ('',),
+                                                        timeout=AUTOCOMPS_TIMEOUT) )
             
         #names and string keys
         elif self.mode==4:
@@ -546,13 +571,44 @@ class AutoComp(wx.PopupWindow):
                     quote = remainder[0]
             else:
                 quote = '"'
-            items = self.Parent.run_task('get_autocomps_keys', (objname,quote))
+            reqs = [ self.Parent.run_task_async(get_autocomps_keys, 
+                                                (objname,quote),
+                                                timeout=AUTOCOMPS_TIMEOUT) ]
             #top level names only
             #check if string is a number
             if number_check(remainder) is True:
                 pass
             else:
-                items = items + self.Parent.run_task('get_autocomps_names', ('',))
+                reqs.append( self.Parent.run_task_async(get_autocomps_names,
+                                                        ('',),
+                                                        timeout=AUTOCOMPS_TIMEOUT) )
+
+        self.request = self.Parent.gather_async( reqs, 
+                    lambda req: self._OnAutoComps(req, line, remainder) )
+
+    def _OnAutoComps(self, req, line, remainder):
+        """
+        Called when the autocomp requests are complete
+        """
+        #check this is still the current request
+        if req is not self.request:
+            return
+        self.request = None
+        try:
+            results = req.result()
+        except:
+            log.exception('Error getting autocomps')
+            return
+
+        #combine the results
+        items = []
+        for res in results:
+            if self.mode==1:
+                #path completions also return the quote and os.sep
+                res, quote, sep = res
+                self.quote = quote
+                self.sep = sep
+            items = items + res
 
         #get debugger commands
         if (self.Parent.debugging is True):
@@ -790,6 +846,9 @@ class AutoComp(wx.PopupWindow):
         Hide the autocomp list
         """
         #print 'cancelled'
+        if self.request is not None:
+            self.request.cancel()
+            self.request = None
         self.Hide()
         
     #events
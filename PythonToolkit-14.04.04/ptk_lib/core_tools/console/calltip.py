@@ -158,6 +158,7 @@ class CallTip(wx.PopupWindow):
         self.SetSize( self._startsize )
         self.SetPosition(pos)
         self.string = string
+        self.request = None     #outstanding calltip request
 
         self.SetBackgroundColour((238,232,140))
 
@@ -262,9 +263,25 @@ class CallTip(wx.PopupWindow):
         if incall is False:
             return
             
-        #get the tip
-        tip = self.Parent.run_task('get_call_tip', (objname,))
-        
+        #get the tip without blocking, it is shown when the result arrives
+        if self.request is not None:
+            self.request.cancel()
+        self.request = self.Parent.run_task_async(get_call_tip, (objname,),
+                                            callback=self._OnCallTip)
+
+    def _OnCallTip(self, req):
+        """
+        Called when the calltip request is complete
+        """
+        #check this is still the current request
+        if req is not self.request:
+            return
+        self.request = None
+        try:
+            tip = req.result()
+        except:
+            tip = None
+
         #hide it
         self.Hide()
 
@@ -29,6 +29,7 @@ import console_icons
 import console_messages
 
 from console_dialogs import EngineChoiceDialog, RunExternalDialog, RunNewEngineDialog
+from resource_monitor import format_stats
 
 #--- Ids -----------------------------------------------------------------------
 ID_CUT = wx.NewId()
@@ -113,8 +114,10 @@ class ConsoleFrame(aui_addons.AUIFrame):
         ib.AddIcon(console_icons.console48.GetIcon())
         self.SetIcons(ib)
 
-        #create the status bar
-        self.CreateStatusBar()
+        #create the status bar - the second field shows the current engine's
+        #resource use
+        self.CreateStatusBar(2)
+        self.SetStatusWidths([-1, 320])
         self.SetStatusText("Python toolkit v"+VERSION)
 
         #create a droptarget
@@ -178,6 +181,9 @@ class ConsoleFrame(aui_addons.AUIFrame):
 
         self.tool.msg_node.subscribe(eng_messages.ENGINE_DEBUG_PAUSED, self.msg_debug_paused)
         self.tool.msg_node.subscribe(eng_messages.ENGINE_DEBUG_RESUMED, self.msg_debug_resumed)
+
+        #subscribe to the resource monitor stats
+        self.tool.msg_node.subscribe(console_messages.CONSOLE_ENGINE_STATS, self.msg_engine_stats)
     
     def _init_toolbars(self):
         ##create the main toolbar
@@ -312,6 +318,23 @@ class ConsoleFrame(aui_addons.AUIFrame):
             self.StatusBar.SetStatusText('Busy (debugging)...')
             self.StatusBar.Update()
 
+    def msg_engine_stats(self, msg):
+        stats, = msg.get_data()
+        self.UpdateEngineStats(stats)
+
+    def UpdateEngineStats(self, stats):
+        """
+        Show the resource use of the current engine in the status bar
+        """
+        cur_console = self.tool.get_current_engine()
+        if cur_console is None:
+            string = ''
+        elif cur_console.engine in stats:
+            string = format_stats(stats[cur_console.engine])
+        else:
+            string = ''
+        self.StatusBar.SetStatusText(string, 1)
+
     #---Event handlers----------------------------------------------------------
     def OnClose(self,event):
         """
@@ -364,6 +387,7 @@ class ConsoleFrame(aui_addons.AUIFrame):
         else:
             string = ''
         self.StatusBar.SetStatusText(string)
+        self.UpdateEngineStats(self.tool.monitor.stats)
         self.StatusBar.Update()
 
         #publish the console changed message
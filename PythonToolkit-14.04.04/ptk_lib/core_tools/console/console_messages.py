@@ -7,6 +7,11 @@ Console tool message definitions
 #Published when the active console is switched. data=()
 CONSOLE_SWITCHED = 'Console.Switched'
 
+#Published by the resource monitor after sampling the engine processes.
+#data=(stats,) where stats is a dictionary {engname: stats dict} (see
+#ResourceMonitor.get_stats)
+CONSOLE_ENGINE_STATS = 'Console.EngineStats'
+
 #-------------------------------------------------------------------------------
 # Addressed (to 'Console') message subjects
 #-------------------------------------------------------------------------------
@@ -9,6 +9,7 @@ import wx
 from ptk_lib import controls
 
 import console_dialogs
+from resource_monitor import ACTION_WARN, ACTION_STOP
 
 #-------------------------------------------------------------------------------
 class ConsoleSettingsPanel(wx.Panel):
@@ -38,6 +39,37 @@ class ConsoleSettingsPanel(wx.Panel):
         self.syntax = wx.CheckBox(self, -1, "Use syntax highlighting")
         dispsizer1.Add(self.syntax, 0, wx.EXPAND|wx.ALL, 10)
 
+        ##resource monitor settings
+        monbox = wx.StaticBox(self, -1, "Engine resource monitor:")
+        monbox.SetFont(boldfont)
+        monsizer = wx.StaticBoxSizer(monbox, wx.VERTICAL)
+        sizer.Add(monsizer,0,wx.EXPAND|wx.ALL,5)
+
+        #sample interval
+        intsizer = wx.BoxSizer(wx.HORIZONTAL)
+        label = wx.StaticText(self, -1, "Sample interval (s):")
+        intsizer.Add(label, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 5)
+        self.mon_interval = wx.SpinCtrl(self, -1, min=1, max=60, initial=2)
+        intsizer.Add(self.mon_interval, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 5)
+        monsizer.Add(intsizer, 0, wx.EXPAND)
+
+        #memory limit
+        limsizer = wx.BoxSizer(wx.HORIZONTAL)
+        label = wx.StaticText(self, -1, "Engine memory limit (MB, 0 for none):")
+        limsizer.Add(label, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 5)
+        self.mon_limit = wx.SpinCtrl(self, -1, min=0, max=1048576, initial=0)
+        limsizer.Add(self.mon_limit, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 5)
+        monsizer.Add(limsizer, 0, wx.EXPAND)
+
+        #action when over the limit
+        actsizer = wx.BoxSizer(wx.HORIZONTAL)
+        label = wx.StaticText(self, -1, "When an engine is over the limit:")
+        actsizer.Add(label, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 5)
+        self.mon_action = wx.Choice(self, -1, 
+                                choices=['Warn', 'Warn and stop running code'])
+        actsizer.Add(self.mon_action, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 5)
+        monsizer.Add(actsizer, 0, wx.EXPAND)
+
     def LoadSettings(self):
         """Load the settings from the config"""
         #get config object
@@ -61,6 +93,11 @@ class ConsoleSettingsPanel(wx.Panel):
         flag = cfg.ReadBool("use_syntax_highlight",True)
         self.syntax.SetValue(flag)
 
+        #resource monitor
+        self.mon_interval.SetValue( cfg.ReadInt("monitor_interval",2) )
+        self.mon_limit.SetValue( cfg.ReadInt("monitor_rss_limit",0) )
+        action = cfg.Read("monitor_rss_action",ACTION_WARN)
+        self.mon_action.SetSelection( int(action == ACTION_STOP) )
 
     def SaveSettings(self):
         """Save the settings to the config"""
@@ -85,6 +122,14 @@ class ConsoleSettingsPanel(wx.Panel):
         flag = self.syntax.GetValue()
         cfg.WriteBool("use_syntax_highlight",flag)
 
+        #resource monitor
+        cfg.WriteInt("monitor_interval", self.mon_interval.GetValue())
+        cfg.WriteInt("monitor_rss_limit", self.mon_limit.GetValue())
+        if self.mon_action.GetSelection() == 1:
+            cfg.Write("monitor_rss_action", ACTION_STOP)
+        else:
+            cfg.Write("monitor_rss_action", ACTION_WARN)
+
         cfg.Flush()
 
         #now update all open engine consoles stc
@@ -94,6 +139,9 @@ class ConsoleSettingsPanel(wx.Panel):
         for page in pages:
             page.LoadOptions()
 
+        #and the resource monitor
+        console.monitor.load_options()
+
 #-------------------------------------------------------------------------------
 class AutostartPanel(wx.Panel):
     def __init__(self,parent):
@@ -135,6 +183,33 @@ class AutostartPanel(wx.Panel):
         engsizer1.Add(self.englist,1,wx.EXPAND|wx.ALL,5)
         engsizer1.Add(engsizer2,0,wx.ALL,5)   
 
+        ##Engine pool options
+        poolbox = wx.StaticBox(self, -1, "Idle engine pool:")
+        poolbox.SetFont(boldfont)
+        poolsizer = wx.StaticBoxSizer(poolbox, wx.VERTICAL)
+        sizer.Add(poolsizer,0,wx.EXPAND|wx.ALL,5)
+
+        sizesizer = wx.BoxSizer(wx.HORIZONTAL)
+        label = wx.StaticText(self, -1, "Idle engines to keep ready per type:")
+        sizesizer.Add(label, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 5)
+        self.pool_size = wx.SpinCtrl(self, -1, min=0, max=8, initial=0)
+        sizesizer.Add(self.pool_size, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 5)
+        poolsizer.Add(sizesizer, 0, wx.EXPAND)
+
+        #engine types to pool (the internal engine cannot be pooled)
+        contool = wx.GetApp().toolmgr.get_tool('Console')
+        self.engtypes = contool.get_engine_types()
+        if 'Internal' in self.engtypes:
+            self.engtypes.remove('Internal')
+        self.pool_types = wx.CheckListBox(self, -1, choices=self.engtypes)
+        poolsizer.Add(self.pool_types, 0, wx.EXPAND|wx.ALL, 5)
+
+        label = wx.StaticText(self, -1, "Modules to import in pooled engines:")
+        poolsizer.Add(label, 0, wx.ALL, 5)
+        self.pool_modules = wx.TextCtrl(self, -1, "")
+        self.pool_modules.SetToolTipString('Module names separated by spaces or commas, e.g. numpy, scipy')
+        poolsizer.Add(self.pool_modules, 0, wx.EXPAND|wx.ALL, 5)
+
     def LoadSettings(self):
         """Load the settings from the config"""
         #get config object
@@ -153,6 +228,17 @@ class AutostartPanel(wx.Panel):
         for engname,engtype in self.engines:
             self.englist.Append((engname,engtype))
 
+        #engine pool
+        self.pool_size.SetValue( cfg.ReadInt("pool_size",0) )
+        s = cfg.Read("pool_types","")  #a list of engine types to pool
+        try:
+            engtypes = pickle.loads(str(s))
+        except:
+            engtypes = ['wxEngine']
+        for n,engtype in enumerate(self.engtypes):
+            self.pool_types.Check(n, engtype in engtypes)
+        self.pool_modules.SetValue( cfg.Read("pool_modules","") )
+
     def SaveSettings(self):
         """Save the settings to the config"""
         #get config object
@@ -162,8 +248,20 @@ class AutostartPanel(wx.Panel):
         #eng list
         s = pickle.dumps(self.engines)
         cfg.Write("auto_start_engines",s)  #a list of engine name,type tuples to autostart
+
+        #engine pool
+        cfg.WriteInt("pool_size", self.pool_size.GetValue())
+        engtypes = []
+        for n,engtype in enumerate(self.engtypes):
+            if self.pool_types.IsChecked(n):
+                engtypes.append(engtype)
+        cfg.Write("pool_types", pickle.dumps(engtypes))
+        cfg.Write("pool_modules", self.pool_modules.GetValue())
         cfg.Flush()    
 
+        #start/top up the pool with the new settings
+        wx.GetApp().toolmgr.get_tool('Console').fill_pool()
+
     #---events------------------------------------------------------------------
     def OnAddEng(self,event):
         names = []
@@ -253,6 +351,34 @@ class EnvironmentPanel(wx.Panel):
 
         sizer.Add(futsizer1,0,wx.EXPAND|wx.ALL,5)
 
+        #Engine output options
+        outbox = wx.StaticBox(self, -1, "Engine output:")
+        boldfont = outbox.GetFont()
+        boldfont.SetWeight(wx.BOLD)
+        outbox.SetFont(boldfont)
+
+        outsizer = wx.StaticBoxSizer(outbox, wx.VERTICAL)
+        intsizer = wx.BoxSizer(wx.HORIZONTAL)
+        label = wx.StaticText(self, -1, "Output flush interval (ms):")
+        intsizer.Add(label, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 10)
+        self.out_interval = wx.SpinCtrl(self, -1, min=0, max=1000, initial=50)
+        intsizer.Add(self.out_interval, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 10)
+        outsizer.Add(intsizer, 0, wx.EXPAND)
+
+        polsizer = wx.BoxSizer(wx.HORIZONTAL)
+        label = wx.StaticText(self, -1, "When the console falls behind:")
+        polsizer.Add(label, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 10)
+        self.out_policy = wx.Choice(self, -1, 
+                choices=['Wait for the console', 'Skip output'])
+        polsizer.Add(self.out_policy, 0, wx.ALIGN_CENTER_VERTICAL|wx.ALL, 10)
+        outsizer.Add(polsizer, 0, wx.EXPAND)
+
+        self.shared_memory = wx.CheckBox(self, -1, 
+                "Use shared memory for output from new external engines")
+        outsizer.Add(self.shared_memory, 0, wx.EXPAND|wx.ALL, 10)
+
+        sizer.Add(outsizer,0,wx.EXPAND|wx.ALL,5)
+
     def LoadSettings(self):
         """Load the settings from the config"""
         #get config object
@@ -275,6 +401,17 @@ class EnvironmentPanel(wx.Panel):
         flag = cfg.ReadBool("future_unicode",False)
         self.future_unicode.SetValue(flag)
 
+        #output flush interval
+        interval = cfg.ReadInt("output_interval",50)
+        self.out_interval.SetValue(interval)
+
+        #output flow control policy
+        policy = cfg.Read("output_policy","block")
+        self.out_policy.SetSelection( int(policy == 'drop') )
+
+        #shared memory transport
+        flag = cfg.ReadBool("shared_memory",True)
+        self.shared_memory.SetValue(flag)
 
     def SaveSettings(self):
         """Save the settings to the config"""
@@ -298,13 +435,28 @@ class EnvironmentPanel(wx.Panel):
         flag4 = self.future_unicode.GetValue()
         cfg.WriteBool("future_unicode",flag4)
 
+        #output flush interval
+        interval = self.out_interval.GetValue()
+        cfg.WriteInt("output_interval",interval)
+
+        #output flow control policy
+        policy = ['block', 'drop'][self.out_policy.GetSelection()]
+        cfg.Write("output_policy",policy)
+
+        #shared memory transport
+        flag = self.shared_memory.GetValue()
+        cfg.WriteBool("shared_memory",flag)
+
         #apply to open engines
         app = wx.GetApp()
         tool = app.toolmgr.get_tool('Console')
         engines = tool.get_engine_names()
         for engname in engines:
-            eng = tool.get_engine(engname)
+            eng = tool.get_engine_console(engname)
             eng.set_compiler_flag(__future__.CO_FUTURE_DIVISION, flag1)
             eng.set_compiler_flag(__future__.CO_FUTURE_PRINT_FUNCTION, flag3)
             eng.set_compiler_flag(__future__.CO_FUTURE_UNICODE_LITERALS, flag4)
 
+        for eng in tool.get_all_engines():
+            eng.run_task('set_output_options', (interval/1000.0,))
+
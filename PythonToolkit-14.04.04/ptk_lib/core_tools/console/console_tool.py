@@ -33,12 +33,14 @@ import sys                      #for launching external engines
 import pickle					#for reading startup options
 
 import wx
+import wx.aui as aui
 
 from ptk_lib.tool_manager import Tool
 from ptk_lib.message_bus.mb_node import MBLocalNode
 from ptk_lib.message_bus import mb_protocol
 from ptk_lib.engine import eng_messages
 from ptk_lib.engine import eng_misc
+from ptk_lib.engine import eng_shm
 from ptk_lib.engine.internal_engine import InternalEngine
 from ptk_lib.resources import common16
 
@@ -48,6 +50,8 @@ from console_settings import ConsoleSettingsPanel
 from console_settings import AutostartPanel, EnvironmentPanel
 import console_messages
 import console_icons
+from refresh import RefreshScheduler
+from resource_monitor import ResourceMonitor, EnginesPanel
 
 from engine_page import EnginePageBase, EngPageSTC
 from script_page import ScriptPage
@@ -88,9 +92,35 @@ class Console(Tool):
         #-----------------------------------------------------------------------
         # GUI parts
         #-----------------------------------------------------------------------
+        #scheduler for tool refreshes triggered by engine messages - created
+        #before the frame as panes register refreshes when they are created.
+        self.refresher = RefreshScheduler(self)
+
         #create the console frame
         self.frame = ConsoleFrame(self)
 
+        #engine resource monitor and the engines pane (sampling is started in
+        #msg_app_init)
+        self.monitor = ResourceMonitor(self)
+        self.engines_panel = EnginesPanel(self.frame, self)
+        pane = aui.AuiPaneInfo()
+        name='Engines'
+        pane.Name(name)
+        pane.Caption(name)
+        pane.Bottom()
+        pane.CloseButton(True)
+        pane.MaximizeButton(True)
+        pane.MinimizeButton(True)
+        pane.Floatable(True)
+        pane.BestSize( (600,150) )
+        pane.MinSize( (300,100) )
+        pane.DestroyOnClose(False)
+        self.frame.auimgr.AddPane(self.engines_panel, pane)
+        pane.Hide()
+        self.add_menu_item('tools', wx.NewId(), 'Engines', 
+                    'Open the Engines pane (engine CPU and memory use)', 
+                    self.on_show_engines)
+
         #Add taskbar menu item
         taskicon = self.toolmgr.get_tool('TaskIcon')
         bmp = console_icons.console16.GetBitmap()
@@ -123,6 +153,16 @@ class Console(Tool):
 
         #Dictionaries of active engines
         self.eng_processes = {} #(engid: subprocess process object}
+        self.eng_rings = {}     #{engid: shared memory ring file path}
+
+        #Pool of pre-started idle engines waiting to be handed out
+        self.pool_pending = {}  #{engid: engtype} launched but not connected
+        self.pool_idle = {}     #{engtype: [engid,...]} connected and idle
+
+        #helper engines started for engines' parallel maps (pmap), these have 
+        #no console and are closed when the requesting engine disconnects
+        self.helpers = {}       #{helper engid: requesting engid}
+        self.helpers_pending = set()    #launched but not connected
 
         #find which engines are available
         self.engtypes = []       #list of engtypes strings
@@ -149,6 +189,13 @@ class Console(Tool):
         self.frame.Show()
         self.frame.Raise()
 
+    def on_show_engines(self, event):
+        """wx event handler for tools menu item, shows the Engines pane"""
+        pane = self.frame.auimgr.GetPane('Engines')
+        pane.Show()
+        self.frame.auimgr.Update()
+        self.engines_panel.RefreshList(self.monitor.stats)
+
     def hide_console(self):
         """
         Hide the console frame
@@ -205,6 +252,9 @@ class Console(Tool):
         InternalEngine object or launching an external process which connects to
         the message bus). 
 
+        If an idle engine of the same type is waiting in the engine pool it is
+        handed out immediately instead and the pool is refilled.
+
         The EngineConsole is not created until the EngineNode has actually 
         connected (see msg_eng_connect).
         """
@@ -214,55 +264,172 @@ class Console(Tool):
         if engtype not in self.engtypes:
             raise Exception('Unknown/Unavailable engine type: '+str(engtype))
 
+        #use a pooled engine if one is ready
+        if (debug is False) and self.pool_idle.get(engtype, []):
+            engname = self.pool_idle[engtype].pop(0)
+            log.debug('Using pooled engine '+engname+', '+engtype)
+            con = self._create_console(engname, englabel)
+            self._setup_console(con)
+            if filepath is not None:
+                con.exec_file(filepath)
+            wx.CallAfter(self.fill_pool)
+            return
+
         #Now start the engine
         if engtype=='Internal':
-            self.internal = InternalEngine( userdict={}, doyield=wx.YieldIfNeeded)
+            #wait for user input in a nested event loop (wxPython 2.9.x 
+            #renamed the GUI event loop class)
+            eventloop = getattr(wx, 'GUIEventLoop', None)
+            if eventloop is None:
+                eventloop = wx.EventLoop
+            self.internal = InternalEngine( userdict={}, doyield=wx.YieldIfNeeded,
+                                            eventloop=eventloop, 
+                                            callafter=wx.CallAfter)
             port = str(self.msg_bus.server.get_port())
             self.internal.connect( 'localhost', port)
             engname = 'Engine.'+str(os.getpid())
         else:
+            engname = self._launch_engine(engtype, englabel, filepath, debug)
 
-            #check the message bus has a server running
-            if self.msg_bus.has_server() is False:
-                self.msg_bus.start_server()
-
-            port = str(self.msg_bus.server.get_port())
-
-            #construct args
-            args = [PTKengine_PATH , engtype[:-6]]
-    
-            #add label
-            if englabel is not None:
-                args.append(englabel)
- 
-            #add connect args
-            args.extend(['-c','localhost',port])
-    
-            #add optional file arg
-            if filepath is not None:
-                log.debug('filepath:'+filepath)
-                args.extend( ['-f', filepath] )
-
-            #add debug mode
-            if debug is True:
-                args.append('-d')
-
-            #need to add the python executable for windows
-            if sys.platform=='win32':
-               args = [sys.executable]+args
-            
-            #launch process
-            #todo: get pipes for stderr/stdout 
-            # to push c stdIO to the console after each command.
-            log.debug('Launch args: '+str(args) )
-            process = subprocess.Popen(args,shell=False)
-
-            #store process in dictionary to clear up when the engine ends
-            engname = 'Engine.'+str(process.pid)
+        log.debug('Engine launched '+engname+', '+engtype)
 
-            self.eng_processes[engname] = process
+    def fill_pool(self):
+        """
+        Launch engines in the background until the engine pool holds the 
+        number of idle engines set in the config for each pooled engine type.
+        """
+        cfg = self.app.GetConfig()
+        cfg.SetPath("Console//")
+        size = cfg.ReadInt("pool_size",0)
+        s = cfg.Read("pool_types","")   #a list of engine types to pool
+        try:
+            engtypes = pickle.loads(str(s))
+        except:
+            engtypes = ['wxEngine']
+        modules = cfg.Read("pool_modules","").replace(',',' ').split()
+
+        for engtype in engtypes:
+            #the internal engine is part of this process so cannot be pooled
+            if (engtype not in self.engtypes) or (engtype=='Internal'):
+                continue
+            n = len(self.pool_idle.get(engtype, []))
+            n = n + self.pool_pending.values().count(engtype)
+            while n < size:
+                engname = self._launch_engine(engtype, None, preload=modules)
+                self.pool_pending[engname] = engtype
+                log.debug('Pooled engine launched '+engname+', '+engtype)
+                n = n + 1
+
+    def _launch_engine(self, engtype, englabel, filepath=None, debug=False, 
+                        preload=None):
+        """
+        Launch an external engine process and return the engine name.
+            preload - list of module names for the engine to import before it
+                      connects.
+        """
+        #check the message bus has a server running
+        if self.msg_bus.has_server() is False:
+            self.msg_bus.start_server()
+
+        port = str(self.msg_bus.server.get_port())
+
+        #construct args
+        args = [PTKengine_PATH , engtype[:-6]]
+
+        #add label
+        if englabel is not None:
+            args.append(englabel)
+
+        #add connect args
+        args.extend(['-c','localhost',port])
+
+        #add optional file arg
+        if filepath is not None:
+            log.debug('filepath:'+filepath)
+            args.extend( ['-f', filepath] )
+
+        #add modules to import
+        if preload:
+            args.extend( ['-p', ','.join(preload)] )
+
+        #add debug mode
+        if debug is True:
+            args.append('-d')
+
+        #add shared memory ring for output/results (the engine always runs
+        #on this machine)
+        cfg = self.app.GetConfig()
+        cfg.SetPath("Console//")
+        ring = None
+        if cfg.ReadBool("shared_memory",True) is True:
+            try:
+                ring = eng_shm.SharedRing.create()
+                ring.close()
+                args.extend( ['-s', ring.path] )
+            except:
+                log.exception('Could not create shared memory ring')
+                ring = None
+
+        #need to add the python executable for windows
+        if sys.platform=='win32':
+           args = [sys.executable]+args
+        
+        #launch process
+        #todo: get pipes for stderr/stdout 
+        # to push c stdIO to the console after each command.
+        log.debug('Launch args: '+str(args) )
+        process = subprocess.Popen(args,shell=False)
+
+        #store process in dictionary to clear up when the engine ends
+        engname = 'Engine.'+str(process.pid)
+
+        self.eng_processes[engname] = process
+        if ring is not None:
+            self.eng_rings[engname] = ring
+        return engname
+
+    def start_helpers(self, engname, n):
+        """
+        Start n helper engines (pyEngines without a console) for the parallel
+        maps run by the engine given. Idle pooled engines are used first. 
+        Returns the list of helper engine names, the requesting engine is sent
+        an ENG_HELPER_READY message when each has connected.
+        """
+        if 'pyEngine' not in self.engtypes:
+            raise Exception('pyEngine is not available to use as a helper')
+
+        names = []
+        ready = []
+        for i in range(0,n):
+            if self.pool_idle.get('pyEngine', []):
+                helper = self.pool_idle['pyEngine'].pop(0)
+                ready.append(helper)
+            else:
+                helper = self._launch_engine('pyEngine', 'pmap helper')
+                self.helpers_pending.add(helper)
+            self.helpers[helper] = engname
+            names.append(helper)
+            log.debug('Helper engine '+helper+' for '+engname)
+
+        #announce the connected helpers after the reply
+        for helper in ready:
+            wx.CallAfter(self._helper_ready, helper)
+        if ready:
+            wx.CallAfter(self.fill_pool)
+        return names
 
-        log.debug('Engine launched '+engname+', '+engtype)
+    def _helper_ready(self, helper):
+        """
+        Tell the requesting engine the helper engine has connected.
+        """
+        engname = self.helpers.get(helper, None)
+        if engname is None:
+            return
+        try:
+            self.msg_node.send_msg(engname, eng_messages.ENG_HELPER_READY, 
+                                    (helper,))
+        except:
+            log.exception('Could not send helper ready: '+helper)
 
     def close_engine(self, engname):
         """
@@ -483,6 +650,12 @@ class Console(Tool):
             log.info('Auto starting engine '+str(englabel)) 
             eng = self.start_engine(engtype, englabel)
 
+        #start the idle engine pool
+        self.fill_pool()
+
+        #start sampling the engine resources
+        self.monitor.load_options()
+
         #load the main window layouts (in aui mixin class)
         self.frame.LoadLayouts()
 
@@ -494,6 +667,9 @@ class Console(Tool):
         #save the main window layouts (in aui mixin class)
         self.frame.SaveLayouts()
 
+        #stop sampling the engine resources
+        self.monitor.stop()
+
         #Engines are closed automatically by the message_bus closing all 
         #connections, this avoids processing any unecessary messages when the
         #program is about to exit anyway
@@ -506,6 +682,19 @@ class Console(Tool):
         """
         nodename, = msg.get_data()
         log.info(   'New engine connected: '+nodename) 
+
+        ##pooled engines wait idle without a console until handed out
+        engtype = self.pool_pending.pop(nodename, None)
+        if engtype is not None:
+            self.pool_idle.setdefault(engtype, []).append(nodename)
+            log.info('Engine added to pool: '+nodename)
+            return
+
+        ##helper engines for parallel maps have no console
+        if nodename in self.helpers_pending:
+            self.helpers_pending.discard(nodename)
+            self._helper_ready(nodename)
+            return
                 
         ##check if a console exists for this engine and create a new console as 
         ##necessary
@@ -513,18 +702,31 @@ class Console(Tool):
         if con is None:
             #No console exists for this engine (if one did it would take control
             #automagically. Need to create a new console.
-            engnode = nodename
-            
-            #create a new console for this engine
-            con = EngPageSTC(self.frame.book)
-            self.frame.AddConsole(con, engnode)
-            
-            #set it to manage the new engine
-            con.set_managed_engine(engnode)
-            #wx.YieldIfNeeded()
+            con = self._create_console(nodename)
 
         ##finally do other startup tasks
-        #set up engine environment
+        self._setup_console(con)
+
+    def _create_console(self, engnode, englabel=None):
+        """
+        Create a new engine console page to manage the engine node given.
+        englabel - label to use instead of the engine's own label.
+        """
+        con = EngPageSTC(self.frame.book)
+        self.frame.AddConsole(con, engnode)
+        
+        #set it to manage the new engine
+        con.set_managed_engine(engnode)
+        #wx.YieldIfNeeded()
+
+        if englabel is not None:
+            con.set_label(englabel)
+        return con
+
+    def _setup_console(self, con):
+        """
+        Set up the engine environment for a new engine console.
+        """
         #execute startup script if option selected
         cfg = self.app.GetConfig()
         cfg.SetPath("EngineManager//")
@@ -536,6 +738,12 @@ class Console(Tool):
         #add builtin commands
         con.add_builtin(ptk_help, 'ptk_help')
         con.add_builtin(clear, 'clear')
+        con.add_builtin(job, 'job')
+        con.add_builtin(jobs, 'jobs')
+        con.add_builtin(job_result, 'job_result')
+        con.add_builtin(job_output, 'job_output')
+        con.add_builtin(job_stop, 'job_stop')
+        con.add_builtin(pmap, 'pmap')
 
         #set compiler flags
         flag = cfg.ReadBool("future_div",False)
@@ -546,6 +754,12 @@ class Console(Tool):
         con.set_compiler_flag(__future__.CO_FUTURE_PRINT_FUNCTION,flag)
         flag = cfg.ReadBool("future_unicode",False)
         con.set_compiler_flag(__future__.CO_FUTURE_UNICODE_LITERALS,flag)
+
+        #set the engine output buffer flush interval and flow control policy
+        cfg.SetPath("Console//")
+        interval = cfg.ReadInt("output_interval",50)
+        con.run_task('set_output_options', (interval/1000.0,))
+        con.set_output_policy( cfg.Read("output_policy","block") )
         
         #set the new engine console as current
         self.frame.SetCurrentConsole(con)
@@ -561,10 +775,33 @@ class Console(Tool):
         if nodename == 'Engine.Internal':
            self.internal = None
 
+        #remove from the engine pool if it was waiting there
+        self.pool_pending.pop(nodename, None)
+        for engs in self.pool_idle.values():
+            if nodename in engs:
+                engs.remove(nodename)
+
+        #close the helper engines of a disconnected engine
+        self.helpers_pending.discard(nodename)
+        self.helpers.pop(nodename, None)
+        for helper, engname in self.helpers.items():
+            if engname == nodename:
+                self.helpers.pop(helper)
+                self.helpers_pending.discard(helper)
+                try:
+                    self.close_engine(helper)
+                except:
+                    log.debug('Helper engine already closed: '+helper)
+
         #check if this was started by the Console tool and remove/comunicate 
         #with its process object to prevent orphaned processes.
         process = self.eng_processes.pop(nodename,None)
 
+        #remove the shared memory ring file if the console did not
+        ring = self.eng_rings.pop(nodename, None)
+        if ring is not None:
+            ring.unlink()
+
         if process is not None:
             #todo: start process with a pipe then read stdout/stderr and
             #print this to console here.
@@ -611,3 +848,79 @@ def clear():
     from __main__ import _engine
     _engine.send_msg(_engine.console, 'Con.Clear',())
 
+#-------------------------------------------------------------------------------
+#Background jobs (see ptk_lib.engine.eng_jobs)
+def job(command, *args, **kwargs):
+    """
+    Run a command in a background job so the engine stays interactive, returns
+    the job id. command is a source string (statement or expression) to run in
+    the user namespace or a callable to call with the arguments given.
+
+    Output from the job is captured (see job_output) and the result is kept
+    until retrieved with job_result. The engine uses a separate thread for the
+    job so use this for commands that wait on files/networks or release the GIL.
+    """
+    from __main__ import _engine
+    return _engine.jobs.start(command, args, kwargs)
+
+def jobs():
+    """
+    Print the background job table
+    """
+    from __main__ import _engine
+    table = _engine.jobs.get_table()
+    if table == []:
+        print 'No jobs'
+        return
+    print '%4s  %-8s %10s %10s  %s'%('id', 'state', 'elapsed', 'output', 'command')
+    for info in table:
+        print '%4d  %-8s %9.1fs %8d ch  %s'%(info['id'], info['state'],
+                info['elapsed'], info['output'], info['description'][:60])
+
+def job_result(jobid):
+    """
+    Return the result of a finished background job (None for statements) and
+    remove it from the job table. An exception is raised if the job is running,
+    failed or was stopped.
+    """
+    from __main__ import _engine
+    return _engine.jobs.get_result(jobid)
+
+def job_output(jobid):
+    """
+    Print the output captured from a background job
+    """
+    import sys
+    from __main__ import _engine
+    for stderr, string in _engine.jobs.get_job(jobid).get_output():
+        if stderr is True:
+            sys.stderr.write(string)
+        else:
+            sys.stdout.write(string)
+
+def job_stop(jobid):
+    """
+    Stop a running background job
+    """
+    from __main__ import _engine
+    return _engine.jobs.stop(jobid)
+
+#-------------------------------------------------------------------------------
+#Parallel map (see ptk_lib.engine.eng_pmap)
+def pmap(func, iterable, **kwargs):
+    """
+    Map the function over the items in parallel using helper engines, returns
+    the list of results in the order of the items. Keyword arguments:
+        nengines    -   number of helper engines (default: number of cpus)
+        chunksize   -   number of items sent to a helper at a time (default:
+                        about four chunks per helper)
+        progress    -   write the progress to the console (default: True)
+
+    The helper engines are started on first use and kept for later calls. The
+    function is sent as its code so it must not use closures or names from the
+    user namespace other than modules; the items and results must be picklable.
+    The first exception raised by the function is raised as a RemoteError with
+    the remote traceback.
+    """
+    from __main__ import _engine
+    return _engine.helpers.map(func, iterable, **kwargs)
@@ -65,6 +65,10 @@ ID_RENAME = wx.NewId()
 ID_DEBUG = wx.NewId()
 ID_PROFILE = wx.NewId()
 
+#maximum number of characters of queued engine output to write before letting
+#the gui process other events
+OUTPUT_CHUNK = 32768
+
 #-------------------------------------------------------------------------------
 # ConsolePage base class for PTK engines
 #   -   split from STC class to allow new console developement
@@ -87,7 +91,21 @@ class EnginePageBase(ConsolePage, Console):
 
         #Command history - cmdhistory is provided by the command history tool
         self._hist = wx.GetApp().toolmgr.get_tool('CmdHistory')
+
+        #helper engines for the engine's parallel maps
+        self.set_handler( eng_messages.CON_START_HELPERS, 
+                            self.msg_start_helpers)
     
+    #---message handlers--------------------------------------------------------
+    def msg_start_helpers(self, msg):
+        """
+        Message handler for CON_START_HELPERS - the engine needs helper engines
+        for a parallel map.
+        """
+        n, = msg.get_data()
+        contool = wx.GetApp().toolmgr.get_tool('Console')
+        return contool.start_helpers(self.engine, n)
+
     #---overloaded console methods----------------------------------------------
     def manage(self):
         """
@@ -113,13 +131,6 @@ class EnginePageBase(ConsolePage, Console):
         n = self.Parent.GetPageIndex(self)
         self.Parent.SetPageBitmap(n, self.engicon)
         
-        #register console engtasks with the engine
-        self.register_task( calltip.get_call_tip)
-        self.register_task( autocomps.get_autocomps_names)
-        self.register_task( autocomps.get_autocomps_keys)
-        self.register_task( autocomps.get_autocomps_args)
-        self.register_task( autocomps.get_autocomps_path)
-
         return res
 
     def release_engine(self):
@@ -154,6 +165,34 @@ class EnginePageBase(ConsolePage, Console):
         self.Parent.SetPageText(n,label)
         #set a dead bitmap???
 
+    def schedule_output(self):
+        """
+        Overloaded to write the queued engine output in chunks after other 
+        pending gui events.
+        """
+        wx.CallAfter(self._OnWriteOutput)
+
+    def _OnWriteOutput(self):
+        #page may have been closed
+        if not self:
+            return
+        self.write_output(OUTPUT_CHUNK)
+
+    def schedule_timeout(self, req, delay):
+        """
+        Overloaded to expire requests the engine has not replied to using a wx
+        timer.
+        """
+        wx.CallLater(int(delay*1000), req.expire)
+
+    def set_label(self, englabel):
+        """
+        Set the engine label displayed in the page tab.
+        """
+        self.englabel = englabel
+        n = self.Parent.GetPageIndex(self)
+        self.Parent.SetPageText(n,self.englabel[-30:])
+
     #---Console Page methods----------------------------------------------------
     def OnPageClear(self):
         self.clear()
@@ -259,6 +298,47 @@ class EnginePageBase(ConsolePage, Console):
                 
         menu.AppendSeparator()
 
+        #output flow control policy for this engine
+        skip_item = wx.MenuItem( menu, -1 ,'Skip output when behind', 
+                'Skip engine output the console cannot keep up with instead of waiting',
+                            wx.ITEM_CHECK)
+        menu.AppendItem(skip_item)
+        skip_item.Check(self.output_policy == 'drop')
+        menu.Bind(wx.EVT_MENU, self.OnMenuSkipOutput, skip_item)
+        if (self.engtype is None) or (self.busy is True):
+            menu.Enable(skip_item.GetId(), False)
+
+        #clone engine - forks the engine process (py engines only)
+        clone_item = wx.MenuItem( menu, -1 ,'Clone engine', 
+                           'Create a new engine with a copy of this engine\'s namespace',
+                            wx.ITEM_NORMAL)
+        menu.AppendItem(clone_item)
+        menu.Bind(wx.EVT_MENU, self.OnMenuClone, clone_item)
+        if (self.engtype != 'PTK.py') or (self.busy is True):
+            menu.Enable(clone_item.GetId(), False)
+
+        #new namespace engine in this engine's process (py engines only)
+        ns_item = wx.MenuItem( menu, -1 ,'New namespace engine', 
+                           'Create a new engine with its own namespace in this engine\'s process',
+                            wx.ITEM_NORMAL)
+        menu.AppendItem(ns_item)
+        menu.Bind(wx.EVT_MENU, self.OnMenuNewNamespace, ns_item)
+        if self.engtype not in ['PTK.py', 'PTK.ns']:
+            menu.Enable(ns_item.GetId(), False)
+
+        #background jobs
+        job_item = wx.MenuItem( menu, -1 ,'Run in background...', 
+                           'Run a command in a background job while the engine stays interactive',
+                            wx.ITEM_NORMAL)
+        menu.AppendItem(job_item)
+        menu.Bind(wx.EVT_MENU, self.OnMenuRunJob, job_item)
+
+        jobs_item = wx.MenuItem( menu, -1 ,'Jobs', 
+                           'Show the background jobs running in this engine',
+                            wx.ITEM_NORMAL)
+        menu.AppendItem(jobs_item)
+        menu.Bind(wx.EVT_MENU, self.OnMenuJobs, jobs_item)
+
         #rename engine
         name_item = wx.MenuItem( menu, ID_RENAME ,'Rename', 
                            'Rename this engine console',wx.ITEM_NORMAL)
@@ -267,6 +347,13 @@ class EnginePageBase(ConsolePage, Console):
         menu.AppendItem(name_item)
         menu.Bind(wx.EVT_MENU, self.OnMenuRename, name_item)
 
+        #engine statistics
+        stats_item = wx.MenuItem( menu, -1 ,'Statistics', 
+                           'Show engine communication statistics',
+                            wx.ITEM_NORMAL)
+        menu.AppendItem(stats_item)
+        menu.Bind(wx.EVT_MENU, self.OnMenuStats, stats_item)
+
 
         #disable menu items not applicable to the internal engine
         if self.engtype=='Internal':
@@ -280,6 +367,9 @@ class EnginePageBase(ConsolePage, Console):
             menu.Enable(pro_item.GetId(), False)
             menu.Enable(stop_item.GetId(), False)
             menu.Enable(kill_item.GetId(), False)
+            menu.Enable(stats_item.GetId(), False)
+            menu.Enable(job_item.GetId(), False)
+            menu.Enable(jobs_item.GetId(), False)
 
         return menu
 
@@ -288,10 +378,7 @@ class EnginePageBase(ConsolePage, Console):
         #change engine label
         dlg = wx.TextEntryDialog(None, 'Rename '+self.englabel+' to:','Rename:', self.englabel)
         if dlg.ShowModal() == wx.ID_OK:
-            self.englabel = dlg.GetValue()
-            #set page label
-            n = self.Parent.GetPageIndex(self)
-            self.Parent.SetPageText(n,self.englabel[-30:])
+            self.set_label(dlg.GetValue())
         dlg.Destroy()
 
     def OnMenuDebugger(self, event):
@@ -332,6 +419,84 @@ class EnginePageBase(ConsolePage, Console):
 
     def OnMenuStop(self, event):
         self.stop()
+
+    def OnMenuSkipOutput(self, event):
+        #toggle the output flow control policy
+        if self.output_policy == 'drop':
+            self.set_output_policy('block')
+        else:
+            self.set_output_policy('drop')
+
+    def OnMenuClone(self, event):
+        #fork the engine, the console tool creates a page for the new engine
+        #when it connects
+        try:
+            self.clone( self.englabel+' (clone)')
+        except Exception as e:
+            wx.MessageBox(str(e), 'Clone failed: '+self.englabel, 
+                            wx.OK|wx.ICON_ERROR)
+
+    def OnMenuNewNamespace(self, event):
+        #the console tool creates a page for the new engine when it connects
+        try:
+            self.new_namespace()
+        except Exception as e:
+            wx.MessageBox(str(e), 'New namespace failed: '+self.englabel, 
+                            wx.OK|wx.ICON_ERROR)
+
+    def OnMenuRunJob(self, event):
+        #run a command in a background job
+        dlg = wx.TextEntryDialog(None, 'Command to run in the background:',
+                                    'Run in background: '+self.englabel, '')
+        if dlg.ShowModal() == wx.ID_OK:
+            try:
+                jobid = self.start_job(dlg.GetValue())
+                self.GetTopLevelParent().SetStatusText('Started job '+str(jobid))
+            except Exception as e:
+                wx.MessageBox(str(e), 'Job failed to start: '+self.englabel,
+                                wx.OK|wx.ICON_ERROR)
+        dlg.Destroy()
+
+    def OnMenuJobs(self, event):
+        #show the job table
+        lines = []
+        for info in self.get_jobs():
+            lines.append('[%d] %s  %.1fs  %s'%(info['id'], info['state'],
+                                info['elapsed'], info['description'][:60]))
+        if lines == []:
+            lines.append('No jobs')
+        else:
+            lines.append('')
+            lines.append('Use job_result(id) to get the result of a job, '
+                            'job_output(id) to show its output')
+        msg = '\n'.join(lines)
+        wx.MessageBox(msg, 'Jobs: '+self.englabel, wx.OK|wx.ICON_INFORMATION)
+
+    def OnMenuStats(self, event):
+        #show the engine statistics
+        lines = []
+        for title, stats in self.GetStatistics():
+            lines.append(title+':')
+            keys = stats.keys()
+            keys.sort()
+            for key in keys:
+                lines.append('    '+key+' = '+str(stats[key]))
+        msg = '\n'.join(lines)
+        wx.MessageBox(msg, 'Statistics: '+self.englabel, wx.OK|wx.ICON_INFORMATION)
+
+    def GetStatistics(self):
+        """
+        Returns a list of (title, {name: value}) engine statistics to display.
+        """
+        stats = []
+        stats.append( ('Output buffer', self.run_task('get_output_stats')) )
+        stats.append( ('Request timeouts', self.run_task('get_timeout_stats')) )
+        stats.append( ('Code cache', self.run_task('get_code_cache_stats')) )
+        stats.append( ('Query cache', self.get_cache_stats()) )
+        queues = self.run_task('get_scheduler_stats')
+        for name in sorted(queues.keys()):
+            stats.append( ('Request queue: '+name, queues[name]) )
+        return stats
         
     def OnMenuKill(self, event):
     
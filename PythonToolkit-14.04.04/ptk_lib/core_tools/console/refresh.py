@@ -0,0 +1,256 @@
+"""
+Refresh scheduler
+-----------------
+
+Tools that update when an engine's state changes (viewers, namespace browser,
+inspector, editor markers, debugger toolbars) register a refresh with the
+console tool's RefreshScheduler and schedule it from their message handlers
+instead of refreshing directly.
+
+Scheduled refreshes are debounced so a burst of state messages (e.g.
+ENGINE_STATE_BUSY, ENGINE_STATE_DONE, ENGINE_NAMESPACE_CHANGED for a short
+command) results in a single refresh. Refreshes whose visibility check fails are
+deferred until the pane is shown. Refreshes that query the engine return the
+batch items they need and the scheduler sends the items for all due refreshes
+in a single run_batch_async request per engine.
+
+Usage:
+    refresher.add( 'MyTool', self.OnRefresh, visible=self.IsShownOnScreen,
+                    queries=self.GetRefreshItems)
+    refresher.schedule('MyTool', engname)
+
+    callback(engname, results) - results is the list of results for the items
+        returned by queries(engname), or None if there were no items, the
+        engine is not available or the batch request failed.
+"""
+#---logging---------------------------------------------------------------------
+import logging
+log = logging.getLogger(__name__)
+
+#---Imports---------------------------------------------------------------------
+import time
+import wx
+
+#---Globals---------------------------------------------------------------------
+#priorities - lower values are refreshed first
+PRIORITY_HIGH   = 0     #cheap local state e.g. toolbars
+PRIORITY_NORMAL = 1     #namespace browser, inspector, viewers
+PRIORITY_LOW    = 2     #editor markers
+
+REFRESH_DELAY = 50      #debounce delay (ms)
+REFRESH_MAX_DELAY = 250 #maximum time a refresh is postponed by a burst (ms)
+HIDDEN_POLL = 500       #interval to check if deferred refreshes are visible (ms)
+
+#-------------------------------------------------------------------------------
+class RefreshEntry():
+    def __init__(self, name, callback, visible, priority, queries):
+        """
+        A registered refresh (see RefreshScheduler.add)
+        """
+        self.name = name
+        self.callback = callback
+        self.visible = visible
+        self.priority = priority
+        self.queries = queries
+
+    def is_visible(self):
+        """Returns True if the refresh should run now"""
+        if self.visible is None:
+            return True
+        try:
+            return bool(self.visible())
+        except:
+            #destroyed windows raise PyDeadObjectError
+            return False
+
+#-------------------------------------------------------------------------------
+class RefreshScheduler():
+    def __init__(self, contool):
+        """
+        Debounces and batches tool refreshes triggered by engine messages.
+        """
+        self.contool = contool
+
+        self._entries = {}      #{name: RefreshEntry}
+        self._pending = {}      #{name: set of engnames} waiting for the timer
+        self._deferred = {}     #{name: set of engnames} waiting to be visible
+        self._timer = None
+        self._first = None      #time the oldest pending refresh was scheduled
+        self._poll = None
+
+    #---Interfaces--------------------------------------------------------------
+    def add(self, name, callback, visible=None, priority=PRIORITY_NORMAL,
+                queries=None):
+        """
+        Register a refresh.
+            name        -   unique name used to schedule the refresh.
+            callback    -   callable(engname, results) to do the refresh.
+            visible     -   callable returning True if the refresh should run
+                            now (e.g. window.IsShownOnScreen), otherwise it is
+                            deferred until it returns True. None to always run.
+            priority    -   PRIORITY_HIGH/NORMAL/LOW, lower values run first.
+            queries     -   callable(engname) returning a list of batch items
+                            (as for Console.run_batch) to fetch for the
+                            refresh or None.
+        """
+        if name in self._entries:
+            raise Exception('Refresh already registered: '+str(name))
+        self._entries[name] = RefreshEntry(name, callback, visible, priority,
+                                            queries)
+
+    def remove(self, name):
+        """
+        Unregister a refresh, any scheduled refreshes are discarded.
+        """
+        self._entries.pop(name, None)
+        self._pending.pop(name, None)
+        self._deferred.pop(name, None)
+
+    def schedule(self, name, engname=None):
+        """
+        Schedule the named refresh for the engine given. Refreshes scheduled
+        for the same engine before the refresh runs are combined.
+        """
+        if name not in self._entries:
+            log.warning('Refresh not registered: '+str(name))
+            return
+        self._pending.setdefault(name, set()).add(engname)
+        self._start_timer()
+
+    def schedule_all(self, engname=None):
+        """
+        Schedule all registered refreshes for the engine given.
+        """
+        for name in self._entries:
+            self._pending.setdefault(name, set()).add(engname)
+        self._start_timer()
+
+    def show(self, name):
+        """
+        Called when the pane for a refresh is shown to run any deferred
+        refreshes.
+        """
+        engnames = self._deferred.pop(name, None)
+        if engnames:
+            self._pending.setdefault(name, set()).update(engnames)
+            self._start_timer()
+
+    def flush(self):
+        """
+        Run any pending refreshes now.
+        """
+        if self._timer is not None:
+            self._timer.Stop()
+        self._run()
+
+    #---internal methods--------------------------------------------------------
+    def _start_timer(self):
+        """
+        (Re)start the debounce timer - unless the oldest pending refresh has
+        already waited REFRESH_MAX_DELAY.
+        """
+        now = time.time()
+        if self._timer is None:
+            self._first = now
+            self._timer = wx.CallLater(REFRESH_DELAY, self._run)
+        elif (now - self._first)*1000 < REFRESH_MAX_DELAY:
+            self._timer.Restart(REFRESH_DELAY)
+
+    def _run(self):
+        """
+        Timer callback; run the pending refreshes.
+        """
+        self._timer = None
+        self._first = None
+        pending = self._pending
+        self._pending = {}
+
+        #group the visible refreshes by engine
+        due = {}    #{engname: [entries]}
+        for name, engnames in pending.iteritems():
+            entry = self._entries.get(name, None)
+            if entry is None:
+                continue
+            if entry.is_visible() is False:
+                self._deferred.setdefault(name, set()).update(engnames)
+                continue
+            for engname in engnames:
+                due.setdefault(engname, []).append(entry)
+
+        for engname, entries in due.iteritems():
+            entries.sort(key=lambda entry: entry.priority)
+            self._refresh_engine(engname, entries)
+
+        if self._deferred and (self._poll is None):
+            self._poll = wx.CallLater(HIDDEN_POLL, self._check_deferred)
+
+    def _refresh_engine(self, engname, entries):
+        """
+        Run the refreshes for one engine, refreshes with queries are run when
+        the combined batch request completes.
+        """
+        eng = None
+        if engname is not None:
+            eng = self.contool.get_engine_console(engname)
+            if (eng is not None) and (eng.is_interactive is False):
+                eng = None
+
+        items = []
+        queried = []    #[(entry, start, end)]
+        for entry in entries:
+            q = None
+            if (eng is not None) and (entry.queries is not None):
+                try:
+                    q = entry.queries(engname)
+                except:
+                    log.exception('Error getting refresh queries: '+entry.name)
+            if q:
+                queried.append( (entry, len(items), len(items)+len(q)) )
+                items.extend(q)
+            else:
+                self._call(entry, engname, None)
+
+        if queried == []:
+            return
+
+        def on_batch(req):
+            if req.exception() is None:
+                results = req.result()
+            else:
+                results = None
+            for entry, start, end in queried:
+                #removed while the request was running
+                if self._entries.get(entry.name, None) is not entry:
+                    continue
+                if results is None:
+                    self._call(entry, engname, None)
+                else:
+                    self._call(entry, engname, results[start:end])
+
+        try:
+            eng.run_batch_async(items, callback=on_batch)
+        except:
+            log.exception('Error sending refresh batch')
+            for entry, start, end in queried:
+                self._call(entry, engname, None)
+
+    def _call(self, entry, engname, results):
+        """Call a refresh callback logging any errors"""
+        try:
+            entry.callback(engname, results)
+        except:
+            log.exception('Error in refresh: '+entry.name)
+
+    def _check_deferred(self):
+        """
+        Poll timer callback; schedule deferred refreshes that are now visible.
+        """
+        self._poll = None
+        for name in self._deferred.keys():
+            entry = self._entries.get(name, None)
+            if entry is None:
+                self._deferred.pop(name, None)
+            elif entry.is_visible():
+                self.show(name)
+        if self._deferred:
+            self._poll = wx.CallLater(HIDDEN_POLL, self._check_deferred)
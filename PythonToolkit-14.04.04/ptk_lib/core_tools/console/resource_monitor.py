@@ -0,0 +1,385 @@
+"""
+Engine resource monitor
+-----------------------
+
+ResourceMonitor - samples /proc/<pid>/stat, status and io for the engines on
+this machine on a timer and publishes the CPU%, RSS, thread count and disk I/O
+rates of each engine (CONSOLE_ENGINE_STATS). It also warns, or stops the running
+code, when an engine's memory use crosses the limit set in the console settings.
+
+EnginesPanel - a sortable list of the engines and their resource use shown as
+a pane in the console frame.
+
+Engines sharing a process (namespace engines, the internal engine and PTK)
+report the resources of the whole process. Only systems with a /proc
+filesystem (linux) are supported, elsewhere no statistics are published.
+"""
+#---logging---------------------------------------------------------------------
+import logging
+log = logging.getLogger(__name__)
+
+#---Imports---------------------------------------------------------------------
+import os
+import time
+import platform
+
+import wx
+
+from ptk_lib.controls import AutoSizeListCtrl
+
+import console_messages
+
+#---Globals---------------------------------------------------------------------
+#actions when an engine crosses the memory limit
+ACTION_WARN = 'warn'        #write a warning in the engine console
+ACTION_STOP = 'stop'        #warn and stop any running code
+
+#the warning is given again once the memory use falls below this fraction of
+#the limit and then crosses it again
+REARM_FRACTION = 0.9
+
+try:
+    CLK_TCK = os.sysconf('SC_CLK_TCK')
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError):
+    CLK_TCK = 100
+    PAGE_SIZE = 4096
+
+#-------------------------------------------------------------------------------
+def format_bytes(n):
+    """
+    Format a number of bytes for display e.g. 3.2 MB
+    """
+    if n is None:
+        return '-'
+    if n < 1024:
+        return '%d B'%n
+    if n < 1048576:
+        return '%.1f KB'%(n/1024.0)
+    if n < 1073741824:
+        return '%.1f MB'%(n/1048576.0)
+    return '%.2f GB'%(n/1073741824.0)
+
+def format_stats(stats):
+    """
+    Returns a one line summary of an engine's stats for the status bar.
+    """
+    return 'CPU %.0f%%  Mem %s  Threads %d  Disk r %s/s w %s/s'%(
+                    stats['cpu'], format_bytes(stats['rss']), stats['threads'],
+                    format_bytes(stats['read_rate']),
+                    format_bytes(stats['write_rate']))
+
+def read_proc(pid):
+    """
+    Read the counters for the process from /proc/<pid>/stat, status and io.
+    Returns a dictionary with keys: ticks (user+system cpu time in clock ticks),
+    threads, rss and peak_rss (bytes), read_bytes and write_bytes (total disk
+    I/O, None if not readable) or None if the process does not exist.
+    """
+    path = '/proc/'+str(pid)+'/'
+    try:
+        with open(path+'stat') as f:
+            stat = f.read()
+    except (IOError, OSError):
+        return None
+
+    #the command name (field 2) may contain spaces, split after it
+    fields = stat[stat.rfind(')')+2:].split()
+    res = { 'ticks'     : int(fields[11]) + int(fields[12]),
+            'threads'   : int(fields[17]),
+            'rss'       : int(fields[21])*PAGE_SIZE,
+            'peak_rss'  : None,
+            'read_bytes': None,
+            'write_bytes': None}
+
+    try:
+        with open(path+'status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    res['rss'] = int(line.split()[1])*1024
+                elif line.startswith('VmHWM:'):
+                    res['peak_rss'] = int(line.split()[1])*1024
+    except (IOError, OSError, ValueError):
+        pass
+
+    try:
+        with open(path+'io') as f:
+            for line in f:
+                key, sep, value = line.partition(':')
+                if key in ('read_bytes', 'write_bytes'):
+                    res[key] = int(value)
+    except (IOError, OSError, ValueError):
+        pass
+
+    return res
+
+#-------------------------------------------------------------------------------
+class ResourceMonitor():
+    def __init__(self, tool):
+        """
+        Samples the resource use of the engines managed by the console tool.
+        """
+        self.tool = tool
+
+        #options (see load_options)
+        self.interval = 2.0             #sample interval (s)
+        self.rss_limit = 0              #memory limit (MB) 0 = no limit
+        self.rss_action = ACTION_WARN
+
+        self.enabled = os.path.isdir('/proc/self')
+        self.hostname = platform.node()
+
+        self.stats = {}         #{engname: stats dict} from the last sample
+        self._last = {}         #{pid: (time, counters)} previous sample
+        self._warned = set()    #engnames over the memory limit
+        self._timer = None
+
+    #---Interfaces--------------------------------------------------------------
+    def load_options(self):
+        """
+        Load the sample interval and memory limit options and (re)start
+        sampling.
+        """
+        cfg = wx.GetApp().GetConfig()
+        cfg.SetPath("Console//")
+        self.interval = max(cfg.ReadInt("monitor_interval", 2), 1)
+        self.rss_limit = cfg.ReadInt("monitor_rss_limit", 0)
+        self.rss_action = cfg.Read("monitor_rss_action", ACTION_WARN)
+        self._warned = set()
+        self.start()
+
+    def start(self):
+        """
+        Start sampling.
+        """
+        if self.enabled is False:
+            return
+        if self._timer is not None:
+            self._timer.Stop()
+        self._timer = wx.CallLater(int(self.interval*1000), self._sample)
+
+    def stop(self):
+        """
+        Stop sampling.
+        """
+        if self._timer is not None:
+            self._timer.Stop()
+            self._timer = None
+
+    def get_stats(self, engname):
+        """
+        Returns the stats dictionary from the last sample for the engine or
+        None. Keys: pid, cpu (%), rss, peak_rss (bytes), threads, read_rate and
+        write_rate (bytes/s).
+        """
+        return self.stats.get(engname, None)
+
+    def is_local(self, con):
+        """
+        Returns True if the engine managed by the console given is running on
+        this machine so its process can be sampled.
+        """
+        if (con.engpid is None) or (con.enghost is None):
+            return False
+        return con.enghost == self.hostname
+
+    #---internal methods--------------------------------------------------------
+    def _sample(self):
+        """
+        Timer callback; sample the engine processes and publish the stats.
+        """
+        self._timer = None
+        try:
+            self._sample_engines()
+        except:
+            log.exception('Error sampling engine resources')
+        self.start()
+
+    def _sample_engines(self):
+        #group the engine consoles by process
+        procs = {}
+        for con in self.tool.get_all_engines():
+            if self.is_local(con):
+                procs.setdefault(con.engpid, []).append(con)
+
+        now = time.time()
+        stats = {}
+        for pid, cons in procs.iteritems():
+            counters = read_proc(pid)
+            if counters is None:
+                continue
+            s = self._rates(pid, now, counters)
+            for con in cons:
+                stats[con.engine] = s
+                self._check_limit(con, s)
+
+        #forget processes that have gone
+        for pid in self._last.keys():
+            if pid not in procs:
+                self._last.pop(pid)
+        for engname in list(self._warned):
+            if engname not in stats:
+                self._warned.discard(engname)
+
+        self.stats = stats
+        self.tool.msg_node.publish_msg( console_messages.CONSOLE_ENGINE_STATS,
+                                        (stats,))
+
+    def _rates(self, pid, now, counters):
+        """
+        Returns the stats dictionary for the process from the counters and the
+        previous sample.
+        """
+        s = {   'pid'       : pid,
+                'cpu'       : 0.0,
+                'rss'       : counters['rss'],
+                'peak_rss'  : counters['peak_rss'],
+                'threads'   : counters['threads'],
+                'read_rate' : None,
+                'write_rate': None }
+
+        last = self._last.get(pid, None)
+        self._last[pid] = (now, counters)
+        if last is None:
+            return s
+
+        t, prev = last
+        dt = now - t
+        if dt <= 0:
+            return s
+        s['cpu'] = 100.0*(counters['ticks'] - prev['ticks'])/CLK_TCK/dt
+        for key, rate in (('read_bytes','read_rate'),('write_bytes','write_rate')):
+            if (counters[key] is not None) and (prev[key] is not None):
+                s[rate] = (counters[key] - prev[key])/dt
+        return s
+
+    def _check_limit(self, con, stats):
+        """
+        Warn (and stop the running code) when the engine's memory use crosses
+        the limit.
+        """
+        if self.rss_limit <= 0:
+            return
+        limit = self.rss_limit*1048576
+        if stats['rss'] < limit*REARM_FRACTION:
+            self._warned.discard(con.engine)
+            return
+        if (stats['rss'] < limit) or (con.engine in self._warned):
+            return
+        self._warned.add(con.engine)
+
+        msg = ('\nResource monitor: engine memory use (%s) is over the limit '
+                '(%s)\n'%(format_bytes(stats['rss']), format_bytes(limit)))
+        log.warning(con.engine+': '+msg.strip())
+        con.write_stderr(msg)
+        self.tool.frame.SetStatusText( con.englabel+': memory limit exceeded')
+
+        if (self.rss_action == ACTION_STOP) and (con.busy is True):
+            con.write_stderr('Resource monitor: stopping the running code\n')
+            con.stop()
+
+#-------------------------------------------------------------------------------
+class EnginesPanel(AutoSizeListCtrl):
+    #columns (title, stats key/attribute, width)
+    columns = [ ('Engine', 'label', 130),
+                ('PID', 'pid', 60),
+                ('CPU %', 'cpu', 60),
+                ('Memory', 'rss', 80),
+                ('Peak memory', 'peak_rss', 80),
+                ('Threads', 'threads', 60),
+                ('Disk read/s', 'read_rate', 80),
+                ('Disk write/s', 'write_rate', 80) ]
+
+    def __init__(self, parent, tool):
+        """
+        Sortable list of the engines and their resource use.
+        """
+        AutoSizeListCtrl.__init__(self, parent, wx.ID_ANY,
+                style=wx.BORDER_SUNKEN|wx.LC_VIRTUAL|wx.LC_REPORT|wx.LC_VRULES
+                    |wx.LC_HRULES|wx.LC_SINGLE_SEL)
+
+        self.tool = tool
+        self.rows = []          #list of (engname, {column key: value})
+        self.sort_col = 3       #sort by memory, largest first
+        self.sort_reverse = True
+
+        for n, (title, key, width) in enumerate(self.columns):
+            self.InsertColumn(n, title, width=width)
+
+        self.Bind(wx.EVT_LIST_COL_CLICK, self.OnColClick)
+        self.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.OnItemActivated)
+
+        self.tool.msg_node.subscribe( console_messages.CONSOLE_ENGINE_STATS,
+                                        self.msg_engine_stats)
+
+    #---interface methods-------------------------------------------------------
+    def RefreshList(self, stats):
+        """
+        Update the list from the stats {engname: stats dict}
+        """
+        rows = []
+        for con in self.tool.get_all_engines():
+            s = stats.get(con.engine, None)
+            if s is None:
+                values = {'pid': con.engpid}
+            else:
+                values = dict(s)
+            values['label'] = con.englabel
+            rows.append( (con.engine, values) )
+        self.rows = rows
+        self.SortList()
+
+    def SortList(self):
+        """
+        Sort the rows by the current column and redraw.
+        """
+        key = self.columns[self.sort_col][1]
+        self.rows.sort(key=lambda row: row[1].get(key, None),
+                        reverse=self.sort_reverse)
+        self.SetItemCount(len(self.rows))
+        self.Refresh()
+
+    #---virtual list methods----------------------------------------------------
+    def OnGetItemText(self, row, col):
+        if row > len(self.rows)-1:
+            return ''
+        key = self.columns[col][1]
+        value = self.rows[row][1].get(key, None)
+        if value is None:
+            return '-'
+        if key == 'cpu':
+            return '%.1f'%value
+        if key in ('rss', 'peak_rss'):
+            return format_bytes(value)
+        if key in ('read_rate', 'write_rate'):
+            return format_bytes(value)
+        return str(value)
+
+    #---event/message handlers--------------------------------------------------
+    def msg_engine_stats(self, msg):
+        """
+        Message handler for CONSOLE_ENGINE_STATS, update the list if shown.
+        """
+        if self.IsShownOnScreen() is False:
+            return
+        stats, = msg.get_data()
+        self.RefreshList(stats)
+
+    def OnColClick(self, event):
+        """Sort by the column clicked, clicking again reverses the order"""
+        col = event.GetColumn()
+        if col == self.sort_col:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_col = col
+            self.sort_reverse = (col != 0)
+        self.SortList()
+
+    def OnItemActivated(self, event):
+        """Switch to the engine's console page"""
+        row = event.GetIndex()
+        if row > len(self.rows)-1:
+            return
+        con = self.tool.get_engine_console(self.rows[row][0])
+        if con is not None:
+            self.tool.frame.SetCurrentConsole(con)
@@ -15,6 +15,7 @@ from ptk_lib.controls import toolpanel
 from ptk_lib.message_bus import mb_protocol
 from ptk_lib.engine import eng_messages
 from ptk_lib.core_tools.console import console_messages
+from ptk_lib.core_tools.console import refresh
 
 import editor_icons
 import editor_messages
@@ -138,6 +139,12 @@ class DebugConsoleTools(toolpanel.ToolPanel):
         self.tool.msg_node.subscribe( eng_messages.ENGINE_DEBUG, 
                                         self.msg_engine)
 
+        #tool state updates are debounced by the console tool's scheduler
+        self._refresh_name = self.__class__.__name__+'.%d'%id(self)
+        self.console.refresher.add( self._refresh_name, self._OnRefresh,
+                                    visible=self.IsShownOnScreen,
+                                    priority=refresh.PRIORITY_HIGH)
+
     #---messages----------------------------------------------------------------
     def msg_engine(self, msg):
         """
@@ -149,7 +156,7 @@ class DebugConsoleTools(toolpanel.ToolPanel):
         engname = msg.get_from()
         if self.console.is_engine_current(engname) is False:
             return
-        self._update_tools()
+        self.console.refresher.schedule(self._refresh_name)
 
     def msg_console(self,msg):
         """
@@ -157,6 +164,10 @@ class DebugConsoleTools(toolpanel.ToolPanel):
             CONSOLE_SWITCHED
             CONSOLE_ENGINE_CONNECTED
         """
+        self.console.refresher.schedule(self._refresh_name)
+
+    def _OnRefresh(self, engname, results):
+        """Scheduled refresh callback"""
         self._update_tools()
 
     def _update_tools(self):
@@ -387,6 +398,12 @@ class DebugEditorTools(toolpanel.ToolPanel):
         self.tool.msg_node.subscribe( eng_messages.ENGINE_DEBUG, 
                                         self.msg_engine)
 
+        #tool state updates are debounced by the console tool's scheduler
+        self._refresh_name = self.__class__.__name__+'.%d'%id(self)
+        self.console.refresher.add( self._refresh_name, self._OnRefresh,
+                                    visible=self.IsShownOnScreen,
+                                    priority=refresh.PRIORITY_HIGH)
+
     #---messages----------------------------------------------------------------
     def msg_engine(self, msg):
         """
@@ -398,13 +415,17 @@ class DebugEditorTools(toolpanel.ToolPanel):
         engname = msg.get_from()
         if self.console.is_engine_current(engname) is False:
             return
-        self._update_tools()
+        self.console.refresher.schedule(self._refresh_name)
 
     def msg_console(self,msg):
         """
         Message handler for console tool messages: 
             CONSOLE_SWITCHED
         """
+        self.console.refresher.schedule(self._refresh_name)
+
+    def _OnRefresh(self, engname, results):
+        """Scheduled refresh callback"""
         self._update_tools()
 
     def _update_tools(self):
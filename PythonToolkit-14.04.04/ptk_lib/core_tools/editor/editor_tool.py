@@ -20,6 +20,7 @@ from ptk_lib.engine import eng_messages, eng_misc
 #other tool imports
 from ptk_lib.core_tools.fileio import Importer, DoFileDialog
 from ptk_lib.core_tools.console import console_messages
+from ptk_lib.core_tools.console import refresh
 
 #editor imports
 from editor_frame import EditorFrame
@@ -149,6 +150,16 @@ class Editor(Tool):
         console.frame.AddToolbar(self.debugtools,'Debuger toolbar',pane,
                         helpstring = 'Show/hide the Debugger toolbar') 
 
+        #the paused and breakpoint markers are refreshed by the console tool's
+        #scheduler when the editor is visible.
+        self.console = console
+        console.refresher.add( 'Editor.PauseMarkers', self._refresh_pause_markers,
+                                visible=self.frame.IsShown, 
+                                priority=refresh.PRIORITY_LOW)
+        console.refresher.add( 'Editor.Breakpoints', self._refresh_bp_symbols,
+                                visible=self.frame.IsShown, 
+                                priority=refresh.PRIORITY_LOW)
+
         #-----------------------------------------------------------------------
         #register file importer
         #-----------------------------------------------------------------------
@@ -485,41 +496,44 @@ class Editor(Tool):
         Debugger enabled/disabled message
         """
         #update the bp markers in the editor pages
-        pages = self.frame.notebook.GetAllPages()
-        for page in pages:
-            page.UpdateBreakpointSymbols()
+        self.console.refresher.schedule('Editor.Breakpoints')
 
     def msg_eng_done(self,msg):
         engname = msg.get_from()
         debug, profile = msg.data
-        console = self.app.toolmgr.get_tool('Console')
-        if console.is_engine_current(engname):
+        if self.console.is_engine_current(engname):
             #update any displayed paused markers
-            self.frame.notebook.UpdatePauseMarkers()
+            self.console.refresher.schedule('Editor.PauseMarkers')
     
     def msg_debug_paused(self,msg):
         engname = msg.get_from()
         paused_at, scope_list, active_scope, flags = msg.data
-        console = self.app.toolmgr.get_tool('Console')
-        if console.is_engine_current(engname):
+        if self.console.is_engine_current(engname):
             #update any displayed paused markers
-            self.frame.notebook.UpdatePauseMarkers()
+            self.console.refresher.schedule('Editor.PauseMarkers')
 
     def msg_debug_resumed(self,msg):
         engname = msg.get_from()
-        console = self.app.toolmgr.get_tool('Console')
-        if console.is_engine_current(engname):
+        if self.console.is_engine_current(engname):
             #update any displayed paused markers
-            self.frame.notebook.UpdatePauseMarkers()
+            self.console.refresher.schedule('Editor.PauseMarkers')
 
     def msg_console_switched(self, msg):
         """
         The current active console switched.
         """
-        #update the paused/line number markers
+        #update the paused/line number markers and the bp markers in the 
+        #editor pages
+        self.console.refresher.schedule('Editor.PauseMarkers')
+        self.console.refresher.schedule('Editor.Breakpoints')
+
+    #---refresh callbacks-------------------------------------------------------
+    def _refresh_pause_markers(self, engname, results):
+        """Scheduled refresh of the paused markers"""
         self.frame.notebook.UpdatePauseMarkers()
 
-        #update the bp markers in the editor pages
+    def _refresh_bp_symbols(self, engname, results):
+        """Scheduled refresh of the breakpoint markers"""
         pages = self.frame.notebook.GetAllPages()
         for page in pages:
             page.UpdateBreakpointSymbols()
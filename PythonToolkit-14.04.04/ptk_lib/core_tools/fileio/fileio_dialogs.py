@@ -257,12 +257,15 @@ class ExportDialog(wx.Dialog):
         if eng is None:
             return
 
-        #check the object exists
-        if eng.run_task('object_exists',(address,)) is False:
-            return
-        #get type_string if not provided.
+        #check the object exists and get type_string if not provided.
         if type_string is None:
-            type_string =eng.run_task('get_type_string', (address,))
+            exists, type_string = eng.run_batch( 
+                                    [ ('object_exists',(address,)),
+                                      ('get_type_string', (address,)) ] )
+        else:
+            exists = eng.run_task('object_exists',(address,))
+        if exists is not True:
+            return
 
         icon = self._GetTypeIconIndex(type_string)
         n = self.list.GetItemCount()
@@ -324,7 +327,7 @@ class ExportDialog(wx.Dialog):
         eng = self.console.get_engine_console(self.engname)
         if eng is None:
             return
-        names = eng.evaluate('dir('+address+')')
+        names = eng.evaluate('dir('+address+')', cache=True)
         #add children
         for name in names:
             #get object address
@@ -43,11 +43,8 @@ class PickleImporter(Importer):
         #get engine
         console = self.app.toolmgr.get_tool('Console')
         engine = console.get_current_engine()
-        #register import task with engine
-        if 'pickle_import' not in engine.get_registered_tasks():
-            engine.register_task(pickle_import)
         #import
-        err = engine.run_task('pickle_import',(filepath,))
+        err = engine.run_task(pickle_import,(filepath,))
         #check return err
         if err!='':
             #show error message dialo
@@ -69,11 +66,8 @@ class PickleImporter(Importer):
         #get engine
         console = self.app.toolmgr.get_tool('Console')
         engine = console.get_current_engine()
-        #register import task with engine
-        if 'shelve_import' not in engine.get_registered_tasks():
-            engine.register_task(shelve_import)
         #import
-        err = engine.run_task('shelve_import',(filepath,))
+        err = engine.run_task(shelve_import,(filepath,))
         #check return err
         if err!='':
             #show error message dialo
@@ -121,19 +115,13 @@ class PickleExporter(Exporter):
 
         #pickle each object to a file
         if n==0:
-            #register export task with engine
-            if 'pickle_export' not in engine.get_registered_tasks():
-                engine.register_task(pickle_export)
             #export
-            failed = engine.run_task('pickle_export',(onames,fnames))
+            failed = engine.run_task(pickle_export,(onames,fnames))
         
         #use single file shelve.
         elif n==1:
-            #register export task with engine
-            if 'pickle_shelve_export' not in engine.get_registered_tasks():
-                engine.register_task(pickle_shelve_export)
             #export
-            failed = engine.run_task('pickle_shelve_export',(onames,fnames[0]))
+            failed = engine.run_task(pickle_shelve_export,(onames,fnames[0]))
 
         if len(failed)!=0:
             msg = "Pickle export failed for the following objects:\n"
@@ -38,6 +38,7 @@ class InspectorControl(wx.Panel):
 
         #The current object
         self.data = {}
+        self.request = None     #outstanding engine request
 
         #Create a sizer
         vbox = wx.BoxSizer(wx.VERTICAL)
@@ -107,6 +108,11 @@ class InspectorControl(wx.Panel):
     def Inspect(self,engname,oname):
         """Display the info for the object given by oname in the current engine"""
         log.debug('in inspect: '+str(oname))
+        #cancel any outstanding request
+        if self.request is not None:
+            self.request.cancel()
+            self.request = None
+
         #get the engine interface
         if engname is None:
             eng = None
@@ -122,34 +128,64 @@ class InspectorControl(wx.Panel):
             self._InspectTip()
             return
 
-        #check if the inspector engine tasks are regitered if not registered all
-        # of them
-        if 'get_object_category' not in eng.get_registered_tasks():
-            eng.register_task(inspector_tasks.get_object_category)
-            eng.register_task(inspector_tasks.get_type_info)
-            eng.register_task(inspector_tasks.get_routine_info)
-            eng.register_task(inspector_tasks.get_module_info)
-            eng.register_task(inspector_tasks.get_instance_info)
-
-        #get the object category (type,routine,module,instance)
-        cat = eng.run_task('get_object_category',(oname,))
-
-        #check object category and update infoctrl
-        if cat == 'type':
-            self.data = eng.run_task('get_type_info',(oname,))
-            if self.data !=None:
-                self._InspectType()
-        elif cat == 'routine':
-            self.data = eng.run_task('get_routine_info',(oname,))
-            if self.data !=None:
-                self._InspectRoutine()
-        elif cat == 'module':
-            self.data = eng.run_task('get_module_info',(oname,))
-            if self.data !=None:
-                self._InspectModule()
-        else:
-            self.data = eng.run_task('get_instance_info',(oname,))
-            self._InspectInstance(oname,eng)
+        #get the object category (type,routine,module,instance) and the info 
+        #in a single batch request. The cheap instance info is fetched with the
+        #category as most objects inspected are instances, the other info 
+        #tasks need a second request once the category is known.
+        items = [ (inspector_tasks.get_object_category,(oname,)),
+                  (inspector_tasks.get_instance_info,(oname,)) ]
+        def on_category(req):
+            if req is not self.request:
+                return
+            try:
+                cat, data = req.result()
+            except:
+                log.exception('Error getting object category')
+                self.request = None
+                return
+
+            #get the info for the other object categories
+            task = {'type':inspector_tasks.get_type_info, 
+                    'routine':inspector_tasks.get_routine_info,
+                    'module':inspector_tasks.get_module_info}.get(cat, None)
+            if task is None:
+                self.request = None
+                show(cat, data)
+            else:
+                self.request = eng.run_task_async(task,(oname,),
+                                callback=lambda req: on_info(req, cat))
+
+        def on_info(req, cat):
+            if req is not self.request:
+                return
+            self.request = None
+            try:
+                data = req.result()
+            except:
+                log.exception('Error getting object info')
+                return
+            show(cat, data)
+
+        def show(cat, data):
+            if isinstance(data, Exception):
+                log.error('Error getting object info: '+str(data))
+                return
+            self.data = data
+
+            #check object category and update infoctrl
+            if cat == 'type':
+                if self.data !=None:
+                    self._InspectType()
+            elif cat == 'routine':
+                if self.data !=None:
+                    self._InspectRoutine()
+            elif cat == 'module':
+                if self.data !=None:
+                    self._InspectModule()
+            else:
+                self._InspectInstance(oname,eng)
+
+        self.request = eng.run_batch_async(items, callback=on_category)
 
     def _InspectNone(self):
         """No engine - clear and disable"""
@@ -337,9 +373,25 @@ class InspectorControl(wx.Panel):
         info = infocall(eng, oname)
         label = 'Info/Value:'
         style = infoctrl.ITEM_COLLAPSE
-        value = wx.TextCtrl(self,-1,info,style=wx.NO_BORDER|wx.TE_READONLY|wx.TE_MULTILINE)
+        value = wx.TextCtrl(self,-1,'',style=wx.NO_BORDER|wx.TE_READONLY|wx.TE_MULTILINE)
         self.info.AddItem(label, value, style=infoctrl.ITEM_COLLAPSE, fill=True)
 
+        #info callables may return a non-blocking request
+        if hasattr(info, 'add_callback'):
+            value.SetValue('...')
+            def on_value(req):
+                if req is not self.request:
+                    return
+                self.request = None
+                try:
+                    value.SetValue( str(req.result()) )
+                except:
+                    value.SetValue('UNKNOWN')
+            self.request = info
+            info.add_callback(on_value)
+        else:
+            value.SetValue(info)
+
         self.info.Thaw()
 
     #---event handlers----------------------------------------------------------
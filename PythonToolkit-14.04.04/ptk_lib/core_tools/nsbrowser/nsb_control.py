@@ -15,6 +15,7 @@ from ptk_lib.controls import AddressedMenu, AutoSizeListCtrl
 from ptk_lib.controls import toolpanel
 
 from ptk_lib.core_tools.console import AddressCtrl, EVT_ENGINE_ADDRESS
+from ptk_lib.engine.eng_misc import EngineTimeoutError
 
 import nsb_icons #icons
 import nsb_tasks
@@ -171,11 +172,7 @@ class NSBrowserControl(wx.Panel):
                     wx.YES_NO | wx.NO_DEFAULT | wx.ICON_QUESTION)
         if dlg.ShowModal() == wx.ID_YES:
 
-            try:
-                ok = eng.run_task('clear_main')
-            except NameError:
-                eng.register_task(nsb_tasks.clear_main)
-                ok = eng.run_task('clear_main')
+            ok = eng.run_task(nsb_tasks.clear_main)
 
             self.SetAddress('')
             #publish engine state change message
@@ -193,11 +190,7 @@ class NSBrowserControl(wx.Panel):
             if dlg.ShowModal() == wx.ID_OK:
                 new = dlg.GetValue()
                 if new != oname:
-                    try:
-                        ok = eng.run_task('rename_object',(oname,new)) 
-                    except:
-                        eng.register_task(nsb_tasks.rename_object)
-                        ok = eng.run_task('rename_object',(oname,new)) 
+                    ok = eng.run_task(nsb_tasks.rename_object,(oname,new)) 
 
                     #publish engine state change message
                     eng.notify_change()           
@@ -212,11 +205,7 @@ class NSBrowserControl(wx.Panel):
             dlg = wx.TextEntryDialog(None, 'Copy '+oname+' as:','Copy:', '')
             if dlg.ShowModal() == wx.ID_OK:
                 new = dlg.GetValue()
-                try:
-                    ok = eng.run_task('copy_object',(oname,new))
-                except NameError:
-                    eng.register_task(nsb_tasks.copy_object)
-                    ok = eng.run_task('copy_object',(oname,new))
+                ok = eng.run_task(nsb_tasks.copy_object,(oname,new))
 
             dlg.Destroy()
         #publish engine state change message
@@ -351,6 +340,8 @@ class NSBrowserList(AutoSizeListCtrl):
         self.cur_eng = None
         self.dirlist=[]         #curent dir listing (name,type,istype,isinst,isfunc,ismod)
         self.items = []         #list of items (name,type) to show
+        self.request = None     #outstanding dir listing request
+        self.infos = {}         #info/value strings or pending requests {name:}
 
         self.sort_current = 0       #current sort method (0=name,1=type)
         self.sort_namedir = False   #direction of sort on object name (reverse=)
@@ -385,6 +376,8 @@ class NSBrowserList(AutoSizeListCtrl):
     def PopulateList(self, engname, address):
         """
         Update the list control for the given address.
+        The dir listing is requested from the engine without blocking and the 
+        list is filled when the result arrives.
         """
         #get the engine interface
         if engname is None:
@@ -393,21 +386,62 @@ class NSBrowserList(AutoSizeListCtrl):
             eng = self.console.get_engine_console(engname)
         self.cur_eng = engname
 
+        #cancel any outstanding requests
+        if self.request is not None:
+            self.request.cancel()
+            self.request = None
+        self._ClearInfos()
+
         #check that an engine interface was returned
         if eng is None:
             self.dirlist = []
             self.cur_add = ''
+            self.FilterList()
         else:
-            #returns list of (name,type_string,istype,isrout,ismod,isinst)
-            try:
-                self.dirlist = eng.run_task('get_dir_list',(address,)) 
-            except NameError:
-                eng.register_task(nsb_tasks.get_dir_list)
-                self.dirlist = eng.run_task('get_dir_list',(address,)) 
-
+            #streams (name,type_string,istype,isrout,ismod,isinst) items so 
+            #the first names are shown while the rest are fetched
             self.cur_add = address
+            self.request = eng.run_task_stream(nsb_tasks.get_dir_list,
+                                (address,), callback=self._OnDirList,
+                                chunk_callback=self._OnDirChunk)
+
+    def _OnDirChunk(self, req, items):
+        """
+        Dir listing stream callback - show the items received so far, the 
+        previous listing is kept until the first chunk arrives.
+        """
+        if req is not self.request:
+            return
+        self.dirlist = list(req.items)
         self.FilterList()
 
+    def _OnDirList(self, req):
+        """
+        Dir listing request callback
+        """
+        #check this is still the current request
+        if req is not self.request:
+            return
+        self.request = None
+        try:
+            dirlist = req.result()
+        except:
+            log.exception('Error getting dir listing')
+            dirlist = []
+        #already shown from the chunks?
+        if dirlist != self.dirlist:
+            self.dirlist = dirlist
+            self.FilterList()
+
+    def _ClearInfos(self):
+        """
+        Clear the cached info/value strings cancelling any outstanding requests
+        """
+        for info in self.infos.values():
+            if hasattr(info, 'cancel'):
+                info.cancel()
+        self.infos = {}
+
     def FilterList(self):
         #clear the current list
         self.DeleteAllItems()
@@ -522,6 +556,17 @@ class NSBrowserList(AutoSizeListCtrl):
                 name = self.cur_add+'.'+oname
             else:
                 name = oname
+            #cached value or pending request
+            if self.infos.has_key(name):
+                infostr = self.infos[name]
+                if hasattr(infostr, 'cancel'):
+                    return '...'
+                return infostr
+
+            #type known to be too slow to evaluate
+            if type_string in self.tool.slow_types:
+                return '<slow - not evaluated>'
+
             #get the info/value string
             info = self.tool.get_type_info(type_string)
             if info is None:
@@ -531,14 +576,53 @@ class NSBrowserList(AutoSizeListCtrl):
             except:
                 infostr = 'UNKNOWN'
 
+            #info callables may return a non-blocking request
+            if hasattr(infostr, 'add_callback'):
+                self.infos[name] = infostr
+                infostr.add_callback( lambda req: 
+                                        self._OnInfo(req, name, type_string) )
+                #callback may have been called immediately
+                infostr = self.infos[name]
+                if hasattr(infostr, 'cancel'):
+                    return '...'
+
             #check value
             if infostr is None:
                 infostr = 'UNKNOWN'
+            self.infos[name] = infostr
             return infostr
         #another column!?!
         else:
             return None
 
+    def _OnInfo(self, req, name, type_string):
+        """
+        Info/value request callback - store the string and redraw the row
+        """
+        if self.infos.get(name, None) is not req:
+            return
+        try:
+            infostr = req.result()
+        except EngineTimeoutError:
+            #do not evaluate this type again
+            self.tool.slow_types.add(type_string)
+            infostr = '<timed out>'
+        except:
+            infostr = 'UNKNOWN'
+        if infostr is None:
+            infostr = 'UNKNOWN'
+        self.infos[name] = infostr
+
+        #find the row to refresh
+        if self.cur_add!='':
+            oname = name[len(self.cur_add)+1:]
+        else:
+            oname = name
+        for row in xrange(0, len(self.items)):
+            if self.items[row][0]==oname:
+                self.RefreshItem(row)
+                break
+
     def OnGetItemImage(self, row):
         """Get the icon number to use for the item in row=row)"""
         if row>len(self.items)-1:
@@ -41,7 +41,9 @@ def rename_object(globals, locals, oname, new):
 #---Get dir listing details for the namespace browser---------------------------
 def get_dir_list(globals, locals, address):
     """
-    Get the namespace browser dirlisting.
+    Get the namespace browser dirlisting. This is a generator task yielding
+    (name,type_string,istype,isrout,ismod,isinst) for each name so the listing
+    can be streamed to the browser (see Console.run_task_stream).
     """    
     import inspect
 
@@ -53,9 +55,9 @@ def get_dir_list(globals, locals, address):
             if name not in names:
                 names.append(name)
     else:
-        #get the object
-        obj = eval(address, globals, locals)
-        names = dir(obj)
+        #get the object - evaluated once, the names are then looked up on it
+        parent = eval(address, globals, locals)
+        names = dir(parent)
 
     #print locals.keys(), globals.keys()
     #try:
@@ -64,16 +66,15 @@ def get_dir_list(globals, locals, address):
     #except:
     #    names = []
 
-    dirlist = []
-
     for name in names:
         try:
             #get the object
             if address!='':
-                oname = address+'.'+name
+                obj = getattr(parent, name)
+            elif name in locals:
+                obj = locals[name]
             else:
-                oname = name
-            obj = eval(oname, globals, locals)
+                obj = globals[name]
                 
             #get flags
             istype = inspect.isclass(obj)
@@ -91,8 +92,5 @@ def get_dir_list(globals, locals, address):
             ismod  = True
             isinst = True
         #add to listing
-        dirlist.append( (name,type_string,istype,isrout,ismod,isinst) )
-    
-    #return the results
-    return dirlist
+        yield (name,type_string,istype,isrout,ismod,isinst)
 
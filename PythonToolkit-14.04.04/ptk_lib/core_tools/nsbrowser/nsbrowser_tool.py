@@ -42,6 +42,10 @@ class NamespaceBrowser(Tool):
         self.type_icons = {} #{type_string:icon}
         self.type_infos = {} #{type_string:info callable}
 
+        #types whose info/value request timed out, these are not evaluated
+        #again (see type_infos.INFO_TIMEOUT)
+        self.slow_types = set()
+
         #dictionary of registered python type actions {name:Action object}
         self.type_actions = {}
 
@@ -197,7 +201,8 @@ class NamespaceBrowser(Tool):
         """
         Set a callable to fetch the text string that appears in the info/value  
         column of the NSBrowser. The callable should take an engine interface 
-        instance and object name string as arguments and return a string.
+        instance and object name string as arguments and return a string or a
+        non-blocking EngineRequest (i.e. eng.evaluate_async) for the string.
 
         Returns True if sucessfull, False if an info callable is already 
         registered for the python type.
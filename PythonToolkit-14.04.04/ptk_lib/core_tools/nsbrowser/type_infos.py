@@ -2,13 +2,20 @@
 Module conatinging callables to get info/value string for NSBrowser
 
 format: callable(eng, oname)
+
+The callable can return either the string or a non-blocking EngineRequest 
+(i.e. from eng.evaluate_async) whose result is the string. Requests should use
+a timeout (INFO_TIMEOUT) so a slow __str__ cannot hold up the browser, types 
+that time out are not evaluated again.
 """
+#time allowed for an info/value request (seconds)
+INFO_TIMEOUT = 2.0
 
 def infovalue(eng,oname):
     """
     Used by the namespace browsers info/value column defaults to string 
     representation of object returned by __repr__
     """
-    res = eng.evaluate('str('+oname+')')    
+    res = eng.evaluate_async('str('+oname+')', timeout=INFO_TIMEOUT)
     return res
 
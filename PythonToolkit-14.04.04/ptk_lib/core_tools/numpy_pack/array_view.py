@@ -49,11 +49,15 @@ class ArrayView(TypeView):
 #---------------------------------------------------------------------------
 class ArrayTable(wx.grid.PyGridTableBase):
     """A custom grid table to get data from an array (of upto 2dimensions)"""
+    #size of the blocks of the array fetched from the engine at a time
+    block_size = 64
+
     def __init__(self, oname,eng):
         wx.grid.PyGridTableBase.__init__(self)
         self.oname = oname
         self.eng=eng
         self.disabled = False
+        self.blocks = {}    #cache of array blocks {(blockrow,blockcol):block}
 
         #reference to message bus for sending engine state change msesages
         app = wx.GetApp()
@@ -64,7 +68,7 @@ class ArrayTable(wx.grid.PyGridTableBase):
         self.cell.SetBackgroundColour(wx.WHITE)
         
         self.shape,self.ndim = self.eng.evaluate('('+self.oname+'.shape ,'+self.oname+'.ndim )')
-
+        self.Resolve()
 
     #---Overloaded methods for this virtual grid--------------------------------
     def GetAttr(self, row, col, kind):
@@ -94,16 +98,67 @@ class ArrayTable(wx.grid.PyGridTableBase):
         if self.disabled:
             return ''
         if self.ndim ==1:
-            value = self.eng.evaluate(self.oname+'['+str(col)+']')
+            block = self.GetBlock(0, col)
+            if block is None:
+                return ''
+            value = block[col%self.block_size]
         elif self.ndim ==2 :
-            value = self.eng.evaluate(self.oname+'['+str(row)+','+str(col)+']')
+            block = self.GetBlock(row, col)
+            if block is None:
+                return ''
+            value = block[row%self.block_size, col%self.block_size]
         else:
             value = ''
         return value
 
+    def GetBlock(self, row, col):
+        """
+        Get the block of the array containing the cell at row, col. Blocks are
+        fetched from the engine as arrays and cached until the table is 
+        refreshed.
+        """
+        n = self.block_size
+        key = (row/n, col/n)
+        if self.blocks.has_key(key):
+            return self.blocks[key]
+
+        c0 = key[1]*n
+        cols = str(c0)+':'+str(c0+n)
+        if self.ndim == 1:
+            source = '%s['+cols+']'
+        else:
+            r0 = key[0]*n
+            source = '%s['+str(r0)+':'+str(r0+n)+','+cols+']'
+        try:
+            block = self.eng.evaluate(source%self.ref)
+            if (block is None) and (self.ref != self.oname):
+                #handle is stale - resolve again
+                self.Resolve()
+                block = self.eng.evaluate(source%self.ref)
+        except:
+            block = None
+        self.blocks[key] = block
+        return block
+
+    def Resolve(self):
+        """
+        Resolve the array address to an engine handle used to fetch the blocks
+        without evaluating the address each time (the address is used if it 
+        cannot be resolved).
+        """
+        try:
+            self.ref = str(self.eng.resolve(self.oname))
+        except:
+            self.ref = self.oname
+
+    def ClearBlocks(self):
+        """Clear the cached array blocks"""
+        self.blocks = {}
+
     def SetValue(self, row, col, value):
         if self.disabled:
             return None
+        self.ClearBlocks()
         if self.ndim == 1:
             self.eng.execute(self.oname+'['+str(col)+']='+str(value))
         elif self.ndim == 2:
@@ -127,8 +182,10 @@ class ArrayTable(wx.grid.PyGridTableBase):
         """Update the table shape and ndim and adjust the grid as needed"""
         if self.disabled:
             return
+        self.ClearBlocks()
 
         shape,ndim = self.eng.evaluate('('+self.oname+'.shape ,'+self.oname+'.ndim )')
+        self.Resolve()
         
         #get old size
         if self.ndim==1:
@@ -176,6 +233,7 @@ class ArrayTable(wx.grid.PyGridTableBase):
 
     def Disable(self):
         self.disabled = True
+        self.ClearBlocks()
 
     def Enable(self,eng):
         self.eng = eng
@@ -50,11 +50,8 @@ class NumpyImporter(Importer):
         console = self.app.toolmgr.get_tool('Console')
         engine = console.get_current_engine()
 
-        #register import task with engine
-        if 'numpy_load' not in engine.get_registered_tasks():
-            engine.register_task(numpy_load)
         #import
-        err = engine.run_task('numpy_load',(filepath,))
+        err = engine.run_task(numpy_load,(filepath,))
         #check return err
         if err!='':
             #show error message dialo
@@ -71,11 +68,8 @@ class NumpyImporter(Importer):
         console = self.app.toolmgr.get_tool('Console')
         engine = console.get_current_engine()
 
-        #register import task with engine
-        if 'numpy_loadtxt' not in engine.get_registered_tasks():
-            engine.register_task(numpy_loadtxt)
         #import
-        err = engine.run_task('numpy_loadtxt',(filepath,','))
+        err = engine.run_task(numpy_loadtxt,(filepath,','))
         #check return err
         if err!='':
             #show error message dialo
@@ -123,30 +117,31 @@ class NumpyExporter(Exporter):
         d.Destroy()
         opt_txt.Destroy()
 
-        #numpy binary format
+        #export on the engine's bulk worker queue so the gui and other tools
+        #are not held up by large arrays
         if ext=='npy':
-            #register export task with engine
-            if 'numpy_save' not in engine.get_registered_tasks():
-                engine.register_task(numpy_save)
-            #export
-            err = engine.run_task('numpy_save',(onames,fnames))
-
-        #numpy binary zip format
+            #numpy binary format
+            task, args = numpy_save, (onames,fnames)
         elif ext=='npz':
-            #register export task with engine
-            if 'numpy_savez' not in engine.get_registered_tasks():
-                engine.register_task(numpy_savez)
-            #export
-            err = engine.run_task('numpy_savez',(onames,fnames[0]))
-
+            #numpy binary zip format
+            task, args = numpy_savez, (onames,fnames[0])
         elif ext=='txt':
-            #get options from text options dialo
+            #get options from text options dialog
             fmt, delimiter = opt_txt.GetOptions()
-            #register export task with engine
-            if 'numpy_savetxt' not in engine.get_registered_tasks():
-                engine.register_task(numpy_savetxt)
-            #export
-            err = engine.run_task('numpy_savetxt',(onames, fnames, fmt, delimiter))
+            task, args = numpy_savetxt, (onames, fnames, fmt, delimiter)
+        else:
+            return
+        engine.run_task_async(task, args, callback=self._OnExported, 
+                                queue='bulk')
+
+    def _OnExported(self, req):
+        """
+        Export task finished - show any errors
+        """
+        try:
+            err = req.result()
+        except Exception as e:
+            err = str(e)
 
         #check return err
         if err!='':
@@ -12,6 +12,7 @@ from ptk_lib.tool_manager import Tool
 
 #extensions
 from ptk_lib.core_tools.nsbrowser import type_icons
+from ptk_lib.core_tools.nsbrowser.type_infos import INFO_TIMEOUT
 
 from numpy_io import NumpyImporter, NumpyExporter
 import array_view
@@ -64,6 +65,5 @@ class NumPyPack(Tool):
 #---NSBrowser infovalue functions-----------------------------------------------
 def array_infovalue(eng,oname):
     """Numpy array info/value function"""
-    shape,dtype = eng.evaluate('( str('+oname+'.shape), str('+oname+'.dtype) )')
-    info = 'shape = '+shape+'; dtype = '+dtype
-    return info
+    source = "'shape = '+str("+oname+".shape)+'; dtype = '+str("+oname+".dtype)"
+    return eng.evaluate_async(source, timeout=INFO_TIMEOUT)
@@ -264,19 +264,8 @@ class PathManPanel(wx.Panel):
         app = wx.GetApp()
         self.console = app.toolmgr.get_tool('Console')
 
-        #register enginetasks
+        #get the engine (the pathman tasks are registered when first used)
         eng = self.console.get_current_engine()
-        tasks =  eng.get_registered_tasks()
-        if 'get_sys_path' not in tasks:
-            eng.register_task(pathman_tasks.get_sys_path)
-        if 'add_to_sys_path' not in tasks:
-                eng.register_task(pathman_tasks.add_to_sys_path)
-        if 'remove_from_sys_path' not in tasks:
-                eng.register_task(pathman_tasks.remove_from_sys_path)
-        if 'move_up_sys_path' not in tasks:
-                eng.register_task(pathman_tasks.move_up_sys_path)
-        if 'move_down_sys_path' not in tasks:
-                eng.register_task(pathman_tasks.move_down_sys_path)
 
         #static box
         box = wx.StaticBox(self, -1, "Python module search path (sys.path):")
@@ -286,7 +275,7 @@ class PathManPanel(wx.Panel):
         boxsizer = wx.StaticBoxSizer(box, wx.VERTICAL)
 
         #add a list box of sys.path
-        paths = eng.run_task( 'get_sys_path' )
+        paths = eng.run_task(pathman_tasks.get_sys_path)
         self.plist = wx.ListBox(self,-1, choices=paths, 
                     style=wx.LB_SINGLE|wx.HSCROLL)
         
@@ -328,7 +317,7 @@ class PathManPanel(wx.Panel):
         if dirname!='':
             eng = self.console.get_current_engine()
             #add the dir to the engines sys.path
-            paths = eng.run_task('add_to_sys_path',(dirname,))
+            paths = eng.run_task(pathman_tasks.add_to_sys_path,(dirname,))
             #update the list
             self.plist.SetItems(paths)
 
@@ -345,7 +334,7 @@ class PathManPanel(wx.Panel):
             dirname = self.plist.GetString(n)
             #remove the dir from the engines sys.path
             eng = self.console.get_current_engine()
-            paths = eng.run_task('remove_from_sys_path',(dirname,))
+            paths = eng.run_task(pathman_tasks.remove_from_sys_path,(dirname,))
             #update the list
             self.plist.SetItems(paths)
 
@@ -357,7 +346,7 @@ class PathManPanel(wx.Panel):
         dirname = self.plist.GetString(n)
         #move the dir up in the engines sys.path
         eng = self.console.get_current_engine()
-        paths,newn = eng.run_task('move_up_sys_path',(dirname,))
+        paths,newn = eng.run_task(pathman_tasks.move_up_sys_path,(dirname,))
         #update the list
         self.plist.SetItems(paths)
         self.plist.SetSelection(newn)
@@ -370,7 +359,7 @@ class PathManPanel(wx.Panel):
         dirname = self.plist.GetString(n)
         #move the dir down in the engines sys.path
         eng = self.console.get_current_engine()
-        paths,newn = eng.run_task('move_down_sys_path',(dirname,))
+        paths,newn = eng.run_task(pathman_tasks.move_down_sys_path,(dirname,))
         #update the list
         self.plist.SetItems(paths)
         self.plist.SetSelection(newn)
@@ -53,6 +53,7 @@ class ListTable(wx.grid.PyGridTableBase):
 
         #Store some info about the list
         self.len = self.eng.evaluate('len('+self.oname+')')
+        self.Resolve()
 
         #set some table/grid attributes
         self.cell=wx.grid.GridCellAttr()
@@ -78,7 +79,12 @@ class ListTable(wx.grid.PyGridTableBase):
         if self.disabled:
             return ''
         #we display the string representation of the object in the cell.
-        value = self.eng.evaluate('str('+self.oname+'['+str(col)+'])')
+        source = 'str(%s['+str(col)+'])'
+        value = self.eng.evaluate(source%self.ref, cache=True)
+        if (value is None) and (self.ref != self.oname):
+            #handle is stale - resolve again
+            self.Resolve()
+            value = self.eng.evaluate(source%self.ref, cache=True)
         return value
 
     def SetValue(self, row, col, value):
@@ -92,6 +98,17 @@ class ListTable(wx.grid.PyGridTableBase):
     def GetColLabelValue(self,col):
         return col
 
+    def Resolve(self):
+        """
+        Resolve the list address to an engine handle used to get the cell 
+        values without evaluating the address for every cell (the address is 
+        used if it cannot be resolved).
+        """
+        try:
+            self.ref = str(self.eng.resolve(self.oname))
+        except:
+            self.ref = self.oname
+
     def GetRowLabelValue(self, row):
         return ''
 
@@ -101,6 +118,7 @@ class ListTable(wx.grid.PyGridTableBase):
             return
 
         len = self.eng.evaluate('len('+self.oname+')')
+        self.Resolve()
 
         #get old size
         oldcols = self.len
@@ -92,6 +92,7 @@ class TypeViewer(wx.Panel):
         #create dummy view and show message
         self.ShowMessage('No view for this object type',bmp='error')
         self.typestr=None
+        self.request = None     #outstanding engine request
         self.view = TypeView(self,self.oname,self.engname)
         self.psizer.Add(self.view,1,wx.EXPAND)
         self.SetSizer(self.psizer)
@@ -123,15 +124,65 @@ class TypeViewer(wx.Panel):
             self.view.DisableView()
             return
 
-        #check object exists
-        exists = eng.run_task('object_exists',(self.oname,))
-        if exists is False:
+        #check object exists and the object type using a single batch request,
+        #the view is updated when the result arrives.
+        if self.request is not None:
+            self.request.cancel()
+        self.request = eng.run_batch_async( self.GetRefreshItems(self.engname), 
+                        callback=lambda req: self._OnObjectType(req, eng))
+
+    def GetRefreshItems(self, engname):
+        """
+        Returns the batch items used to refresh the view; check the object 
+        exists and get its type.
+        """
+        return [ ('object_exists',(self.oname,)),
+                  self.oname+'.__class__.__module__ + "." +'+self.oname+'.__class__.__name__' ]
+
+    def OnScheduledRefresh(self, engname, results):
+        """
+        Refresh callback for the console tool's refresh scheduler, results are
+        the results of the GetRefreshItems batch or None.
+        """
+        if not self:
+            return
+        if results is None:
+            self.RefreshView()
+            return
+        #the batched results are newer than any outstanding request
+        if self.request is not None:
+            self.request.cancel()
+            self.request = None
+        eng = self.console.get_engine_console(self.engname)
+        self._UpdateView(results, eng)
+
+    def _OnObjectType(self, req, eng):
+        """
+        Called when the object exists/type batch request is complete
+        """
+        #viewer closed or a newer request was sent
+        if (not self) or (req is not self.request):
+            return
+        self.request = None
+
+        if req.exception() is not None:
+            self.ShowMessage('The engine containing the object has been closed',bmp='error')
+            self.view.DisableView()
+            return
+        self._UpdateView(req.result(), eng)
+
+    def _UpdateView(self, results, eng):
+        """
+        Update the view from the object exists/type results
+        """
+        exists, otype = results
+        if exists is not True:
             self.ShowMessage('The object no longer exists',bmp='error')
             self.view.DisableView()
             return
 
-        #check the object type
-        otype = eng.evaluate( self.oname+'.__class__.__module__ + "." +'+self.oname+'.__class__.__name__')
+        if isinstance(otype, Exception):
+            otype = None
 
         #same as current view refresh it
         if otype==self.typestr:
@@ -18,7 +18,9 @@ from ptk_lib.message_bus.mb_node import MBLocalNode
 from ptk_lib.message_bus import mb_protocol
 
 from ptk_lib.engine import eng_messages
+from ptk_lib.engine import eng_namespace
 from ptk_lib.core_tools.console import console_messages
+from ptk_lib.core_tools.console import refresh
 
 import view_messages
 import type_views
@@ -60,9 +62,11 @@ class ViewsTool(Tool):
                                 self.msg_eng_disconnect)  
                                 
         self.msg_node.subscribe( eng_messages.ENGINE_STATE_DONE, 
-                                 self.msg_eng_change)
+                                 self.msg_eng_done)
         self.msg_node.subscribe( eng_messages.ENGINE_STATE_CHANGE, 
                                  self.msg_eng_change)
+        self.msg_node.subscribe( eng_messages.ENGINE_NAMESPACE_CHANGED, 
+                                 self.msg_ns_changed)
 
         #get a reference to the console tool
         self.contool = self.toolmgr.get_tool('Console')
@@ -125,6 +129,13 @@ class ViewsTool(Tool):
         self.open_viewers[engname] = eng_viewers
         vpanel.Bind(wx.EVT_WINDOW_DESTROY,self.on_viewer_close,vpanel)
 
+        #viewer refreshes are debounced/batched by the console tool
+        self.contool.refresher.add( self._refresh_name(engname, oname),
+                                    vpanel.OnScheduledRefresh,
+                                    visible=vpanel.IsShownOnScreen,
+                                    priority=refresh.PRIORITY_NORMAL,
+                                    queries=vpanel.GetRefreshItems)
+
         #add the panel as a aui pane to the console window, initially floating
         name = 'View: '+oname+' ['+engname+']'
         pane = aui.AuiPaneInfo()
@@ -148,28 +159,31 @@ class ViewsTool(Tool):
 
     def refresh_viewers(self,engname=None,oname=None):
         """
-        Refresh open viewers.
+        Schedule a refresh of open viewers.
         If engname is given all viewers for that engine will be refreshed.
         If engname and oname are given only that viewer (if it exists) will
         be refreshed.
         """
         if engname is None:
-            engs  = self.open_viewers.keys()
-            for eng in engs:
-                eng_viewers = self.open_viewers[eng]
-                for viewer in eng_viewers.values():
-                    viewer.Refresh()
-            return
-
-        eng_viewers = self.open_viewers.get(engname,{})
-        if oname is None:
-            for viewer in eng_viewers.values():
-                viewer.RefreshView()
-            return
-
-        viewer = eng_viewers.get(oname,None)
-        if viewer is not None:
-            viewer.RefreshView()
+            engnames = self.open_viewers.keys()
+        else:
+            engnames = [engname]
+
+        refresher = self.contool.refresher
+        for eng in engnames:
+            eng_viewers = self.open_viewers.get(eng,{})
+            if oname is None:
+                onames = eng_viewers.keys()
+            elif oname in eng_viewers:
+                onames = [oname]
+            else:
+                onames = []
+            for name in onames:
+                refresher.schedule(self._refresh_name(eng, name), eng)
+
+    def _refresh_name(self, engname, oname):
+        """Name of the viewer's refresh in the console tool's scheduler"""
+        return 'Views.'+engname+'.'+oname
 
     #---Message handlers--------------------------------------------------------
     def msg_eng_connect(self,msg):
@@ -191,12 +205,34 @@ class ViewsTool(Tool):
 
     def msg_eng_change(self,msg):
         """
-        Message handler for ENGINE_STATE_CHANGE/DONE messages.
+        Message handler for ENGINE_STATE_CHANGE messages.
         Update viewers
         """
         engname = msg.get_from()
         self.refresh_viewers(engname, oname=None)
 
+    def msg_eng_done(self,msg):
+        """
+        Message handler for ENGINE_STATE_DONE messages.
+        Update viewers if the debugger was enabled (the objects may have been 
+        in a debugger scope), otherwise changes are handled by msg_ns_changed.
+        """
+        debug, profile = msg.get_data()
+        if debug is True:
+            self.refresh_viewers(msg.get_from(), oname=None)
+
+    def msg_ns_changed(self,msg):
+        """
+        Message handler for ENGINE_NAMESPACE_CHANGED messages.
+        Update the viewers of objects affected by the names changed.
+        """
+        engname = msg.get_from()
+        changes = msg.get_data()
+        eng_viewers = self.open_viewers.get(engname,{})
+        for oname in eng_viewers.keys():
+            if eng_namespace.affects(changes, oname):
+                self.refresh_viewers(engname, oname)
+
     def msg_open_view(self,msg):
         """
         Message handler for Views.OpenView.
@@ -222,6 +258,7 @@ class ViewsTool(Tool):
         if eng_viewers is {}:
             return
         eng_viewers.pop( oname , None)
+        self.contool.refresher.remove(self._refresh_name(engname, oname))
 
 
 #-------------------------------------------------------------------------------
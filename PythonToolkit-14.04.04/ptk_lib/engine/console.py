@@ -10,6 +10,13 @@ read_stdin etc to define what to do when communicating with the engine.
 
 The console also provides the interface to determine the engines state and to 
 control the engine and debugger/profiler.
+
+Most engine interfaces have a blocking form (run_task, evaluate etc) and a 
+non-blocking *_async form which returns an EngineRequest object. The result of
+the request is delivered by a CON_REPLY message and is handled in the same 
+thread as the other console messages (the wx main thread in PTK). Tasks that 
+return an iterable can also be streamed (run_task_stream) so the items arrive 
+in chunks as they are produced.
 """
 #---logging---------------------------------------------------------------------
 import logging
@@ -17,13 +24,34 @@ log = logging.getLogger(__name__)
 #log.setLevel(logging.DEBUG)
 
 import marshal
+import cPickle
+import hashlib
+import types
 import os
 import signal
+import copy
+from collections import OrderedDict
 
 from ptk_lib.message_bus.mb_node import MBLocalNode
 from ptk_lib.message_bus import mb_protocol
 
 import eng_messages
+import eng_buffers
+import eng_shm
+import eng_tasks
+from eng_misc import EngineTimeoutError
+
+#---Globals---------------------------------------------------------------------
+#number of output characters written before acknowledging them to the engine 
+#(see Engine.set_output_options for the engine side of the flow control)
+OUTPUT_ACK_SIZE = 65536
+
+#time (in seconds) after a request timeout to wait for the engine to reply 
+#before the request fails without the engine (see schedule_timeout)
+TIMEOUT_GRACE = 0.5
+
+#maximum number of task/evaluate results kept in the query cache
+QUERY_CACHE_SIZE = 1000
 
 #---Console class---------------------------------------------------------------
 class Console(MBLocalNode):
@@ -40,6 +68,7 @@ class Console(MBLocalNode):
         self.engicon = None             #engine icon
         self.englabel = None            #engine label
         self.engpid = None              #engine process id
+        self.enghost = None             #host name of the engine's machine
 
         #flags to keep track of engine state
         self.busy      = False          #engine is running a command
@@ -47,10 +76,36 @@ class Console(MBLocalNode):
         self.profile   = False          #engine profiler is enabled
         self.reading   = False          #engine is waiting to read from stdin
         self.debugging = False          #engine is in debugging mode.
+        self.jobs = set()               #ids of running background jobs
 
         #debugger interface
         self.debugger = DebuggerInterface(self)
 
+        #tasks known to be registered in the managed engine {taskname: hash}
+        #see run_task
+        self._task_hashes = {}
+
+        #results of read only tasks/evaluations, flushed whenever the engine 
+        #state may have changed (see run_task). The names of the tasks declared
+        #cacheable (see eng_tasks.cacheable).
+        self.cache = QueryCache(QUERY_CACHE_SIZE)
+        self._cacheable = set([task.func_name for task in vars(eng_tasks).values()
+                                if getattr(task, 'cacheable', False) is True])
+
+        #outstanding non-blocking requests {reqid: EngineRequest}
+        self._requests = {}
+        self._reqcount = 0
+
+        #shared memory ring buffer for output/results from a local engine
+        self._ring = None
+
+        #engine output waiting to be written [[subject, [strings]],...], see 
+        #queue_output
+        self._outqueue = []
+        self._outscheduled = False
+        self._outwritten = 0            #written but not yet acknowledged
+        self.output_policy = 'block'    #engine output flow control policy
+
         #profiler interface
         #TODO
 
@@ -70,6 +125,9 @@ class Console(MBLocalNode):
         #others
         self.set_handler( eng_messages.CON_CLEAR, self.msg_console_clear)
         self.set_handler( eng_messages.CON_EXECSOURCE, self.msg_execsource)
+        self.set_handler( eng_messages.CON_REPLY, self.msg_reply)
+        self.set_handler( eng_messages.CON_REPLY_CHUNK, self.msg_reply_chunk)
+        self.set_handler( eng_messages.CON_SHM_NOTIFY, self.msg_shm_notify)
 
     #---engine-console interactions---------------------------------------------
     def set_managed_engine(self, engnode):
@@ -96,6 +154,14 @@ class Console(MBLocalNode):
                                 self.msg_busy)
             self.unsubscribe( eng_messages.ENGINE_STATE_DONE+'.'+self.engine,
                                 self.msg_done)
+            self.unsubscribe( eng_messages.ENGINE_STATE_CHANGE+'.'+self.engine,
+                                self.msg_state_change)
+            self.unsubscribe( eng_messages.ENGINE_NAMESPACE_CHANGED+'.'+
+                                self.engine, self.msg_state_change)
+            self.unsubscribe( eng_messages.ENGINE_JOB_STARTED+'.'+self.engine,
+                                self.msg_job_started)
+            self.unsubscribe( eng_messages.ENGINE_JOB_DONE+'.'+self.engine,
+                                self.msg_job_done)
 
         #subscribe to new engines messages
         #system messages
@@ -107,6 +173,15 @@ class Console(MBLocalNode):
         #busy/done
         self.subscribe( eng_messages.ENGINE_STATE_BUSY+'.'+engnode, self.msg_busy)
         self.subscribe( eng_messages.ENGINE_STATE_DONE+'.'+engnode, self.msg_done)
+        self.subscribe( eng_messages.ENGINE_STATE_CHANGE+'.'+engnode, 
+                        self.msg_state_change)
+        #background jobs change objects while they run
+        self.subscribe( eng_messages.ENGINE_NAMESPACE_CHANGED+'.'+engnode,
+                        self.msg_state_change)
+        self.subscribe( eng_messages.ENGINE_JOB_STARTED+'.'+engnode,
+                        self.msg_job_started)
+        self.subscribe( eng_messages.ENGINE_JOB_DONE+'.'+engnode,
+                        self.msg_job_done)
 
         #do debugger/profiler set_managed_engine
         self.debugger._set_managed_engine(engnode)
@@ -139,6 +214,11 @@ class Console(MBLocalNode):
          #set the is_interactive flag to indicate the console can do things.
         self.is_interactive = True 
 
+        #new engine (or restarted) - no tasks registered by this console yet
+        self._task_hashes = {}
+        self.cache.clear()
+        self._outwritten = 0
+
         #store engine attributes (type, icon and label)
         self.engtype = info['engtype']
         self.engicon = info['engicon']
@@ -146,6 +226,12 @@ class Console(MBLocalNode):
         if self.englabel is None:
             self.englabel = self.engine
         self.engpid = info['pid']
+        self.enghost = info.get('host', None)
+        self.jobs = set(info.get('jobs', ()))
+
+        #use the shared memory ring if the engine opened one
+        if info.get('shm', None) is not None:
+            self._open_ring(info['shm'])
 
         return True
 
@@ -173,6 +259,9 @@ class Console(MBLocalNode):
         if res is False:
             return False    #should not happen?
 
+        #read anything left in the shared memory ring
+        self._close_ring()
+
         #unsubscribe from previous engine messages
         if self.engine is not None:
             #system messages
@@ -186,6 +275,14 @@ class Console(MBLocalNode):
                                 self.msg_busy)
             self.unsubscribe( eng_messages.ENGINE_STATE_DONE+'.'+self.engine,
                                 self.msg_done)
+            self.unsubscribe( eng_messages.ENGINE_STATE_CHANGE+'.'+self.engine,
+                                self.msg_state_change)
+            self.unsubscribe( eng_messages.ENGINE_NAMESPACE_CHANGED+'.'+
+                                self.engine, self.msg_state_change)
+            self.unsubscribe( eng_messages.ENGINE_JOB_STARTED+'.'+self.engine,
+                                self.msg_job_started)
+            self.unsubscribe( eng_messages.ENGINE_JOB_DONE+'.'+self.engine,
+                                self.msg_job_done)
                      
         self.engine = None           
         self.is_interactive = False #interactive flag
@@ -193,6 +290,11 @@ class Console(MBLocalNode):
         self.engicon = None         #engine icon
         self.englabel = None        #engine label
         self.engpid = None          #engine pid
+        self.enghost = None         #engine host name
+        self.jobs = set()           #running background jobs
+
+        #fail any outstanding requests
+        self._fail_requests('Stopped managing engine')
         
         return True
 
@@ -212,66 +314,153 @@ class Console(MBLocalNode):
         #send the line to the engine
         self.send_msg( self.engine, eng_messages.ENG_PUSH, (line,))
 
-    def register_task( self, task):
+    def register_task( self, task, replace=False):
         """
-        Register a complex task with the engine.
+        Register a complex task with the engine. If replace is True any existing
+        task with the same name is replaced.
         """
         if self.is_interactive is False:
             raise Exception('Managed engine is not active')
 
         s = marshal.dumps(task.func_code)
         res = self.send_msg( self.engine, eng_messages.ENG_REGISTERTASK,
-                                        (s,), get_result=True)
+                                        (s, replace), get_result=True)
+        if res is True:
+            self._task_hashes[task.func_name] = _task_hash(task)
         return res
 
-    def run_task(self, taskname, args=(),kwargs={}, scope=None):
+    def run_task(self, taskname, args=(),kwargs={}, scope=None, timeout=None):
         """
-        Run a complex task in the engine (must have been previously registered 
-        using register_task).
+        Run a complex task in the engine. 
+        
+        taskname can be the name of a task previously registered using 
+        register_task or the task function itself, in which case it is 
+        registered automatically the first time it is used with this engine 
+        (or again if the function code has changed).
+
         If the debugger is active and an integer scope is given the code will
         be exectuted in the scope at that level (scope=0 is the users namespace 
         dictionary), if scope is None the code will be executed in the user 
         namespace.
+
+        If a timeout (in seconds) is given the task is interrupted if it has not
+        finished in time and an EngineTimeoutError is raised.
         """
         if self.is_interactive is False:
             raise Exception('Managed engine is not active')
 
-        res = self.send_msg( self.engine, eng_messages.ENG_RUNTASK, 
-                                (taskname,args,kwargs,scope), get_result=True)
+        taskname = self._check_task(taskname)
+
+        #read only tasks can use cached results
+        key = None
+        if taskname in self._cacheable:
+            key = self._cache_key('task', taskname, args, kwargs, scope)
+            if key is not None:
+                found, res = self.cache.get(key)
+                if found is True:
+                    return res
+
+        res = self._send_query( eng_messages.ENG_RUNTASK, 
+                                (taskname,args,kwargs,scope), timeout)
 
         if isinstance(res, Exception):
             raise res
 
+        res = eng_buffers.unpack(res)
+        if key is not None:
+            self.cache.put(key, res)
         return res
 
-    def execute(self, source, scope=None):
+    def run_batch(self, items, scope=None, timeout=None):
+        """
+        Run a batch of tasks and/or evaluations in the engine using a single 
+        message. Items is a list of (taskname, args, kwargs) tuples (args and 
+        kwargs are optional) or expression strings to evaluate.
+
+        Returns a list of the results, if an item fails the exception is 
+        returned in its place (it is not raised).
+        The taskname, scope and timeout arguments are as for run_task.
+        """
+        if self.is_interactive is False:
+            raise Exception('Managed engine is not active')
+
+        items = self._check_batch(items)
+
+        res = self._send_query( eng_messages.ENG_RUNTASK_BATCH, (items,scope),
+                                timeout)
+
+        if isinstance(res, Exception):
+            raise res
+
+        return eng_buffers.unpack(res)
+
+    def execute(self, source, scope=None, timeout=None):
         """
         Execute source in the engine. 
         If the debugger is active and an integer scope is given the code will
         be exectuted in the scope at that level (scope=0 is the users namespace 
         dictionary), if scope is None the code will be executed in the user 
         namespace.
+        The timeout argument is as for run_task.
         """
         if self.is_interactive is False:
             raise Exception('Managed engine is not active')
 
-        res = self.send_msg( self.engine, eng_messages.ENG_EXECCOMMAND, 
-                                    (source,scope), get_result=True)
+        self.cache.clear()
+        res = self._send_query( eng_messages.ENG_EXECCOMMAND, (source,scope),
+                                timeout)
         return res
 
-    def evaluate(self, source, scope=None):
+    def evaluate(self, source, scope=None, timeout=None, cache=False):
         """
         Evaluate source in the engine.
         If the debugger is active and an integer scope is given the code will
         be exectuted in the scope at that level (scope=0 is the users namespace 
         dictionary), if scope is None the code will be executed in the user 
         namespace.
+        The timeout argument is as for run_task.
+
+        If cache is True the source is read only (it does not change anything 
+        in the engine) and the result can be cached as for cacheable tasks.
+        """
+        if self.is_interactive is False:
+            raise Exception('Managed engine is not active')
+
+        key = None
+        if cache is True:
+            key = self._cache_key('eval', source, (), {}, scope)
+            if key is not None:
+                found, res = self.cache.get(key)
+                if found is True:
+                    return res
+
+        res = self._send_query( eng_messages.ENG_EVALCOMMAND, (source,scope),
+                                timeout)
+        if isinstance(res, Exception):
+            raise res
+
+        res = eng_buffers.unpack(res)
+        if key is not None:
+            self.cache.put(key, res)
+        return res
+
+    def resolve(self, address, scope=None, timeout=None):
+        """
+        Resolve the address string (e.g. 'a.b[2]') to an EngineHandle for the
+        object. The handle can be used in place of the address in expressions 
+        (as str(handle)) and as a task argument (the task is passed the object)
+        so the address is not evaluated again on each use. 
+
+        Handles become stale when user code has been run (ENGINE_STATE_DONE),
+        code is executed by a tool or the debugger pauses, resumes or changes 
+        scope and should then be resolved again.
+        The scope and timeout arguments are as for evaluate.
         """
         if self.is_interactive is False:
             raise Exception('Managed engine is not active')
 
-        res = self.send_msg( self.engine, eng_messages.ENG_EVALCOMMAND, 
-                                        (source,scope), get_result=True)
+        res = self._send_query( eng_messages.ENG_RESOLVE, (address,scope),
+                                timeout)
         if isinstance(res, Exception):
             raise res
         return res
@@ -299,12 +488,330 @@ class Console(MBLocalNode):
                                         get_result=True)
         return res
 
+    def clone(self, englabel=None):
+        """
+        Fork the managed engine into a new engine node with a copy of the user
+        namespace (unchanged memory is shared with this engine). Only supported
+        by py engines on posix systems. Returns the new engine node name.
+        englabel - label for the new engine, None uses the engine label with 
+                    ' (clone)' appended.
+        """
+        if self.is_interactive is False:
+            raise Exception('Managed engine is not active')
+
+        res = self.send_msg( self.engine, eng_messages.ENG_CLONE, (englabel,),
+                                        get_result=True)
+        return res
+
+    def new_namespace(self, englabel=None):
+        """
+        Create a namespace engine in the managed engine's process; a new engine
+        node with its own user namespace that shares the imported modules and 
+        runs commands one at a time with the other engines in the process (py
+        engines only). Returns the new engine node name.
+        englabel - label for the new engine, None uses the engine label with 
+                    the namespace number appended.
+        """
+        if self.is_interactive is False:
+            raise Exception('Managed engine is not active')
+
+        res = self.send_msg( self.engine, eng_messages.ENG_NEW_NAMESPACE, 
+                                (englabel,), get_result=True)
+        return res
+
+    def start_job(self, source):
+        """
+        Run the source in a background job in the managed engine, on its own
+        thread so the engine stays interactive (see eng_jobs). Returns the job
+        id.
+        """
+        return self.run_task('start_job', (source,))
+
+    def get_jobs(self):
+        """
+        Returns the managed engine's background job table, a list of 
+        dictionaries with keys: id, description, state, started, elapsed, 
+        output (number of characters captured) and error.
+        """
+        return self.run_task('get_jobs')
+
+    def stop_job(self, jobid):
+        """
+        Stop a running background job in the managed engine.
+        """
+        return self.run_task('stop_job', (jobid,))
+
     def is_task_registered(self, taskname):
         """
         Check if a task is registered
         """
         return taskname in self.get_registered_tasks()
 
+    def _check_task(self, task):
+        """
+        Register the task if it is a function not yet registered in the engine
+        by this console (or if the code has changed). Returns the task name.
+        """
+        if isinstance(task, types.FunctionType) is False:
+            return task
+        taskname = task.func_name
+        if getattr(task, 'cacheable', False) is True:
+            self._cacheable.add(taskname)
+        if self._task_hashes.get(taskname, None) != _task_hash(task):
+            self.register_task(task, replace=True)
+        return taskname
+
+    def _check_batch(self, items):
+        """
+        Register any task functions in the batch items, returns the items with 
+        the task names.
+        """
+        checked = []
+        for item in items:
+            if isinstance(item, basestring) is False:
+                item = (self._check_task(item[0]),) + tuple(item[1:])
+            checked.append(item)
+        return checked
+
+    def declare_cacheable(self, taskname, flag=True):
+        """
+        Declare a registered task as read only (or not) so its results are 
+        cached until the engine state changes. Task functions can instead be 
+        marked with the eng_tasks.cacheable decorator.
+        """
+        if flag is True:
+            self._cacheable.add(taskname)
+        else:
+            self._cacheable.discard(taskname)
+
+    def get_cache_stats(self):
+        """
+        Returns the query cache counters (see QueryCache.get_stats).
+        """
+        return self.cache.get_stats()
+
+    def _cache_key(self, kind, name, args, kwargs, scope):
+        """
+        Returns the query cache key for a task/evaluation or None if it cannot
+        be cached now (unhashable arguments, the engine is running code or has
+        background jobs running).
+        """
+        if (self.busy is True) and (self.debugger.paused is False):
+            return None
+        if self.jobs:
+            return None
+        key = (kind, name, args, tuple(sorted(kwargs.items())), scope)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    #---non-blocking engine interfaces------------------------------------------
+    def request(self, subject, data=(), callback=None, raise_result=False,
+                    timeout=None, queue=None):
+        """
+        Send a non-blocking request to the engine. The engine handles the data 
+        as if it was sent as a message with the subject given.
+
+        Returns an EngineRequest object, the optional callback is called with 
+        the EngineRequest when the result arrives. If raise_result is True an
+        exception returned by the engine is raised by EngineRequest.result().
+
+        If a timeout (in seconds) is given the engine interrupts the request if
+        it has not finished in time and the request fails with an 
+        EngineTimeoutError. The request also fails if the engine has not 
+        replied shortly after the timeout (see schedule_timeout).
+
+        Tasks and evaluations are run by the engine on worker threads, queue is
+        the name of the worker queue to use: 'interactive' (the default) for 
+        quick tool queries or 'bulk' for long running tasks.
+        """
+        if self.is_interactive is False:
+            raise Exception('Managed engine is not active')
+
+        self._reqcount = self._reqcount + 1
+        req = EngineRequest(self, self._reqcount, subject, raise_result)
+        if callback is not None:
+            req.add_callback(callback)
+        self._send_request(req, data, timeout, queue)
+        return req
+
+    def run_task_async(self, taskname, args=(), kwargs={}, scope=None, 
+                        callback=None, timeout=None, queue=None):
+        """
+        Non-blocking version of run_task, returns an EngineRequest. 
+        The optional callback is called with the EngineRequest when the task 
+        has finished. The timeout and queue arguments are as for request.
+        """
+        if self.is_interactive is False:
+            raise Exception('Managed engine is not active')
+        taskname = self._check_task(taskname)
+        return self.request( eng_messages.ENG_RUNTASK, 
+                                (taskname,args,kwargs,scope), callback, True,
+                                timeout, queue)
+
+    def run_task_stream(self, taskname, args=(), kwargs={}, scope=None,
+                        callback=None, chunk_callback=None, chunksize=200,
+                        timeout=None, queue=None):
+        """
+        Run a task returning an iterable (usually a generator task) and receive
+        the items as they are produced. Returns an EngineStream.
+
+        The optional chunk_callback is called with the EngineStream and the list
+        of new items as each chunk of up to chunksize items arrives, the 
+        callback is called when all the items have been received. The result of
+        the EngineStream is the list of all the items. Cancelling the 
+        EngineStream stops the engine producing further items.
+
+        The timeout and queue arguments are as for request, the timeout is for
+        the whole stream.
+        """
+        if self.is_interactive is False:
+            raise Exception('Managed engine is not active')
+        taskname = self._check_task(taskname)
+
+        self._reqcount = self._reqcount + 1
+        req = EngineStream(self, self._reqcount)
+        if chunk_callback is not None:
+            req.add_chunk_callback(chunk_callback)
+        if callback is not None:
+            req.add_callback(callback)
+        self._send_request(req, (taskname, args, kwargs, scope, chunksize),
+                            timeout, queue)
+        return req
+
+    def run_batch_async(self, items, scope=None, callback=None, timeout=None,
+                        queue=None):
+        """
+        Non-blocking version of run_batch, returns an EngineRequest whose result
+        is the list of item results.
+        """
+        if self.is_interactive is False:
+            raise Exception('Managed engine is not active')
+        items = self._check_batch(items)
+        return self.request( eng_messages.ENG_RUNTASK_BATCH, (items,scope),
+                                callback, True, timeout, queue)
+
+    def execute_async(self, source, scope=None, callback=None, timeout=None,
+                        queue=None):
+        """
+        Non-blocking version of execute, returns an EngineRequest. The queue
+        is ignored; executions are run in order on the engine's message thread.
+        """
+        self.cache.clear()
+        return self.request( eng_messages.ENG_EXECCOMMAND, (source,scope), 
+                                callback, False, timeout, queue)
+
+    def evaluate_async(self, source, scope=None, callback=None, timeout=None,
+                        queue=None):
+        """
+        Non-blocking version of evaluate, returns an EngineRequest.
+        """
+        return self.request( eng_messages.ENG_EVALCOMMAND, (source,scope), 
+                                callback, True, timeout, queue)
+
+    def resolve_async(self, address, scope=None, callback=None, timeout=None,
+                        queue=None):
+        """
+        Non-blocking version of resolve, returns an EngineRequest.
+        """
+        return self.request( eng_messages.ENG_RESOLVE, (address,scope), 
+                                callback, True, timeout, queue)
+
+    def get_registered_tasks_async(self, callback=None):
+        """
+        Non-blocking version of get_registered_tasks, returns an EngineRequest.
+        """
+        return self.request( eng_messages.ENG_GETTASKS, (), callback)
+
+    def enable_debug_async(self, flag=True, callback=None):
+        """
+        Non-blocking version of enable_debug, returns an EngineRequest.
+        """
+        req = self.request( eng_messages.ENG_DEBUG_TOGGLE, (flag,))
+        #update state before any other callbacks
+        def update(req):
+            self.debug = req.result()
+        req.add_callback(update)
+        if callback is not None:
+            req.add_callback(callback)
+        return req
+
+    def gather_async(self, requests, callback=None):
+        """
+        Combine a list of EngineRequests into a single EngineRequest whose 
+        result is the list of the individual results (or the first exception).
+        The optional callback is called when all the requests are complete.
+        """
+        group = EngineRequest(self, None, None)
+        if callback is not None:
+            group.add_callback(callback)
+
+        requests = list(requests)
+        pending = [len(requests)]
+        def done(req):
+            pending[0] = pending[0] - 1
+            if pending[0] > 0:
+                return
+            try:
+                results = [r.result() for r in requests]
+            except Exception as e:
+                group._set_exception(e)
+            else:
+                group._set_result(results)
+
+        if len(requests)==0:
+            group._set_result([])
+        for req in requests:
+            req.add_callback(done)
+        return group
+
+    def schedule_timeout(self, req, delay):
+        """
+        Arrange for req.expire() to be called after delay seconds so requests 
+        fail even if the engine cannot reply (e.g. it is blocked in a C call).
+        Subclasses should overload this to use the GUI toolkit's timers, by 
+        default requests only fail when the engine replies.
+        """
+        pass
+
+    def _send_request(self, req, data, timeout, queue):
+        """
+        Send the ENG_REQUEST message for the EngineRequest given.
+        """
+        reqid = req.reqid
+        subject = req.subject
+        self._requests[reqid] = req
+        if timeout is not None:
+            self.schedule_timeout(req, timeout+TIMEOUT_GRACE)
+        if queue is not None:
+            data = (reqid, subject, data, timeout, queue)
+        elif timeout is not None:
+            data = (reqid, subject, data, timeout)
+        else:
+            data = (reqid, subject, data)
+        self.send_msg( self.engine, eng_messages.ENG_REQUEST, data)
+
+    def _send_query(self, subject, data, timeout=None):
+        """
+        Send a blocking message to the engine and return the result, if a 
+        timeout is given the engine interrupts the handler once it expires.
+        """
+        if timeout is None:
+            return self.send_msg( self.engine, subject, data, get_result=True)
+        return self.send_msg( self.engine, eng_messages.ENG_DEADLINE,
+                                (timeout, subject, data), get_result=True)
+
+    def _fail_requests(self, msg):
+        """
+        Complete all outstanding requests with an exception.
+        """
+        requests = self._requests.values()
+        self._requests = {}
+        for req in requests:
+            req._set_exception( Exception(msg) )
+
     def notify_change(self):
         """
         Publish an engine state change message to notify that the engine state 
@@ -314,6 +821,7 @@ class Console(MBLocalNode):
         if self.is_interactive is False:
             raise Exception('Managed engine is not active')
 
+        self.cache.clear()
         busy, debug, profile = self.get_state()
         data = (busy, debug, profile)
         self.publish_msg( eng_messages.ENGINE_STATE_CHANGE+'.'+self.engine, data)
@@ -330,6 +838,18 @@ class Console(MBLocalNode):
                                         (flag,setto), get_result=True)
         return res
 
+    def set_output_policy(self, policy):
+        """
+        Set what the engine does when this console falls behind writing its
+        output:
+            'block' -   the code writing the output waits
+            'drop'  -   output is skipped keeping only the most recent, a note 
+                        of the amount skipped is written instead.
+        """
+        res = self.run_task('set_output_options', kwargs={'policy': policy})
+        self.output_policy = policy
+        return res
+
     def stop(self):
         """
         Stop a running command.
@@ -456,48 +976,218 @@ class Console(MBLocalNode):
         """
         pass
 
+    #---output------------------------------------------------------------------
+    #Engine output (bulk) messages are queued and written by write_output so 
+    #that a flood of output does not hold up other messages or the interface. 
+    #Control messages (prompts etc) write the queued output first to keep the 
+    #order, query replies do not wait for it.
+    def queue_output(self, subject, string):
+        """
+        Queue a string written to the stream given by the CON_WRITE_* subject.
+        """
+        if self._outqueue and (self._outqueue[-1][0] == subject):
+            self._outqueue[-1][1].append(string)
+        else:
+            self._outqueue.append( [subject, [string]] )
+        if self._outscheduled is False:
+            self._outscheduled = True
+            self.schedule_output()
+
+    def schedule_output(self):
+        """
+        Arrange for write_output to be called to write the queued output. 
+        Subclasses can overload this to write the output in chunks between 
+        processing other events, by default the output is written immediately.
+        """
+        self.write_output()
+
+    def write_output(self, limit=None):
+        """
+        Write the queued output. 
+        limit - maximum number of characters to write, any remaining output
+                stays queued and schedule_output is called again.
+        """
+        self._outscheduled = False
+        while self._outqueue:
+            subject, strings = self._outqueue[0]
+            try:
+                string = ''.join(strings)
+                strings[:] = [string]
+            except UnicodeError:
+                #mixed byte/unicode strings - write seperately
+                string = strings[0]
+            if (limit is not None) and (len(string) > limit):
+                #write part and leave the rest queued
+                strings[0] = string[limit:]
+                string = string[:limit]
+            else:
+                strings.pop(0)
+                if not strings:
+                    self._outqueue.pop(0)
+
+            if subject == eng_messages.CON_WRITE_STDOUT:
+                self.write_stdout(string)
+            else:
+                self.write_stderr(string)
+            self._ack_output(len(string))
+
+            if limit is not None:
+                limit = limit - len(string)
+                if limit <= 0:
+                    break
+
+        if self._outqueue and (self._outscheduled is False):
+            self._outscheduled = True
+            self.schedule_output()
+
+    def _ack_output(self, nchars):
+        """
+        Count output characters written and acknowledge them to the engine
+        every OUTPUT_ACK_SIZE characters so it can send more.
+        """
+        self._outwritten += nchars
+        if (self._outwritten < OUTPUT_ACK_SIZE) or (self.is_interactive is False):
+            return
+        self.send_msg(self.engine, eng_messages.ENG_OUTPUT_ACK, 
+                        (self._outwritten,))
+        self._outwritten = 0
+
     #---message handlers--------------------------------------------------------
     def msg_prompt(self, msg):
+        self.write_output()
         prompt, more = msg.data
         self.prompt(prompt,more)
 
     def msg_prompt_stdin(self, msg):
+        self.write_output()
         prompt,more = msg.data
         self.prompt_stdin(prompt,more)
 
     def msg_prompt_debug(self, msg):
+        self.write_output()
         prompt,more = msg.data
         self.prompt_debug(prompt,more)
 
     def msg_write_stdout(self, msg):
         string = msg.data[0]
-        self.write_stdout(string)
+        self.queue_output(eng_messages.CON_WRITE_STDOUT, string)
 
     def msg_write_stderr(self, msg):
         string = msg.data[0]
-        self.write_stderr(string)
+        self.queue_output(eng_messages.CON_WRITE_STDERR, string)
 
     def msg_write_debug(self, msg):
+        self.write_output()
         string = msg.data[0]
         self.write_debug(string)
 
     def msg_console_clear(self, msg):
+        #the queued output would be cleared anyway
+        for subject, strings in self._outqueue:
+            self._ack_output( sum([len(string) for string in strings]) )
+        self._outqueue = []
         self.clear()
 
     def msg_execsource(self, msg):
+        self.write_output()
         source= msg.data[0]
         self.exec_source(source)
+
+    def msg_reply(self, msg):
+        """
+        Result of a non-blocking request from the engine.
+        """
+        reqid, result = msg.data
+        self._reply(reqid, result)
+
+    def msg_reply_chunk(self, msg):
+        """
+        Items produced by a streamed task.
+        """
+        reqid, seq, items = msg.data
+        req = self._requests.get(reqid, None)
+        if req is None:
+            #cancelled or failed stream
+            return
+        req._add_chunk(seq, eng_buffers.unpack(items))
+
+    def msg_shm_notify(self, msg):
+        """
+        Records are waiting in the shared memory ring.
+        """
+        self._read_ring()
+
+    def _open_ring(self, path):
+        """
+        Map the shared memory ring opened by the engine and tell the engine to 
+        start using it. 
+        """
+        try:
+            ring = eng_shm.SharedRing(path)
+        except:
+            log.exception('Could not open shared memory ring: '+str(path))
+            ring = None
+        else:
+            #both sides have the file mapped - remove it.
+            ring.unlink()
+
+        self._ring = ring
+        res = self.send_msg(self.engine, eng_messages.ENG_SHM_ENABLE, 
+                            (ring is not None,), get_result=True)
+        if res is not True:
+            self._close_ring()
+
+    def _close_ring(self):
+        """
+        Read any records left in the shared memory ring and close it.
+        """
+        if self._ring is None:
+            return
+        self._read_ring()
+        self._ring.close()
+        self._ring = None
+
+    def _read_ring(self):
+        """
+        Handle the records waiting in the shared memory ring.
+        """
+        if self._ring is None:
+            return
+        for channel, payload in self._ring.read():
+            if channel == eng_shm.SHM_REPLY:
+                reqid, result = cPickle.loads(payload)
+                self._reply(reqid, result)
+                continue
+            channel, string = eng_shm.decode_string(channel, payload)
+            if channel == eng_shm.SHM_STDOUT:
+                self.queue_output(eng_messages.CON_WRITE_STDOUT, string)
+            else:
+                self.queue_output(eng_messages.CON_WRITE_STDERR, string)
+
+    def _reply(self, reqid, result):
+        """
+        Complete the request with the result given.
+        """
+        req = self._requests.pop(reqid, None)
+        if req is None:
+            #unknown or already failed request
+            return
+        req._set_result( eng_buffers.unpack(result) )
     
     def msg_busy(self, msg):
         """
         Handler for message from engine to console indicating the engine is busy
         """
+        self.write_output()
         #update state
         self.busy = True
+        self.cache.clear()
     
     def msg_done(self, msg):
+        self.write_output()
         #update state
         self.busy = False
+        self.cache.clear()
 
         #update the debugger interface state
         #flags
@@ -512,6 +1202,30 @@ class Console(MBLocalNode):
         self.scopes = ['main']
         self.active_scope = 0
 
+    def msg_state_change(self, msg):
+        """
+        Handler for the engine state change and namespace changed messages -
+        objects in the engine may have changed.
+        """
+        self.cache.clear()
+
+    def msg_job_started(self, msg):
+        """
+        Handler for the engine job started message - the query cache is not
+        used while background jobs are running.
+        """
+        jobid, description = msg.get_data()
+        self.jobs.add(jobid)
+        self.cache.clear()
+
+    def msg_job_done(self, msg):
+        """
+        Handler for the engine job done message.
+        """
+        jobid, state = msg.get_data()
+        self.jobs.discard(jobid)
+        self.cache.clear()
+
     def msg_node_connect(self, msg):
         """
         Called when the engine message bus node connects
@@ -523,6 +1237,10 @@ class Console(MBLocalNode):
         Called when the engine message bus nodes disconnects
         """
         engname,err = msg.get_data()
+
+        #write the output still waiting
+        self._read_ring()
+        self.write_output()
         
         #cancel any prompts.
         self.prompt(None, None) 
@@ -538,6 +1256,287 @@ class Console(MBLocalNode):
         #set flags/attributes
         self.is_interactive = False #interactive flag
 
+        #read anything left in the shared memory ring
+        self._close_ring()
+
+        #fail any outstanding requests
+        self._fail_requests('Engine disconnected')
+
+#---Task hashes-----------------------------------------------------------------
+_hashes = {}    #{code object: hash} cache
+def _task_hash(task):
+    """
+    Returns a hash of the marshalled code of a task function.
+    """
+    code = task.func_code
+    h = _hashes.get(code, None)
+    if h is None:
+        h = hashlib.md5(marshal.dumps(code)).hexdigest()
+        _hashes[code] = h
+    return h
+
+#---Query cache-----------------------------------------------------------------
+class QueryCache():
+    def __init__(self, maxsize=1000):
+        """
+        Least recently used cache of engine task/evaluate results used by the
+        console for read only queries.
+            maxsize -   number of results to keep
+        """
+        self.maxsize = maxsize
+        self._results = OrderedDict()   #{key: result} oldest first
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+
+    def get(self, key):
+        """
+        Returns (found, result) for the key given, the result is a copy for 
+        lists, dicts and sets so callers can modify it.
+        """
+        try:
+            result = self._results.pop(key)
+        except KeyError:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self._results[key] = result
+        if isinstance(result, (list, dict, set)):
+            result = copy.copy(result)
+        return True, result
+
+    def put(self, key, result):
+        """
+        Store the result for the key
+        """
+        if isinstance(result, (list, dict, set)):
+            result = copy.copy(result)
+        self._results.pop(key, None)
+        self._results[key] = result
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove all results (the engine state may have changed).
+        """
+        if self._results:
+            self._results.clear()
+            self.flushes += 1
+
+    def get_stats(self):
+        """
+        Returns a dictionary of the cache counters:
+            size        -   number of results cached
+            hits        -   number of queries answered from the cache
+            misses      -   number of cacheable queries sent to the engine
+            flushes     -   number of times the cache was cleared
+            hit_rate    -   hits/(hits+misses)
+        """
+        total = self.hits+self.misses
+        return {'size'      : len(self._results),
+                'hits'      : self.hits,
+                'misses'    : self.misses,
+                'flushes'   : self.flushes,
+                'hit_rate'  : float(self.hits)/max(total, 1) }
+
+#---Non-blocking request object-------------------------------------------------
+class EngineRequest():
+    def __init__(self, console, reqid, subject, raise_result=False):
+        """
+        A non-blocking request sent to an engine, returned by the Console 
+        *_async methods.
+
+        The result is set when the CON_REPLY message is handled by the console
+        and any callbacks added are then called with this object as the only 
+        argument.
+        """
+        self.console = console      #console that sent the request
+        self.reqid = reqid          #unique request id (per console)
+        self.subject = subject      #request message subject
+
+        #treat exception results as errors.
+        self._raise_result = raise_result
+
+        self._done = False
+        self._cancelled = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        """
+        Returns True if the request is complete (or cancelled)
+        """
+        return self._done
+
+    def cancelled(self):
+        """
+        Returns True if the request was cancelled
+        """
+        return self._cancelled
+
+    def result(self):
+        """
+        Return the result or raise the exception the request failed with.
+        """
+        if self._cancelled is True:
+            raise Exception('Request was cancelled')
+        if self._done is False:
+            raise Exception('Request is not complete')
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self):
+        """
+        Return the exception the request failed with or None.
+        """
+        return self._exception
+
+    def add_callback(self, callback):
+        """
+        Add a callable to call when the request is complete, callback(request).
+        If the request is already complete it is called immediately.
+        """
+        if self._done is True:
+            if self._cancelled is False:
+                self._call(callback)
+            return
+        self._callbacks.append(callback)
+
+    def expire(self):
+        """
+        Fail the request with an EngineTimeoutError if it is not complete.
+        """
+        if self._done is True:
+            return False
+        if self.reqid is not None:
+            self.console._requests.pop(self.reqid, None)
+        self._set_exception( EngineTimeoutError('No reply from engine for: '
+                                                    +str(self.subject)) )
+        return True
+
+    def cancel(self):
+        """
+        Cancel the request, the callbacks will not be called. 
+        """
+        if self._done is True:
+            return False
+        self._cancelled = True
+        self._done = True
+        self._callbacks = []
+        if self.reqid is not None:
+            self.console._requests.pop(self.reqid, None)
+        return True
+
+    #---internal methods--------------------------------------------------------
+    def _set_result(self, result):
+        if self._done is True:
+            return
+        if self._raise_result and isinstance(result, Exception):
+            self._set_exception(result)
+            return
+        self._result = result
+        self._complete()
+
+    def _set_exception(self, exception):
+        if self._done is True:
+            return
+        self._exception = exception
+        self._complete()
+
+    def _complete(self):
+        self._done = True
+        callbacks = self._callbacks
+        self._callbacks = []
+        for callback in callbacks:
+            self._call(callback)
+
+    def _call(self, callback):
+        try:
+            callback(self)
+        except:
+            log.exception('Error in request callback')
+
+#-------------------------------------------------------------------------------
+class EngineStream(EngineRequest):
+    def __init__(self, console, reqid):
+        """
+        A streamed task sent to an engine, returned by Console.run_task_stream.
+
+        The items are added to the items list as the CON_REPLY_CHUNK messages 
+        are handled, the chunk callbacks are then called with this object and 
+        the list of new items. The request is complete when all the items have 
+        been received and the result is the list of items.
+        """
+        EngineRequest.__init__(self, console, reqid, 
+                                eng_messages.ENG_RUNTASK_STREAM, True)
+        self.items = []             #items received so far
+        self._nchunks = 0           #number of chunks received
+        self._chunk_callbacks = []
+
+    def add_chunk_callback(self, callback):
+        """
+        Add a callable to call as each chunk of items arrives, 
+        callback(stream, items). 
+        """
+        self._chunk_callbacks.append(callback)
+
+    def expire(self):
+        """
+        Fail the stream with an EngineTimeoutError if it is not complete and 
+        tell the engine to stop sending items.
+        """
+        if self._done is True:
+            return False
+        self._send_cancel()
+        return EngineRequest.expire(self)
+
+    def cancel(self):
+        """
+        Cancel the stream, the engine stops sending items and the callbacks 
+        will not be called.
+        """
+        if self._done is True:
+            return False
+        self._send_cancel()
+        self._chunk_callbacks = []
+        return EngineRequest.cancel(self)
+
+    #---internal methods--------------------------------------------------------
+    def _send_cancel(self):
+        if self.console.is_interactive is False:
+            return
+        try:
+            self.console.send_msg(self.console.engine, 
+                            eng_messages.ENG_STREAM_CANCEL, (self.reqid,))
+        except:
+            log.exception('Could not cancel stream')
+
+    def _add_chunk(self, seq, items):
+        if self._done is True:
+            return
+        if seq != self._nchunks:
+            log.warning('Stream chunk out of order: '+str(seq))
+        self._nchunks = self._nchunks + 1
+        self.items.extend(items)
+        for callback in list(self._chunk_callbacks):
+            try:
+                callback(self, items)
+            except:
+                log.exception('Error in stream chunk callback')
+
+    def _set_result(self, result):
+        #the reply is the number of items sent or the exception raised
+        if isinstance(result, Exception):
+            EngineRequest._set_result(self, result)
+            return
+        if result != len(self.items):
+            log.warning('Stream items missing: %d sent, %d received'
+                            %(result, len(self.items)))
+        EngineRequest._set_result(self, self.items)
+
 #---Debugger interface----------------------------------------------------------
 class DebuggerInterface():
     def __init__(self, console):
@@ -756,6 +1755,7 @@ class DebuggerInterface():
     def msg_debug_paused(self,msg):
         #update state
         paused_at, scope_list, active_scope, flags = msg.data
+        self.console.cache.clear()
 
         #flags
         self.paused = True
@@ -775,6 +1775,7 @@ class DebuggerInterface():
 
     def msg_debug_resumed(self, msg):
         #update state
+        self.console.cache.clear()
         #flags
         self.paused = False
         self.can_stepin = False
@@ -790,6 +1791,7 @@ class DebuggerInterface():
     def msg_debug_scope(self, msg):
         #update state
         scopes, active_scope = msg.data
+        self.console.cache.clear()
         self.scopes = scopes
         self.active_scope = active_scope
 
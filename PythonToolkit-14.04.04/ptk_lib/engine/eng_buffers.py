@@ -0,0 +1,164 @@
+"""
+Engine buffers.
+
+Out-of-band transfer of numpy arrays in results sent between the engine and the
+console.
+
+Arrays in a result are replaced by a BufferFrame containing only a dtype/shape
+header and the contiguous raw bytes of the array, these pickle as a plain
+string with none of the array reconstruction overhead. On the receiving side
+the array is rebuilt as a (read-only) view of the received bytes using
+numpy.frombuffer so no further copy is made.
+
+Arrays of python objects are left to be pickled as normal.
+
+Run this module to benchmark the transfer of a large array against pickling the
+array directly.
+"""
+#---logging---------------------------------------------------------------------
+import logging
+log = logging.getLogger(__name__)
+
+#---Imports---------------------------------------------------------------------
+import sys
+
+#-------------------------------------------------------------------------------
+class BufferFrame():
+    def __init__(self, array):
+        """
+        The header and raw bytes of a numpy array.
+        """
+        self.dtype = array.dtype.str    #dtype string e.g. '<f8'
+        self.shape = array.shape
+        self.data = array.tostring(order='C')
+
+    def nbytes(self):
+        """
+        Size of the array data in bytes.
+        """
+        return len(self.data)
+
+    def unpack(self):
+        """
+        Rebuild the array as a view of the received bytes.
+        """
+        import numpy
+        array = numpy.frombuffer(self.data, dtype=numpy.dtype(self.dtype))
+        return array.reshape(self.shape)
+
+#-------------------------------------------------------------------------------
+def pack(obj):
+    """
+    Replace any numpy arrays in obj (or in lists, tuples and dicts in obj) with
+    BufferFrames.
+
+    Does nothing if numpy has not been imported by the process.
+    """
+    numpy = sys.modules.get('numpy', None)
+    if numpy is None:
+        return obj
+    return _pack(obj, numpy.ndarray)
+
+def _pack(obj, ndarray):
+    if isinstance(obj, ndarray):
+        if obj.dtype.hasobject:
+            return obj
+        return BufferFrame(obj)
+    if type(obj) is tuple:
+        return tuple( [_pack(item, ndarray) for item in obj] )
+    if type(obj) is list:
+        return [_pack(item, ndarray) for item in obj]
+    if type(obj) is dict:
+        return dict( [(key, _pack(value, ndarray))
+                        for key,value in obj.iteritems()] )
+    return obj
+
+def unpack(obj):
+    """
+    Rebuild any numpy arrays sent as BufferFrames in obj (or in lists, tuples
+    and dicts in obj).
+    """
+    if isinstance(obj, BufferFrame):
+        return obj.unpack()
+    if type(obj) is tuple:
+        return tuple( [unpack(item) for item in obj] )
+    if type(obj) is list:
+        return [unpack(item) for item in obj]
+    if type(obj) is dict:
+        return dict( [(key, unpack(value)) for key,value in obj.iteritems()] )
+    return obj
+
+#---Benchmark-------------------------------------------------------------------
+def _transfer(payload, sock_send, sock_recv):
+    """
+    Send a pickled payload over a socket pair and return the unpickled object
+    """
+    import cPickle
+    import struct
+    import threading
+
+    s = cPickle.dumps(payload, cPickle.HIGHEST_PROTOCOL)
+    def sender():
+        sock_send.sendall(struct.pack('!Q', len(s)))
+        sock_send.sendall(s)
+    t = threading.Thread(target=sender)
+    t.start()
+
+    def recv(size):
+        buf = bytearray(size)
+        view = memoryview(buf)
+        n = 0
+        while n<size:
+            n = n + sock_recv.recv_into(view[n:], size-n)
+        return buf
+
+    size, = struct.unpack('!Q', str(recv(8)))
+    buf = recv(size)
+    t.join()
+    return cPickle.loads(str(buf))
+
+def benchmark(nbytes=100*1024*1024, repeats=3):
+    """
+    Time the transfer of a float64 array of nbytes through a local socket pair
+    pickled directly and using BufferFrames.
+    """
+    import time
+    import socket
+    import numpy
+
+    a = numpy.random.rand(nbytes/8)
+    send, recv = socket.socketpair()
+    mb = nbytes/(1024.0*1024.0)
+
+    #raw socket bandwidth
+    s = a.tostring()
+    t0 = time.time()
+    for n in xrange(repeats):
+        _transfer(s, send, recv)
+    t_raw = (time.time()-t0)/repeats
+
+    #pickled array
+    t0 = time.time()
+    for n in xrange(repeats):
+        b = _transfer(a, send, recv)
+    t_pickle = (time.time()-t0)/repeats
+    assert (a==b).all()
+
+    #buffer frame
+    t0 = time.time()
+    for n in xrange(repeats):
+        b = unpack(_transfer(pack(a), send, recv))
+    t_frame = (time.time()-t0)/repeats
+    assert (a==b).all()
+
+    send.close()
+    recv.close()
+
+    print 'Transfer of %.0f MB float64 array (mean of %d):'%(mb, repeats)
+    print '  raw bytes     : %6.3f s (%7.1f MB/s)'%(t_raw, mb/t_raw)
+    print '  pickled array : %6.3f s (%7.1f MB/s)'%(t_pickle, mb/t_pickle)
+    print '  buffer frame  : %6.3f s (%7.1f MB/s)'%(t_frame, mb/t_frame)
+    return t_raw, t_pickle, t_frame
+
+if __name__ == '__main__':
+    benchmark()
@@ -4,6 +4,10 @@ Engine Compiler
 
 Handles the compilation of source and formating exceptions and tracebacks for 
 the engine.
+
+Expressions and statements sent by the GUI tools (evaluate/execute) are compiled
+via a CodeCache, the tools send the same few sources over and over (e.g. a 
+value for each row/cell) so the compiled code is kept and reused.
 """
 
 #---logging---------------------------------------------------------------------
@@ -14,6 +18,8 @@ log = logging.getLogger(__name__)
 from codeop import _maybe_compile, Compile
 import sys
 import traceback                        #for formatting errors
+from collections import OrderedDict     #for the code cache
+from threading import Lock              #for the code cache
 
 import eng_messages                     #standard engine message types
 
@@ -30,6 +36,9 @@ class EngineCompiler(Compile):
 
         #source buffer to get print line of source in exception
         self._buffer = '' 
+
+        #compiled tool expressions/statements
+        self.cache = CodeCache()
         
         #register message handlers
         self.eng.set_handler(eng_messages.ENG_FUTUREFLAG, self.msg_future_flag)
@@ -114,7 +123,10 @@ class EngineCompiler(Compile):
         taken from: code.InteractiveInterpreter
         """
         filename="<Engine input>"
-        
+
+        #send any buffered output before the error
+        self.eng.flush_output()
+
         errtype, value, sys.last_traceback = sys.exc_info()
         sys.last_type = errtype
         sys.last_value = value
@@ -141,6 +153,9 @@ class EngineCompiler(Compile):
         line numbers for any engine inputs.
         modified from: code.InteractiveInterpreter
         """
+        #send any buffered output before the traceback
+        self.eng.flush_output()
+
         try:
             type, value, sys.last_traceback = sys.exc_info()
             sys.last_type = type
@@ -167,4 +182,75 @@ class EngineCompiler(Compile):
         """enable or disable a __future__ feature using flags"""
         flag,set = msg.get_data()
         self.set_compiler_flag(flag,set)
+
+#-------------------------------------------------------------------------------
+class CodeCache():
+    def __init__(self, maxsize=512):
+        """
+        Least recently used cache of code objects compiled from source strings
+        for eval/exec, keyed by the source and mode.
+            maxsize -   number of code objects to keep
+        """
+        self.maxsize = maxsize
+        self._codes = OrderedDict()     #{(source, mode): code} oldest first
+        self._lock = Lock()             #used from the request worker threads
+        self.hits = 0
+        self.misses = 0
+
+    def compile(self, source, mode):
+        """
+        Return the code object for the source string compiled in the mode given
+        ('eval' or 'exec'), compiling it if it is not in the cache. Code objects
+        are returned unchanged. Compiles as the builtin eval/exec would for a 
+        source string, syntax errors are raised as usual and not cached.
+        """
+        if isinstance(source, basestring) is False:
+            return source
+
+        key = (source, mode)
+        with self._lock:
+            code = self._codes.pop(key, None)
+            if code is not None:
+                self.hits += 1
+                self._codes[key] = code
+                return code
+            self.misses += 1
+
+        #eval ignores leading spaces/tabs of a source string
+        if mode == 'eval':
+            code = compile(source.lstrip(' \t'), '<string>', mode, 0, True)
+        else:
+            code = compile(source, '<string>', mode, 0, True)
+
+        with self._lock:
+            self._codes[key] = code
+            while len(self._codes) > self.maxsize:
+                self._codes.popitem(last=False)
+        return code
+
+    def clear(self):
+        """
+        Remove all code objects from the cache and reset the counters.
+        """
+        with self._lock:
+            self._codes.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """
+        Returns a dictionary of the cache counters:
+            size        -   number of code objects cached
+            maxsize     -   maximum number of code objects cached
+            hits        -   number of sources found in the cache
+            misses      -   number of sources compiled
+            hit_rate    -   hits/(hits+misses)
+        """
+        with self._lock:
+            total = self.hits+self.misses
+            return {'size'      : len(self._codes),
+                    'maxsize'   : self.maxsize,
+                    'hits'      : self.hits,
+                    'misses'    : self.misses,
+                    'hit_rate'  : float(self.hits)/max(total, 1) }
    
@@ -364,6 +364,9 @@ class EngineDebugger():
             return True
         self._active_scope = level
 
+        #names may refer to different objects in this scope
+        self.eng.handles.invalidate()
+
         #print console message
         self.write_debug('Scope changed to: '+self._scopes[level]+
                               ' (level='+str(level)+')')
@@ -424,7 +427,9 @@ class EngineDebugger():
 
         #try to evaluate the expression
         try:
-            result = eval(expression, globals, locals)
+            code = self.eng.compiler.cache.compile(expression, 'eval')
+            result = eval(code, globals, 
+                            self.eng.handles.wrap_locals(expression, locals))
         except:
             result = None
 
@@ -449,12 +454,14 @@ class EngineDebugger():
 
         #execute the expression
         try:
-            exec(expression, globals, locals)
+            code = self.eng.compiler.cache.compile(expression, 'exec')
+            exec(code, globals, locals)
         except:
             pass
 
         #update the locals
         self._update_frame_locals(frame)
+        self.eng.handles.invalidate()
 
     def run_task(self, taskname, args=(), kwargs={}, level=None):
         """
@@ -475,6 +482,7 @@ class EngineDebugger():
 
         #get the scope locals/globals
         name,frame,globals,locals = self.get_scope(level)
+        args, kwargs = self.eng.handles.expand_args(args, kwargs)
 
         #run the task
         try:
@@ -709,6 +717,8 @@ class EngineDebugger():
                 self._scopes, self._active_scope, 
                 (self._can_stepin,self._can_stepout)    )
 
+        #the code has run since the last pause
+        self.eng.handles.invalidate()
         self.eng.publish_msg(   eng_messages.ENGINE_DEBUG_PAUSED+'.'+
                                 self.eng.name, data)
 
@@ -751,6 +761,9 @@ class EngineDebugger():
         
         #reset stepin flag
         self._can_stepin = False
+
+        #stepping or resuming - the code will change the namespace
+        self.eng.handles.invalidate()
     
         ##Debugger will run next line
         #check if we have resumed (will not pause again until a breakpoint/pause request)
@@ -805,7 +818,8 @@ class EngineDebugger():
 
         #evaluate it
         try:
-            trigger = eval(condition, frame.f_globals, frame.f_locals)
+            code = self.eng.compiler.cache.compile(condition, 'eval')
+            trigger = eval(code, frame.f_globals, frame.f_locals)
         except:
             #fail safe - so trigger anyway.
             return True
@@ -849,7 +863,8 @@ class EngineDebugger():
         else:
             #evaluate it
             try:
-                trigger = eval(condition, frame.f_globals, frame.f_locals)
+                code = self.eng.compiler.cache.compile(condition, 'eval')
+                trigger = eval(code, frame.f_globals, frame.f_locals)
             except:
                 #fail safe - so trigger anyway.
                 self.write_debug('Triger condition expression error - triggering breakpoint')
@@ -0,0 +1,211 @@
+"""
+Engine object handles.
+
+Tools usually refer to engine objects by address strings (e.g. 'a.b[2]') which
+the engine has to compile and evaluate again on every call. Instead an address
+can be resolved once (ENG_RESOLVE) to an EngineHandle - an id into the engine's
+HandleRegistry.
+
+Handles can be used:
+    - in expressions sent to evaluate; str(handle) is a name that refers to the
+      object e.g. console.evaluate(str(handle)+'[0:10]').
+    - as task arguments; the task is called with the object instead.
+
+All handles are invalidated when the engine's generation changes, i.e. whenever
+user code has run (ENGINE_STATE_DONE), a tool notifies a change or the debugger
+pauses, resumes or changes scope, as the address may then refer to a different
+object. A stale handle raises an
+exception when used as a task argument and is an undefined name in expressions.
+Objects that can be weak referenced are not kept alive by the registry.
+"""
+#---logging---------------------------------------------------------------------
+import logging
+log = logging.getLogger(__name__)
+
+#---Imports---------------------------------------------------------------------
+import weakref
+from threading import Lock
+
+#---Globals---------------------------------------------------------------------
+#prefix of handle names used in expressions
+HANDLE_PREFIX = '_ptk_h'
+
+#-------------------------------------------------------------------------------
+class EngineHandle():
+    def __init__(self, hid, generation, address, type_string):
+        """
+        Reference to an object in an engine's handle registry returned by
+        Console.resolve.
+            hid         -   id of the object in the registry
+            generation  -   registry generation the handle is valid for
+            address     -   address string the handle was resolved from
+            type_string -   type of the object e.g. 'numpy.ndarray'
+        """
+        self.hid = hid
+        self.generation = generation
+        self.address = address
+        self.type_string = type_string
+
+    @property
+    def name(self):
+        """Name used to refer to the object in expressions"""
+        return '%s%d_%d'%(HANDLE_PREFIX, self.hid, self.generation)
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return '<EngineHandle %s (%s)>'%(self.address, self.name)
+
+#-------------------------------------------------------------------------------
+class HandleLocals(object):
+    def __init__(self, registry, locals):
+        """
+        Mapping used as the locals when evaluating an expression containing
+        handle names, other names are looked up in the locals given.
+
+        (A new style class as eval does not accept old style instances as
+        mappings).
+        """
+        self.registry = registry
+        self.locals = locals
+
+    def __getitem__(self, name):
+        if name.startswith(HANDLE_PREFIX):
+            try:
+                return self.registry.get_object(name)
+            except Exception:
+                raise KeyError(name)
+        return self.locals[name]
+
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+#-------------------------------------------------------------------------------
+class HandleRegistry():
+    def __init__(self):
+        """
+        Registry of the objects resolved by the console.
+        """
+        self.generation = 0
+        self._lock = Lock()
+        self._count = 0
+        self._objects = {}      #{hid: (ref, is_weak)}
+        self._addresses = {}    #{(address, scope): handle} for the current
+                                #generation
+
+    #---interface---------------------------------------------------------------
+    def resolve(self, address, globals, locals, scope=None):
+        """
+        Evaluate the address string and return an EngineHandle for the object.
+        Resolving the same address again in the same scope and generation 
+        returns the existing handle.
+            scope   -   hashable key for the namespace the address is evaluated
+                        in (e.g. the debugger frame), None for the user 
+                        namespace.
+        """
+        with self._lock:
+            handle = self._addresses.get( (address, scope), None)
+            if (handle is not None) and (self._lookup(handle.hid) is not None):
+                return handle
+
+        obj = eval(address, globals, locals)
+        t = type(obj)
+        type_string = t.__module__ + '.' + t.__name__
+
+        try:
+            ref = weakref.ref(obj)
+            is_weak = True
+        except TypeError:
+            ref = obj
+            is_weak = False
+
+        with self._lock:
+            self._count = self._count + 1
+            handle = EngineHandle(self._count, self.generation, address,
+                                    type_string)
+            self._objects[handle.hid] = (ref, is_weak)
+            self._addresses[(address, scope)] = handle
+        return handle
+
+    def get_object(self, handle):
+        """
+        Returns the object for the EngineHandle or handle name given, raises an
+        exception if the handle is stale.
+        """
+        if isinstance(handle, EngineHandle):
+            hid, generation = handle.hid, handle.generation
+        else:
+            try:
+                hid, generation = handle[len(HANDLE_PREFIX):].split('_')
+                hid, generation = int(hid), int(generation)
+            except:
+                raise Exception('Not an engine handle: '+repr(handle))
+
+        with self._lock:
+            if generation == self.generation:
+                ref = self._lookup(hid)
+            else:
+                ref = None
+        if ref is None:
+            raise Exception('Stale engine handle: '+str(handle))
+        return ref[0]
+
+    def invalidate(self):
+        """
+        Start a new generation; all existing handles become stale.
+        """
+        with self._lock:
+            self.generation = self.generation + 1
+            self._objects = {}
+            self._addresses = {}
+
+    def expand_args(self, args, kwargs):
+        """
+        Returns the task args and kwargs with any EngineHandles replaced by
+        their objects.
+        """
+        if [a for a in args if isinstance(a, EngineHandle)]:
+            args = tuple([self._expand(a) for a in args])
+        if [v for v in kwargs.itervalues() if isinstance(v, EngineHandle)]:
+            kwargs = dict([(k, self._expand(v)) for k,v in kwargs.iteritems()])
+        return args, kwargs
+
+    def wrap_locals(self, expression, locals):
+        """
+        Returns the locals to evaluate the expression with; a HandleLocals
+        mapping if it contains handle names otherwise the locals given.
+        """
+        if isinstance(expression, basestring) and (HANDLE_PREFIX in expression):
+            return HandleLocals(self, locals)
+        return locals
+
+    def __len__(self):
+        return len(self._objects)
+
+    #---internal methods--------------------------------------------------------
+    def _expand(self, value):
+        if isinstance(value, EngineHandle):
+            return self.get_object(value)
+        return value
+
+    def _lookup(self, hid):
+        """
+        Returns (object,) for the handle id or None if it has been removed or
+        the object no longer exists (called with the lock held).
+        """
+        entry = self._objects.get(hid, None)
+        if entry is None:
+            return None
+        ref, is_weak = entry
+        if is_weak is False:
+            return (ref,)
+        obj = ref()
+        if obj is None:
+            del self._objects[hid]
+            return None
+        return (obj,)
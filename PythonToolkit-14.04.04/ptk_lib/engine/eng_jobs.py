@@ -0,0 +1,309 @@
+"""
+Engine background jobs.
+
+A job runs a statement, expression or callable from the user namespace on its
+own thread so the engine stays interactive while it runs - useful for commands
+that wait on I/O or release the GIL (numpy etc). The jobs are listed in the
+engine's job table with their state (running/done/failed/stopped) and elapsed
+time, and the result (or error) of a finished job is kept until retrieved or
+until the table is full.
+
+Output written to stdout/stderr by a job's thread is captured in the job
+rather than written to the console (see capture), it can be shown later with
+job_output.
+
+Jobs share the user namespace with the commands typed at the prompt and are
+not run with the debugger or profiler.
+"""
+#---logging---------------------------------------------------------------------
+import logging
+log = logging.getLogger(__name__)
+
+#---Imports---------------------------------------------------------------------
+import time
+import thread
+import traceback
+from threading import Thread, Lock
+
+import eng_messages
+import eng_namespace
+
+#---Globals---------------------------------------------------------------------
+#job states
+JOB_RUNNING = 'running'
+JOB_DONE    = 'done'
+JOB_FAILED  = 'failed'
+JOB_STOPPED = 'stopped'
+
+#number of finished jobs kept in the table, the oldest are removed first
+MAX_FINISHED = 50
+
+#the jobs running in this process by thread id - writes to the engine's
+#stdout/stderr from these threads are captured (see capture)
+_running = {}
+
+def capture(string, stderr=False):
+    """
+    Add the string to the output of the job running on the current thread.
+    Returns False if the current thread is not running a job.
+    """
+    job = _running.get(thread.get_ident(), None)
+    if job is None:
+        return False
+    job.write(string, stderr)
+    return True
+
+#-------------------------------------------------------------------------------
+class Job():
+    def __init__(self, jobid, description, code, args, kwargs):
+        """
+        A background job.
+            description -   source or name of the callable to show in the table
+            code        -   compiled code object or callable
+        """
+        self.id = jobid
+        self.description = description
+        self.code = code
+        self.args = args
+        self.kwargs = kwargs
+
+        self.state = JOB_RUNNING
+        self.started = time.time()
+        self.finished = None
+        self.result = None
+        self.error = None           #formatted traceback if failed
+
+        self.ident = None           #thread id while running
+        self.stopping = False       #stop requested (see JobManager.stop)
+        self._output = []           #[(stderr, string)]
+        self._outsize = 0
+        self._lock = Lock()
+
+    def elapsed(self):
+        """Returns the time (s) the job has been/was running"""
+        if self.finished is None:
+            return time.time() - self.started
+        return self.finished - self.started
+
+    def write(self, string, stderr=False):
+        """Add to the captured output"""
+        with self._lock:
+            self._output.append( (stderr, string) )
+            self._outsize += len(string)
+
+    def get_output(self):
+        """Returns the captured output as a list of (stderr, string)"""
+        with self._lock:
+            return list(self._output)
+
+    def get_info(self):
+        """
+        Returns a dictionary describing the job for the job table.
+        """
+        return {'id'         : self.id,
+                'description': self.description,
+                'state'      : self.state,
+                'started'    : self.started,
+                'elapsed'    : self.elapsed(),
+                'output'     : self._outsize,
+                'error'      : self.error}
+
+#-------------------------------------------------------------------------------
+class JobManager():
+    def __init__(self, engine):
+        """
+        Runs and keeps the table of background jobs for an engine.
+        """
+        self.engine = engine
+        self._jobs = {}         #{jobid: Job}
+        self._count = 0
+        self._lock = Lock()
+
+    #---interface---------------------------------------------------------------
+    def start(self, command, args=(), kwargs={}):
+        """
+        Start a job running the command on a new thread, returns the job id.
+            command -   a source string (statement or expression) run in the
+                        user namespace or a callable called with *args and
+                        **kwargs.
+        Syntax errors are raised here.
+        """
+        if callable(command):
+            code = command
+            description = getattr(command, '__name__', repr(command))
+        elif isinstance(command, basestring):
+            if args or kwargs:
+                raise Exception('Arguments can only be given with a callable')
+            code = self._compile(command)
+            description = command.strip()
+        else:
+            raise Exception('Command must be a source string or callable')
+
+        with self._lock:
+            self._count += 1
+            job = Job(self._count, description, code, args, kwargs)
+            self._jobs[job.id] = job
+            self._trim()
+
+        #published before the job can finish so consoles see it in order
+        self.engine.publish_msg( eng_messages.ENGINE_JOB_STARTED+'.'+
+                                    self.engine.name, 
+                                    data=(job.id, job.description))
+
+        t = Thread(target=self._run_job, args=(job,),
+                    name='Engine job '+str(job.id))
+        t.setDaemon(True)
+        t.start()
+        return job.id
+
+    def get_job(self, jobid):
+        """Returns the Job with the id given"""
+        job = self._jobs.get(jobid, None)
+        if job is None:
+            raise Exception('No job with id: '+str(jobid))
+        return job
+
+    def get_table(self):
+        """
+        Returns a list of job info dictionaries (see Job.get_info) in the order
+        the jobs were started.
+        """
+        with self._lock:
+            jobs = sorted(self._jobs.values(), key=lambda job: job.id)
+        return [job.get_info() for job in jobs]
+
+    def get_running(self):
+        """Returns the list of ids of the running jobs"""
+        with self._lock:
+            return [job.id for job in self._jobs.values() 
+                        if job.state == JOB_RUNNING]
+
+    def get_result(self, jobid, remove=True):
+        """
+        Returns the result of the finished job, raises an exception if the job
+        is still running, failed or was stopped. The job is removed from the
+        table unless remove is False.
+        """
+        job = self.get_job(jobid)
+        if job.state == JOB_RUNNING:
+            raise Exception('Job '+str(jobid)+' is still running')
+        if job.state == JOB_FAILED:
+            raise Exception('Job '+str(jobid)+' failed:\n'+job.error)
+        if job.state == JOB_STOPPED:
+            raise Exception('Job '+str(jobid)+' was stopped')
+        if remove is True:
+            self.remove(jobid)
+        return job.result
+
+    def stop(self, jobid):
+        """
+        Stop a running job by raising a KeyboardInterrupt in its thread.
+        Returns False if the job has finished.
+        """
+        from engine import _async_raise
+        job = self.get_job(jobid)
+        with self._lock:
+            if job.ident is None:
+                return False
+            job.stopping = True
+            _async_raise(job.ident, KeyboardInterrupt)
+        return True
+
+    def remove(self, jobid):
+        """Remove a finished job from the table"""
+        job = self.get_job(jobid)
+        if job.state == JOB_RUNNING:
+            raise Exception('Job '+str(jobid)+' is still running')
+        with self._lock:
+            self._jobs.pop(jobid, None)
+
+    #---internal methods--------------------------------------------------------
+    def _compile(self, source):
+        """
+        Compile the source as an expression (so the job result is its value)
+        or if that fails as statements, with the engine's __future__ flags.
+        """
+        flags = self.engine.compiler.flags
+        name = '<job '+str(self._count+1)+'>'
+        try:
+            return compile(source.strip(), name, 'eval', flags, True)
+        except SyntaxError:
+            pass
+        return compile(source, name, 'exec', flags, True)
+
+    def _trim(self):
+        """Remove the oldest finished jobs if the table is full (locked)"""
+        finished = [job for job in self._jobs.values()
+                        if job.state != JOB_RUNNING]
+        if len(finished) <= MAX_FINISHED:
+            return
+        finished.sort(key=lambda job: job.id)
+        for job in finished[:len(finished)-MAX_FINISHED]:
+            self._jobs.pop(job.id, None)
+
+    def _run_job(self, job):
+        """
+        Job thread target.
+        """
+        from engine import _async_raise
+        eng = self.engine
+        userdict = eng._userdict
+        if callable(job.code):
+            used = None
+        else:
+            used = eng_namespace.code_names(job.code)
+        before = eng_namespace.fingerprint(userdict)
+
+        job.ident = thread.get_ident()
+        _running[job.ident] = job
+        try:
+            try:
+                if callable(job.code):
+                    result = job.code(*job.args, **job.kwargs)
+                else:
+                    result = eval(job.code, userdict)
+                state = JOB_DONE
+            finally:
+                with self._lock:
+                    _running.pop(job.ident, None)
+                    job.ident = None
+                    if job.stopping is True:
+                        #clear the exception if it has not been raised yet
+                        _async_raise(thread.get_ident(), None)
+        except KeyboardInterrupt:
+            result = None
+            state = JOB_STOPPED
+        except:
+            result = None
+            job.error = traceback.format_exc()
+            state = JOB_FAILED
+        if job.stopping is True:
+            state = JOB_STOPPED
+
+        job.result = result
+        job.finished = time.time()
+        job.state = state
+
+        #user code may have rebound any name
+        eng.handles.invalidate()
+        self._notify(job, before, used)
+
+    def _notify(self, job, before, used):
+        """
+        Publish the names changed and the job done message and tell the user.
+        """
+        eng = self.engine
+        try:
+            after = eng_namespace.fingerprint(eng._userdict)
+            changes = eng_namespace.diff(before, after, used)
+            if eng_namespace.is_empty(changes) is False:
+                eng.publish_msg(
+                    eng_messages.ENGINE_NAMESPACE_CHANGED+'.'+eng.name,
+                    data=changes)
+            eng.publish_msg( eng_messages.ENGINE_JOB_DONE+'.'+eng.name,
+                                data=(job.id, job.state))
+            if eng.console is not None:
+                eng.write_stderr('[job %d] %s (%.1fs): %s\n'%(job.id,
+                                    job.state, job.elapsed(), job.description))
+        except:
+            log.exception('Error publishing job done')
@@ -0,0 +1,154 @@
+"""
+Engine stop latency check.
+
+Measures the time from a stop request (ENG_STOP, as sent by Console.stop) to
+the engine's user code ending while the code floods stdout and the console is
+slow to write the output. Control messages should not wait for the bulk
+output queued ahead of them (see eng_messages.get_priority) so the latency
+should stay a few milliseconds however much output is waiting.
+
+The engine runs in this process without a message bus connection; the
+MBClient send and publish methods are replaced while the check runs by a
+simulated console which takes MSG_COST seconds plus the time to write the
+string at WRITE_RATE bytes/s for each CON_WRITE message, and acknowledges the
+output written (ENG_OUTPUT_ACK).
+
+Run this module (python -m ptk_lib.engine.eng_latency) to repeat the check
+and exit with status 1 if the worst stop latency is over the limit.
+"""
+#---logging---------------------------------------------------------------------
+import logging
+log = logging.getLogger(__name__)
+
+#---Imports---------------------------------------------------------------------
+import sys
+import time
+import threading
+
+from ptk_lib.message_bus.mb_client import MBClient
+
+import eng_messages
+
+#---Globals---------------------------------------------------------------------
+MSG_COST = 0.002            #time (s) the simulated console takes per message
+WRITE_RATE = 50e6           #bytes/s the simulated console writes
+LIMIT = 0.1                 #max acceptable stop latency (s)
+
+#user code flooding stdout
+FLOOD = "i = 0\nwhile True:\n    print 'x'*200, i\n    i += 1\n"
+
+#-------------------------------------------------------------------------------
+class _Msg():
+    """Minimal message object for calling the engine's message handlers"""
+    def __init__(self, sender, data):
+        self.sender = sender
+        self.data = data
+
+    def get_from(self):
+        return self.sender
+
+    def get_data(self):
+        return self.data
+
+class SlowConsole():
+    def __init__(self, engine, name='Console.latency'):
+        """
+        Simulated console for the engine given, replaces the MBClient methods
+        used to send messages while installed.
+        """
+        self.engine = engine
+        self.name = name
+        self._saved = None
+
+    def install(self):
+        self._saved = ( MBClient.send_msg, MBClient.publish_msg,
+                        MBClient.subscribe, MBClient.unsubscribe )
+        console = self
+
+        def send_msg(client, to, subject, data=(), get_result=False):
+            return console.receive(subject, data)
+        def publish_msg(client, subject, data=()):
+            return None
+        def subscribe(client, *args, **kwargs):
+            return None
+        def unsubscribe(client, *args, **kwargs):
+            return None
+
+        MBClient.send_msg = send_msg
+        MBClient.publish_msg = publish_msg
+        MBClient.subscribe = subscribe
+        MBClient.unsubscribe = unsubscribe
+
+    def uninstall(self):
+        if self._saved is None:
+            return
+        (MBClient.send_msg, MBClient.publish_msg, MBClient.subscribe,
+            MBClient.unsubscribe) = self._saved
+        self._saved = None
+
+    def receive(self, subject, data):
+        """A message sent by the engine to the console"""
+        if subject in (eng_messages.CON_WRITE_STDOUT,
+                        eng_messages.CON_WRITE_STDERR):
+            string, = data
+            time.sleep(MSG_COST + len(string)/WRITE_RATE)
+            self.engine.msg_output_ack( _Msg(self.name, (len(string),)) )
+        return None
+
+#-------------------------------------------------------------------------------
+def stop_latency(engine, console, delay=1.0):
+    """
+    Run the output flood in the engine, send a stop request after delay
+    seconds and return (latency (s), lines printed).
+    """
+    code = compile(FLOOD, '<flood>', 'exec')
+    res = {}
+
+    def stopper():
+        time.sleep(delay)
+        res['t'] = time.time()
+        engine.msg_stop( _Msg(console.name, ()) )
+    t = threading.Thread(target=stopper)
+    t.setDaemon(True)
+    t.start()
+
+    engine._run_code(code)
+    latency = time.time() - res['t']
+    t.join()
+    return latency, engine._userdict.get('i', 0)
+
+def check(repeats=5, limit=LIMIT):
+    """
+    Repeat the stop latency check, print the results and return True if the
+    worst latency is below the limit.
+    """
+    from py_engine import pyEngine
+
+    #only one engine can be created in a process
+    engine = pyEngine('Latency', userdict={})
+    console = SlowConsole(engine)
+    console.install()
+    #stdout is redirected to the engine while it is managed
+    out = sys.stdout
+    print >>out, ('Stop latency during an output flood (console %.0f '
+                    'ms/message):'%(MSG_COST*1000))
+    worst = 0.0
+    try:
+        engine.manage(console.name)
+        for n in xrange(repeats):
+            latency, lines = stop_latency(engine, console)
+            worst = max(worst, latency)
+            print >>out, '  run %d: %6.1f ms  (%d lines printed)'%(n+1, 
+                                                        latency*1000, lines)
+    finally:
+        engine.restore_stdio()
+        console.uninstall()
+
+    ok = worst < limit
+    print '  worst: %6.1f ms, limit %.0f ms: %s'%(worst*1000, limit*1000,
+                                                ['FAIL', 'ok'][ok])
+    return ok
+
+if __name__ == '__main__':
+    if check() is False:
+        sys.exit(1)
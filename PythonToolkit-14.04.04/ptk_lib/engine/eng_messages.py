@@ -35,7 +35,8 @@ ENG_EXECCOMMAND = 'Eng.ExecCommand'
 #evaluate statement in process, data=string, reply=result
 ENG_EVALCOMMAND = 'Eng.EvalCommand'                      
 
-#register a task with the engine process, data=(name,code),reply=None
+#register a task with the engine process, data=(code, replace=False),
+#reply=True/False
 ENG_REGISTERTASK = 'Eng.RegisterTask'     
 
 #Exectute a task in process, data=code, reply=result
@@ -54,6 +55,67 @@ ENG_GETSTATE = 'Eng.GetState'
 #Get a list of the registered engine task names, reply= (taskname1, taskname2, ...)
 ENG_GETTASKS = 'Eng.GetTasks'  
 
+#Run a batch of tasks/evaluations in process, data=(items, level) where items 
+#is a list of (taskname, args, kwargs) tuples or expression strings to evaluate,
+#reply= list of results (or the exception raised for that item)
+ENG_RUNTASK_BATCH = 'Eng.RunTaskBatch'
+
+#Run a task returning an iterable (e.g. a generator) and send the items back as
+#they are produced, only sent via ENG_REQUEST. data=(taskname, args, kwargs, 
+#level, chunksize), the items are sent in CON_REPLY_CHUNK messages of up to 
+#chunksize items and the CON_REPLY result is the total number of items sent.
+ENG_RUNTASK_STREAM = 'Eng.RunTaskStream'
+
+#Stop sending the items of a streamed task, data=(reqid,) reply=None
+ENG_STREAM_CANCEL = 'Eng.Stream.Cancel'
+
+#Resolve an address string to a handle for the object (see eng_handles), 
+#data=(address, level), reply=EngineHandle or the exception raised.
+ENG_RESOLVE = 'Eng.Resolve'
+
+#Enable/disable use of the shared memory ring buffer opened by the engine for 
+#output and large results, data=(flag,) reply=True/False
+ENG_SHM_ENABLE = 'Eng.Shm.Enable'
+
+#Non-blocking request, the engine handles the data as if it was sent with the 
+#subject given and sends the result back to the sender in a CON_REPLY message.
+# data=(reqid, subject, data, [timeout, [queue]]), reply=None. If a timeout (in
+#seconds) is given the handler is interrupted after the timeout and the result 
+#is an EngineTimeoutError (see eng_misc). Tasks and evaluations are run by the
+#worker threads for the queue named ('interactive' or 'bulk', see 
+#eng_scheduler).
+ENG_REQUEST = 'Eng.Request'
+
+#Blocking request with a timeout, the engine handles the data as if it was sent
+#with the subject given but interrupts the handler after timeout seconds.
+# data=(timeout, subject, data), reply=result or an EngineTimeoutError
+ENG_DEADLINE = 'Eng.Deadline'
+
+#Run a parallel map function over a chunk of items in a helper engine (see 
+#eng_pmap), only sent via ENG_REQUEST. data=(name, code, defaults, modules, 
+#chunk) the marshalled function code, pickled defaults and items and the 
+#modules to import, the CON_REPLY result is ('ok', pickled results) or 
+#('error', pickled exception, description, traceback)
+ENG_PMAP_CHUNK = 'Eng.PMap.Chunk'
+
+#A helper engine started for this engine (CON_START_HELPERS) has connected, 
+#data=(helper node name,), reply=None
+ENG_HELPER_READY = 'Eng.HelperReady'
+
+#The console has written output sent by the engine, data=(nchars,) number of 
+#characters written since the last acknowledgement, reply=None
+ENG_OUTPUT_ACK = 'Eng.OutputAck'
+
+#Fork the engine process into a new engine node with a copy of the user 
+#namespace (py engines on posix only), data=(englabel,) label for the new 
+#engine or None, reply=new engine node name
+ENG_CLONE = 'Eng.Clone'
+
+#Create a namespace engine hosted by the engine's process; a new engine node 
+#with its own user namespace sharing the imported modules (py engines only), 
+#data=(englabel,) label for the new engine or None, reply=new engine node name
+ENG_NEW_NAMESPACE = 'Eng.NewNamespace'
+
 ##Debugger
 
 #Toggle debug/traceback mode, data=enable (True/False), reply=state (True/False)
@@ -123,6 +185,21 @@ CON_WRITE_STDERR = 'Con.Write.StdErr'
 #Clear the console, data=None, reply=None
 CON_CLEAR = 'Con.Clear'
 
+#Result of an ENG_REQUEST, data=(reqid, result), reply=None
+CON_REPLY = 'Con.Reply'
+
+#Items produced by a streamed task (ENG_RUNTASK_STREAM) before its CON_REPLY, 
+#data=(reqid, seq, items) seq is the chunk number from 0, reply=None
+CON_REPLY_CHUNK = 'Con.ReplyChunk'
+
+#Start helper engines for the engine's parallel maps (see eng_pmap), 
+#data=(n,) number of helpers, reply=list of the helper node names. Each helper
+#is announced to the engine with ENG_HELPER_READY once it has connected.
+CON_START_HELPERS = 'Con.StartHelpers'
+
+#Records are waiting in the shared memory ring buffer, data=(), reply=None
+CON_SHM_NOTIFY = 'Con.ShmNotify'
+
 #Execute the source lines as if entered by the console by the user, data=(Source,), reply=None
 CON_EXECSOURCE = 'Con.ExecSource'
 
@@ -146,12 +223,29 @@ ENGINE_STATE_DONE    = 'Engine.State.Done'
 # may have changed. i.e. data has been imported. data=(busy, debug, profile)
 ENGINE_STATE_CHANGE = 'Engine.State.Change'
 
+#Names in the user namespace changed by a user command (published before 
+#ENGINE_STATE_DONE, not published if nothing changed). 
+#data=(added, removed, rebound, mutated) tuples of names (see eng_namespace)
+ENGINE_NAMESPACE_CHANGED = 'Engine.Namespace.Changed'
+
+#A background job was started (see eng_jobs), data=(jobid, description)
+ENGINE_JOB_STARTED = 'Engine.Job.Started'
+
+#A background job finished (see eng_jobs), data=(jobid, state) where state is
+#'done', 'failed' or 'stopped'
+ENGINE_JOB_DONE = 'Engine.Job.Done'
+
 #Published by the engine when user input has been sucessfully pushed to the 
 #engine this could a line of code, debugger command or standard input
 # data= (line, type='CMD','DBG_CMD','INPUT') where type indicates how it was 
 #processed.
 ENG_LINE_PROCESSED = 'Engine.LineProcessed' 
 
+#Engine request/task did not complete in the timeout given and was interrupted
+# data=(subject, description, timeout) description is the task name or the 
+#source evaluated
+ENGINE_REQUEST_TIMEOUT = 'Engine.Request.Timeout'
+
 ##Debugger
 #subject group for debugger messages
 ENGINE_DEBUG = 'Engine.Debug'
@@ -173,3 +267,55 @@ ENGINE_DEBUG_SCOPECHANGED = 'Engine.Debug.ScopeChanged'
 
 #published when the profiler mode is enabled, data= (enabled=True/False)
 ENGINE_PROFILE_TOGGLED = 'Engine.Profile.Toggled'
+
+#---Message priorities----------------------------------------------------------
+#
+# Messages between the engine and console fall into three classes. Control 
+# messages must keep their order relative to the output written before them so 
+# the output is sent/written first. Query results are not ordered with the 
+# output and overtake any output waiting to be sent/written. Bulk output is 
+# sent by the engine output thread and written by the console in chunks so it 
+# never holds up the other classes.
+PRIORITY_CONTROL = 0    #stop, debugger, prompts, state
+PRIORITY_QUERY   = 1    #tool queries/task results
+PRIORITY_BULK    = 2    #stdout/stderr output
+
+MSG_PRIORITY = {
+    ENG_MANAGE          : PRIORITY_CONTROL,
+    ENG_RELEASE         : PRIORITY_CONTROL,
+    ENG_PUSH            : PRIORITY_CONTROL,
+    ENG_STOP            : PRIORITY_CONTROL,
+    ENG_OUTPUT_ACK      : PRIORITY_CONTROL,
+    ENG_CLONE           : PRIORITY_CONTROL,
+    ENG_NEW_NAMESPACE   : PRIORITY_CONTROL,
+    ENG_HELPER_READY    : PRIORITY_CONTROL,
+    ENG_STREAM_CANCEL   : PRIORITY_CONTROL,
+    ENG_DEBUG_TOGGLE    : PRIORITY_CONTROL,
+    ENG_DEBUG_PAUSE     : PRIORITY_CONTROL,
+    ENG_DEBUG_RESUME    : PRIORITY_CONTROL,
+    ENG_DEBUG_END       : PRIORITY_CONTROL,
+    ENG_DEBUG_STEP      : PRIORITY_CONTROL,
+    ENG_DEBUG_STEPIN    : PRIORITY_CONTROL,
+    ENG_DEBUG_STEPOUT   : PRIORITY_CONTROL,
+    ENG_DEBUG_SETSCOPE  : PRIORITY_CONTROL,
+    ENG_PROFILE_TOGGLE  : PRIORITY_CONTROL,
+    CON_PROMPT          : PRIORITY_CONTROL,
+    CON_PROMPT_STDIN    : PRIORITY_CONTROL,
+    CON_PROMPT_DEBUG    : PRIORITY_CONTROL,
+    CON_WRITE_DEBUG     : PRIORITY_CONTROL,
+    CON_CLEAR           : PRIORITY_CONTROL,
+    CON_EXECSOURCE      : PRIORITY_CONTROL,
+    CON_START_HELPERS   : PRIORITY_CONTROL,
+    CON_REPLY           : PRIORITY_QUERY,
+    CON_REPLY_CHUNK     : PRIORITY_QUERY,
+    CON_WRITE_STDOUT    : PRIORITY_BULK,
+    CON_WRITE_STDERR    : PRIORITY_BULK,
+    CON_SHM_NOTIFY      : PRIORITY_BULK,
+}
+
+def get_priority(subject):
+    """
+    Returns the priority class of the message subject, PRIORITY_QUERY if the 
+    subject is not listed.
+    """
+    return MSG_PRIORITY.get(subject, PRIORITY_QUERY)
@@ -79,6 +79,13 @@ def get_available_engines():
 
     return engtypes, engdescrip
 
+#-------------------------------------------------------------------------------
+class EngineTimeoutError(Exception):
+    """
+    Result of an engine request that did not complete within its timeout.
+    """
+    pass
+
 #-------------------------------------------------------------------------------
 def get_message_port():
     """
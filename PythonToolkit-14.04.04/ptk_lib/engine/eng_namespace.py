@@ -0,0 +1,126 @@
+"""
+Engine namespace change sets.
+
+Before and after each user command the engine takes a cheap fingerprint of the
+user namespace ({name: (id, type, size)}) and publishes the names that changed
+in an ENGINE_NAMESPACE_CHANGED message so tools only refresh what is affected.
+
+The change set is (added, removed, rebound, mutated) where mutated names are
+still bound to the same object but the object may have changed; its size
+(length, array shape/data) changed or the name is used by the command and the
+object is mutable. Changes made to objects by functions called in the command
+without using the object's name are not detected.
+"""
+#---logging---------------------------------------------------------------------
+import logging
+log = logging.getLogger(__name__)
+
+#---Imports---------------------------------------------------------------------
+import sys
+import re
+import types
+
+#---Globals---------------------------------------------------------------------
+#objects of these types cannot be changed in place
+IMMUTABLE_TYPES = set([type(None), bool, int, long, float, complex, str,
+                        unicode, tuple, frozenset, types.FunctionType,
+                        types.BuiltinFunctionType])
+
+#builtin containers where the length is included in the fingerprint
+SIZED_TYPES = set([list, dict, set, str, unicode, tuple, bytearray])
+
+#address root name
+_root_re = re.compile(r'\s*([A-Za-z_][A-Za-z0-9_]*)')
+
+#-------------------------------------------------------------------------------
+def fingerprint(namespace):
+    """
+    Returns the fingerprint of the namespace dictionary {name: (id, type, size)}
+    where size is the length of builtin containers or the data address, shape
+    and dtype of numpy arrays.
+    """
+    numpy = sys.modules.get('numpy', None)
+    if numpy is not None:
+        ndarray = numpy.ndarray
+    else:
+        ndarray = None
+
+    fp = {}
+    for name, obj in namespace.items():
+        t = type(obj)
+        size = None
+        try:
+            if t in SIZED_TYPES:
+                size = len(obj)
+            elif (ndarray is not None) and isinstance(obj, ndarray):
+                size = (obj.__array_interface__['data'][0], obj.shape,
+                        obj.dtype.str)
+        except:
+            pass
+        fp[name] = (id(obj), t, size)
+    return fp
+
+def code_names(code):
+    """
+    Returns the set of names used by the code object and any code objects it
+    contains (functions/classes/comprehensions defined in it), or None if the
+    code is not a code object (e.g. a source string).
+    """
+    if isinstance(code, types.CodeType) is False:
+        return None
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names.update(code_names(const))
+    return names
+
+def diff(before, after, used=None):
+    """
+    Compare two namespace fingerprints, returns the change set (added, removed,
+    rebound, mutated) as tuples of sorted names. used is the set of names used
+    by the code run (see code_names), if None all names are treated as used.
+    """
+    if used is None:
+        used = after
+    added = []
+    removed = []
+    rebound = []
+    mutated = []
+    for name, (oid, t, size) in after.iteritems():
+        old = before.get(name, None)
+        if old is None:
+            added.append(name)
+        elif old[0] != oid:
+            rebound.append(name)
+        elif (old[2] != size) or ((name in used) and (t not in IMMUTABLE_TYPES)):
+            mutated.append(name)
+    for name in before:
+        if name not in after:
+            removed.append(name)
+    return (tuple(sorted(added)), tuple(sorted(removed)),
+            tuple(sorted(rebound)), tuple(sorted(mutated)))
+
+def is_empty(changes):
+    """
+    Returns True if the change set has no changes.
+    """
+    for names in changes:
+        if names:
+            return False
+    return True
+
+def affects(changes, address):
+    """
+    Returns True if the change set may affect the object at the address given
+    (e.g. 'a.b[0]'), an address of '' is the whole namespace.
+    """
+    if address in ['', u'']:
+        return not is_empty(changes)
+    match = _root_re.match(address)
+    if match is None:
+        return True
+    root = match.group(1)
+    for names in changes:
+        if root in names:
+            return True
+    return False
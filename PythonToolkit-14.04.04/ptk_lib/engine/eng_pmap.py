@@ -0,0 +1,308 @@
+"""
+Parallel map across helper engines.
+
+pmap(func, iterable) splits the items into chunks and runs func over each chunk
+in helper engines - pyEngine processes started by the console tool for the
+engine (CON_START_HELPERS) which connect to the message bus without a console
+page. The helpers are kept for later pmap calls and are closed when the engine
+that requested them disconnects.
+
+The function is sent as its marshalled code (like engine tasks) and the chunks
+and results are pickled, so:
+    - the function cannot use closures, names from the user namespace other
+      than modules (which are imported in the helper) or objects that cannot
+      be pickled; it should import what it needs.
+    - the items and results must be picklable.
+
+Chunks are sent as non-blocking requests (ENG_REQUEST) run on the helpers'
+bulk queue and the results come back in CON_REPLY messages; each helper has at
+most two chunks queued so faster helpers take more of the work. The results are
+returned in the order of the items. The first exception raised by func is
+raised in the engine as a RemoteError including the remote traceback.
+"""
+#---logging---------------------------------------------------------------------
+import logging
+log = logging.getLogger(__name__)
+
+#---Imports---------------------------------------------------------------------
+import sys
+import time
+import types
+import marshal
+import pickle
+import traceback
+import Queue
+from threading import Lock
+
+from ptk_lib.message_bus import mb_protocol
+
+import eng_messages
+import eng_scheduler
+import eng_namespace
+
+#---Globals---------------------------------------------------------------------
+CHUNKS_PER_HELPER = 2       #chunks sent to a helper before it replies
+CHUNKS_PER_ENGINE = 4       #default number of chunks per helper engine
+STARTUP_TIMEOUT = 60        #time (s) to wait for a helper engine to connect
+PROGRESS_INTERVAL = 1.0     #min time (s) between progress messages
+
+#-------------------------------------------------------------------------------
+class RemoteError(Exception):
+    """
+    Exception raised by the mapped function in a helper engine.
+        helper      -   helper engine node name
+        exc         -   the exception if it could be pickled else None
+        remote_tb   -   formatted remote traceback
+    """
+    def __init__(self, helper, exc, description, remote_tb):
+        Exception.__init__(self, 'Exception in helper engine '+str(helper)+
+                            ': '+description+'\n\nRemote traceback:\n'+
+                            remote_tb)
+        self.helper = helper
+        self.exc = exc
+        self.remote_tb = remote_tb
+
+#-------------------------------------------------------------------------------
+def cpu_count():
+    """Returns the number of cpus or 2 if it cannot be found"""
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except:
+        return 2
+
+def pack_function(func):
+    """
+    Returns the data needed to rebuild the function in a helper engine:
+    (name, marshalled code, pickled defaults, [(name, module name)]) where the
+    modules are those in the user namespace used by the function.
+    """
+    if isinstance(func, types.FunctionType) is False:
+        raise Exception('pmap needs a python function, got: '+repr(func))
+    if func.func_closure:
+        raise Exception('pmap cannot send functions using variables from an '
+                        'enclosing function: '+func.func_name)
+    modules = []
+    for name in eng_namespace.code_names(func.func_code):
+        obj = func.func_globals.get(name, None)
+        if isinstance(obj, types.ModuleType):
+            modules.append( (name, obj.__name__) )
+    defaults = pickle.dumps(func.func_defaults, pickle.HIGHEST_PROTOCOL)
+    return (func.func_name, marshal.dumps(func.func_code), defaults, modules)
+
+def run_chunk(engine, data):
+    """
+    Run the function over a chunk of items in a helper engine, returns
+    ('ok', pickled results) or ('error', pickled exception or None,
+    description, formatted traceback).
+    """
+    name, code, defaults, modules, chunk = data
+    userdict = engine._userdict
+    try:
+        for alias, modname in modules:
+            if alias not in userdict:
+                __import__(modname)
+                userdict[alias] = sys.modules[modname]
+        func = types.FunctionType(marshal.loads(code), userdict, name,
+                                    pickle.loads(defaults))
+        results = [func(item) for item in pickle.loads(chunk)]
+        return ('ok', pickle.dumps(results, pickle.HIGHEST_PROTOCOL))
+    except:
+        etype, exc, tb = sys.exc_info()
+        tb_text = traceback.format_exc()
+        description = traceback.format_exception_only(etype, exc)[-1].strip()
+        try:
+            exc = pickle.dumps(exc, pickle.HIGHEST_PROTOCOL)
+        except:
+            exc = None
+        return ('error', exc, description, tb_text)
+
+#-------------------------------------------------------------------------------
+class HelperPool():
+    def __init__(self, engine):
+        """
+        Helper engines used by pmap for an engine.
+        """
+        self.engine = engine
+        self._lock = Lock()
+        self._ready = []            #connected helper node names
+        self._pending = set()       #helpers requested but not connected
+        self._events = Queue.Queue()#(type, data) from the message handlers
+        self._reqcount = 0
+
+    #---interface---------------------------------------------------------------
+    def get_helpers(self):
+        """Returns the list of connected helper engine node names"""
+        with self._lock:
+            return list(self._ready)
+
+    def start_helpers(self, n):
+        """
+        Ask the console to start helper engines so there are n helpers.
+        """
+        with self._lock:
+            need = n - len(self._ready) - len(self._pending)
+        if need <= 0:
+            return
+        if self.engine.console is None:
+            raise Exception('No managing console to start helper engines!')
+        names = self.engine.send_msg( self.engine.console,
+                                        eng_messages.CON_START_HELPERS,
+                                        (need,), get_result=True)
+        if isinstance(names, Exception):
+            raise names
+        #helpers may be ready before the reply arrives
+        with self._lock:
+            for name in names:
+                if name not in self._ready:
+                    self._pending.add(name)
+
+    def map(self, func, iterable, nengines=None, chunksize=None, progress=True):
+        """
+        Map the function over the items using nengines helper engines (by
+        default the number of cpus), in chunks of chunksize items. Returns the
+        list of results in the order of the items. If progress is True the
+        progress is written to stdout.
+        """
+        if self.engine.engtype == 'Internal':
+            raise Exception('pmap is not available in the internal engine')
+
+        items = list(iterable)
+        if items == []:
+            return []
+        if nengines is None:
+            nengines = cpu_count()
+        nengines = max(int(nengines), 1)
+        if chunksize is None:
+            chunksize = -(-len(items)//(nengines*CHUNKS_PER_ENGINE))
+        chunksize = max(int(chunksize), 1)
+
+        packed = pack_function(func)
+        chunks = []
+        for n in range(0, len(items), chunksize):
+            chunks.append( pickle.dumps(items[n:n+chunksize],
+                                        pickle.HIGHEST_PROTOCOL) )
+
+        #discard replies/events left from an earlier (stopped) map
+        while True:
+            try:
+                self._events.get_nowait()
+            except Queue.Empty:
+                break
+
+        self.start_helpers(nengines)
+
+        todo = range(len(chunks))      #chunk indices waiting to be sent
+        inflight = {}                   #{reqid: (helper, chunk index)}
+        results = [None]*len(chunks)
+        ndone = 0
+        t0 = time.time()
+        last = t0
+        while ndone < len(chunks):
+            #send chunks to helpers with space in their queue
+            helpers = self.get_helpers()[:nengines]
+            load = dict((helper, 0) for helper in helpers)
+            for helper, index in inflight.values():
+                if helper in load:
+                    load[helper] += 1
+            for helper in helpers:
+                while todo and (load[helper] < CHUNKS_PER_HELPER):
+                    index = todo.pop(0)
+                    reqid = self._send_chunk(helper, packed, chunks[index])
+                    inflight[reqid] = (helper, index)
+                    load[helper] += 1
+
+            if (helpers == []) and (len(self._pending) == 0):
+                raise Exception('No helper engines available for pmap')
+            if (helpers == []) and (time.time()-t0 > STARTUP_TIMEOUT):
+                raise Exception('Timed out waiting for pmap helper engines')
+
+            #wait for a reply or a helper to connect/disconnect
+            try:
+                event, data = self._events.get(timeout=0.5)
+            except Queue.Empty:
+                continue
+
+            if event == 'reply':
+                reqid, result = data
+                helper, index = inflight.pop(reqid, (None, None))
+                if index is None:
+                    continue
+                results[index] = self._unpack_result(helper, result)
+                ndone += 1
+            elif event == 'lost':
+                #send the lost helper's chunks to the others
+                for reqid, (helper, index) in inflight.items():
+                    if helper == data:
+                        inflight.pop(reqid)
+                        todo.insert(0, index)
+
+            if (progress is True) and (time.time()-last > PROGRESS_INTERVAL):
+                last = time.time()
+                sys.stdout.write('pmap: %d/%d chunks done\n'%(ndone,
+                                                                len(chunks)))
+
+        if progress is True:
+            sys.stdout.write('pmap: %d items in %.1fs using %d helper engines\n'
+                        %(len(items), time.time()-t0, len(self.get_helpers()[:nengines])))
+
+        res = []
+        for chunk in results:
+            res.extend(chunk)
+        return res
+
+    #---message handlers--------------------------------------------------------
+    def msg_helper_ready(self, msg):
+        """
+        Message handler for ENG_HELPER_READY - a helper engine connected.
+        """
+        helper, = msg.get_data()
+        with self._lock:
+            self._ready.append(helper)
+            self._pending.discard(helper)
+        self.engine.subscribe( mb_protocol.SYS_NODE_DISCONNECT+'.'+helper,
+                                self.msg_helper_lost)
+        self._events.put( ('ready', helper) )
+
+    def msg_helper_lost(self, msg):
+        """
+        SYS_NODE_DISCONNECT handler for helper engines.
+        """
+        helper, = msg.get_data()
+        with self._lock:
+            if helper in self._ready:
+                self._ready.remove(helper)
+            self._pending.discard(helper)
+        self._events.put( ('lost', helper) )
+
+    def msg_reply(self, msg):
+        """
+        Message handler for CON_REPLY - the result of a chunk.
+        """
+        reqid, result = msg.get_data()
+        self._events.put( ('reply', (reqid, result)) )
+
+    #---internal methods--------------------------------------------------------
+    def _send_chunk(self, helper, packed, chunk):
+        """Send a chunk to the helper, returns the request id"""
+        with self._lock:
+            self._reqcount += 1
+            reqid = self._reqcount
+        data = (reqid, eng_messages.ENG_PMAP_CHUNK, packed+(chunk,), None,
+                eng_scheduler.QUEUE_BULK)
+        self.engine.send_msg(helper, eng_messages.ENG_REQUEST, data)
+        return reqid
+
+    def _unpack_result(self, helper, result):
+        """Returns the results of a chunk or raises the remote error"""
+        if isinstance(result, Exception):
+            raise result
+        if result[0] == 'ok':
+            return pickle.loads(result[1])
+        status, exc, description, remote_tb = result
+        if exc is not None:
+            try:
+                exc = pickle.loads(exc)
+            except:
+                exc = None
+        raise RemoteError(helper, exc, description, remote_tb)
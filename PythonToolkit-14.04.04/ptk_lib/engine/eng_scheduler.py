@@ -0,0 +1,132 @@
+"""
+Engine request scheduler.
+
+Runs non-blocking engine requests (ENG_REQUEST) on worker threads so a slow
+request does not hold up the others or the engine's message thread. Each named
+queue has its own bounded set of worker threads, requests tagged by the console
+as 'bulk' (exports, large transfers) therefore never delay the 'interactive'
+requests made by tools (autocompletion, calltips, namespace browsing).
+
+Control messages and blocking requests are still handled on the engine's
+message thread in the order they arrive.
+"""
+#---logging---------------------------------------------------------------------
+import logging
+log = logging.getLogger(__name__)
+
+#---Imports---------------------------------------------------------------------
+import time
+import Queue
+from threading import Thread, Lock
+
+#---Queue names-----------------------------------------------------------------
+QUEUE_INTERACTIVE = 'interactive'   #short tool queries
+QUEUE_BULK = 'bulk'                 #long running tasks
+
+#default number of worker threads for each queue
+DEFAULT_WORKERS = { QUEUE_INTERACTIVE: 1, QUEUE_BULK: 1 }
+
+#-------------------------------------------------------------------------------
+class RequestScheduler():
+    def __init__(self, workers=None):
+        """
+        Create a scheduler.
+            workers - {queue name: number of worker threads}, by default
+                      DEFAULT_WORKERS. The worker threads are started when the
+                      first request is added to the queue.
+        """
+        if workers is None:
+            workers = DEFAULT_WORKERS
+        self.workers = dict(workers)
+
+        self._lock = Lock()
+        self._queues = {}       #{name: Queue}
+        self._threads = {}      #{name: [threads]}
+        self._stats = {}        #{name: counters dict} see get_stats
+
+    #---interface---------------------------------------------------------------
+    def submit(self, queue, func, *args):
+        """
+        Add a call to func(*args) to the named queue. Requests for an unknown
+        queue are added to the interactive queue.
+        """
+        if queue not in self.workers:
+            queue = QUEUE_INTERACTIVE
+        with self._lock:
+            q = self._queues.get(queue, None)
+            if q is None:
+                q = self._start_queue(queue)
+            self._stats[queue]['submitted'] += 1
+        q.put( (time.time(), func, args) )
+
+    def get_stats(self):
+        """
+        Returns a dictionary of {queue name: counters} for tuning the number of
+        workers, the counters are:
+            submitted   -   number of requests added
+            completed   -   number of requests run
+            pending     -   number of requests waiting for a worker
+            wait_mean   -   mean time (s) requests waited before running
+            wait_max    -   longest time (s) a request waited
+            run_mean    -   mean time (s) to run a request
+            run_max     -   longest time (s) to run a request
+            workers     -   number of worker threads
+        """
+        stats = {}
+        with self._lock:
+            for name, counters in self._stats.iteritems():
+                n = max(counters['completed'], 1)
+                stats[name] = {
+                    'submitted' : counters['submitted'],
+                    'completed' : counters['completed'],
+                    'pending'   : self._queues[name].qsize(),
+                    'wait_mean' : counters['wait_total']/n,
+                    'wait_max'  : counters['wait_max'],
+                    'run_mean'  : counters['run_total']/n,
+                    'run_max'   : counters['run_max'],
+                    'workers'   : len(self._threads[name]), }
+        return stats
+
+    #---internal methods--------------------------------------------------------
+    def _start_queue(self, name):
+        """
+        Create the queue and start its worker threads (called with the lock
+        held).
+        """
+        q = Queue.Queue()
+        self._queues[name] = q
+        self._stats[name] = {'submitted': 0, 'completed': 0,
+                            'wait_total': 0.0, 'wait_max': 0.0,
+                            'run_total': 0.0, 'run_max': 0.0}
+        threads = []
+        for n in range(max(self.workers[name], 1)):
+            t = Thread(target=self._worker, args=(name, q),
+                        name='Engine %s worker %d'%(name, n))
+            t.setDaemon(True)
+            t.start()
+            threads.append(t)
+        self._threads[name] = threads
+        return q
+
+    def _worker(self, name, q):
+        """
+        Worker thread - run the requests in the queue
+        """
+        while True:
+            t_submit, func, args = q.get()
+            t_start = time.time()
+            try:
+                func(*args)
+            except:
+                log.exception('Scheduled request failed')
+            t_end = time.time()
+
+            with self._lock:
+                counters = self._stats[name]
+                counters['completed'] += 1
+                wait = t_start-t_submit
+                run = t_end-t_start
+                counters['wait_total'] += wait
+                counters['run_total'] += run
+                counters['wait_max'] = max(counters['wait_max'], wait)
+                counters['run_max'] = max(counters['run_max'], run)
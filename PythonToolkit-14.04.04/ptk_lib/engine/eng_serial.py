@@ -0,0 +1,192 @@
+"""
+Engine serializer.
+
+Encoding of message payloads and results passed between the engine and the
+console. Most payloads are small flat tuples of strings, numbers and flags 
+(prompts, output, state changes) which are encoded with marshal. Anything else,
+including large payloads (which marshal is slow to encode), falls back to the 
+highest pickle protocol. The codec is chosen per 
+payload and identified by the first byte of the encoded string so the receiver 
+does not need to know which was used.
+
+Further codecs can be added with add_codec, they are tried in order before
+falling back to pickle.
+
+Run this module to benchmark the encode+decode cost of a typical engine message
+mix against pickle. On CPython 2.7 cPickle is as fast or faster for the
+messages in the mix (the python level payload check costs more than marshal
+saves) so the engine and console use cPickle directly; this module is kept to
+measure alternative codecs against it.
+"""
+#---logging---------------------------------------------------------------------
+import logging
+log = logging.getLogger(__name__)
+
+#---Imports---------------------------------------------------------------------
+import marshal
+import cPickle
+
+#---Globals---------------------------------------------------------------------
+#types marshal encodes without loss (exact types only - marshal silently
+#converts subclasses to the base type)
+SIMPLE_TYPES = set([type(None), bool, int, long, float, complex])
+STRING_TYPES = set([str, unicode])
+
+#limits on payloads encoded by marshal
+MAX_ITEMS = 8           #number of items in the payload tuple
+MAX_STRING = 1024       #length of each string
+
+#first byte of pickles (protocol 2+), codec tags must not use it.
+PICKLE_TAG = '\x80'
+
+#-------------------------------------------------------------------------------
+def is_simple(obj):
+    """
+    Returns True if obj is a small flat tuple of the builtin types marshal
+    encodes exactly. 
+    
+    Only the payload tuple itself is checked - any check of nested data done in
+    python costs more than marshal saves over cPickle.
+    """
+    if (type(obj) is not tuple) or (len(obj) > MAX_ITEMS):
+        return False
+    for item in obj:
+        t = type(item)
+        if t in STRING_TYPES:
+            if len(item) > MAX_STRING:
+                return False
+        elif t not in SIMPLE_TYPES:
+            return False
+    return True
+
+#---Codecs----------------------------------------------------------------------
+def _marshal_dumps(obj):
+    if is_simple(obj) is False:
+        return None
+    return marshal.dumps(obj, 2)
+
+def _pickle_dumps(obj):
+    return cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL)
+
+#list of [tag, name, dumps, loads] tried in order before pickle, dumps returns
+#None if it cannot encode the object.
+_codecs = [
+    ['M', 'marshal', _marshal_dumps, marshal.loads],
+]
+_loaders = dict( [(tag, loads) for tag, name, dumps, loads in _codecs] )
+
+def add_codec(tag, name, dumps, loads, index=None):
+    """
+    Add a codec.
+        tag     -   single character stored at the start of the encoded data
+        name    -   name of the codec
+        dumps   -   function to encode an object to a string, or return None if
+                    the object should be left to the next codec.
+        loads   -   function to decode the string
+        index   -   position to try the codec in, by default the codec is tried
+                    last before falling back to pickle.
+    """
+    if (len(tag) != 1) or (tag in _loaders) or (tag == PICKLE_TAG):
+        raise Exception('Codec tag must be a single unused character: '+repr(tag))
+    if index is None:
+        index = len(_codecs)
+    _codecs.insert(index, [tag, name, dumps, loads])
+    _loaders[tag] = loads
+
+def get_codecs():
+    """
+    Returns the list of codec names in the order they are tried.
+    """
+    return [name for tag, name, dumps, loads in _codecs] + ['pickle']
+
+#---Interface-------------------------------------------------------------------
+def dumps(obj):
+    """
+    Encode obj using the first codec that accepts it.
+    """
+    for tag, name, codec_dumps, codec_loads in _codecs:
+        data = codec_dumps(obj)
+        if data is not None:
+            return tag+data
+    #pickles are not tagged to avoid copying large results
+    return _pickle_dumps(obj)
+
+def loads(data):
+    """
+    Decode a string encoded by dumps.
+    """
+    tag = data[:1]
+    if tag == PICKLE_TAG:
+        return cPickle.loads(data)
+    try:
+        codec_loads = _loaders[tag]
+    except KeyError:
+        raise Exception('Unknown serializer codec: '+repr(tag))
+    return codec_loads(data[1:])
+
+def codec_of(data):
+    """
+    Returns the name of the codec used to encode data.
+    """
+    tag = data[:1]
+    if tag == PICKLE_TAG:
+        return 'pickle'
+    for codec_tag, name, codec_dumps, codec_loads in _codecs:
+        if codec_tag == tag:
+            return name
+    return None
+
+#---Benchmark-------------------------------------------------------------------
+def message_mix():
+    """
+    Returns a list of (count, description, payload) typical of the messages an
+    engine sends while running interactively.
+    """
+    scopes = ['Main', '<module>', 'run', 'process']
+    return [
+        (50, 'CON_WRITE_STDOUT line',   ('x = 1.23456789 [100/1000]\n',)),
+        (10, 'CON_WRITE_STDOUT buffer', ('line of some output text\n'*400,)),
+        (5,  'CON_WRITE_STDERR unicode',(u'warning: caf\xe9\n',)),
+        (10, 'CON_PROMPT',              ('>>> ', False)),
+        (10, 'ENGINE_STATE_BUSY/DONE',  (False, False)),
+        (5,  'ENGINE_DEBUG_PAUSED',     (('run', '/home/user/script.py', 42),
+                                          scopes, 2, (True, False))),
+        (5,  'CON_REPLY task result',   (12, {'x': (True, 'int', '1'),
+                                              'data': (False, 'list', '[...]'),
+                                              'name': (True, 'str', "'abc'")})),
+        (1,  'CON_REPLY large list',    (13, range(10000))),
+        (1,  'CON_REPLY object',        (14, Exception('error message'))),
+    ]
+
+def benchmark(repeats=2000):
+    """
+    Time the encode+decode of each payload in the engine message mix with
+    pickle and with this module.
+    """
+    import time
+
+    def timeit(encode, decode, payload, n):
+        t0 = time.time()
+        for i in xrange(n):
+            decode(encode(payload))
+        return (time.time()-t0)/n
+
+    mix = message_mix()
+    print 'Encode+decode per message (mean of %d, microseconds):'%repeats
+    print '  %-26s %10s %10s %10s'%('message', 'pickle', 'eng_serial', 'codec')
+    total_pickle = 0.0
+    total_serial = 0.0
+    for count, descrip, payload in mix:
+        t_pickle = timeit(_pickle_dumps, cPickle.loads, payload, repeats)
+        t_serial = timeit(dumps, loads, payload, repeats)
+        print '  %-26s %10.2f %10.2f %10s'%(descrip, t_pickle*1e6,
+                                        t_serial*1e6, codec_of(dumps(payload)))
+        total_pickle = total_pickle + count*t_pickle
+        total_serial = total_serial + count*t_serial
+    n = sum([count for count, descrip, payload in mix])
+    print '  %-26s %10.2f %10.2f'%('weighted mean', total_pickle*1e6/n,
+                                                    total_serial*1e6/n)
+    return total_pickle/n, total_serial/n
+
+if __name__ == '__main__':
+    benchmark()
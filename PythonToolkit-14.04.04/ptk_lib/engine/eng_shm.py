@@ -0,0 +1,155 @@
+"""
+Engine shared memory.
+
+A single producer/single consumer ring buffer in a memory mapped file, used to
+pass engine output and large results to the console for engines running on the
+same machine without going through the message bus socket.
+
+The console creates the ring file (SharedRing.create) and passes the path to the
+engine process on the command line. The engine writes records into the ring and
+sends a small CON_SHM_NOTIFY message to wake the console which reads all the
+records waiting in the ring. If a record does not fit into the free space the
+engine falls back to sending a normal message.
+
+File layout:
+    header  - total bytes written (uint64), total bytes read (uint64),
+              data size (uint64)
+    data    - the ring of records: length (uint32), channel (uint8), payload
+"""
+#---logging---------------------------------------------------------------------
+import logging
+log = logging.getLogger(__name__)
+
+#---Imports---------------------------------------------------------------------
+import os
+import mmap
+import struct
+import tempfile
+
+#---Record channels-------------------------------------------------------------
+SHM_STDOUT = 0          #payload = string written to stdout
+SHM_STDERR = 1          #payload = string written to stderr
+SHM_REPLY  = 2          #payload = pickled (reqid, result) of a CON_REPLY
+SHM_UNICODE = 0x80      #flag added to the channel if the payload is a utf-8
+                        #encoded unicode string
+
+def decode_string(channel, payload):
+    """
+    Returns the channel and string for a record written using write_string.
+    """
+    if channel & SHM_UNICODE:
+        return channel & ~SHM_UNICODE, payload.decode('utf-8')
+    return channel, payload
+
+#-------------------------------------------------------------------------------
+HEADER = struct.Struct('<QQQ')
+RECORD = struct.Struct('<IB')
+DEFAULT_SIZE = 4*1024*1024
+
+class SharedRing():
+    def __init__(self, path):
+        """
+        Open an existing ring buffer file.
+        """
+        self.path = path
+        f = open(path, 'r+b')
+        try:
+            self._map = mmap.mmap(f.fileno(), 0)
+        finally:
+            f.close()
+        self.size = HEADER.unpack_from(self._map, 0)[2]
+
+    @classmethod
+    def create(cls, size=DEFAULT_SIZE):
+        """
+        Create a new ring buffer file with a data area of size bytes in the
+        temporary directory and return the SharedRing.
+        """
+        fd, path = tempfile.mkstemp(prefix='ptk-', suffix='.ring')
+        try:
+            os.write(fd, HEADER.pack(0, 0, size))
+            os.lseek(fd, HEADER.size+size-1, os.SEEK_SET)
+            os.write(fd, '\0')
+        finally:
+            os.close(fd)
+        return cls(path)
+
+    #---interface---------------------------------------------------------------
+    def write(self, channel, payload):
+        """
+        Write a record to the ring (producer side only). Returns False if there
+        is not enough free space for the record.
+        """
+        written, read, size = HEADER.unpack_from(self._map, 0)
+        record = RECORD.pack(len(payload), channel) + payload
+        if len(record) > size-(written-read):
+            return False
+        self._put(written, record)
+        #update the write count only after the data is in place
+        struct.pack_into('<Q', self._map, 0, written+len(record))
+        return True
+
+    def read(self):
+        """
+        Read all the records waiting in the ring (consumer side only). Returns
+        a list of (channel, payload).
+        """
+        written, read, size = HEADER.unpack_from(self._map, 0)
+        records = []
+        while read < written:
+            n, channel = RECORD.unpack( self._get(read, RECORD.size) )
+            payload = self._get(read+RECORD.size, n)
+            records.append( (channel, payload) )
+            read = read + RECORD.size + n
+        struct.pack_into('<Q', self._map, 8, read)
+        return records
+
+    def write_string(self, channel, string):
+        """
+        Write a byte or unicode string record to the ring. Returns False if 
+        there is not enough free space for the record.
+        """
+        if isinstance(string, unicode):
+            return self.write(channel|SHM_UNICODE, string.encode('utf-8'))
+        return self.write(channel, string)
+
+    def free(self):
+        """
+        Returns the free space in the ring in bytes.
+        """
+        written, read, size = HEADER.unpack_from(self._map, 0)
+        return size-(written-read)
+
+    def close(self):
+        """
+        Unmap the ring buffer file.
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def unlink(self):
+        """
+        Remove the ring buffer file, the mapping remains valid until closed (on
+        platforms that allow removing open files).
+        """
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    #---internal methods--------------------------------------------------------
+    def _put(self, pos, data):
+        start = HEADER.size + (pos % self.size)
+        first = min(len(data), HEADER.size + self.size - start)
+        self._map[start:start+first] = data[:first]
+        if first < len(data):
+            self._map[HEADER.size:HEADER.size+len(data)-first] = data[first:]
+
+    def _get(self, pos, n):
+        start = HEADER.size + (pos % self.size)
+        first = min(n, HEADER.size + self.size - start)
+        data = self._map[start:start+first]
+        if first < n:
+            data = data + self._map[HEADER.size:HEADER.size+n-first]
+        return data
@@ -0,0 +1,185 @@
+"""
+Engine startup trace.
+
+Records the time taken by each phase of starting an engine process and by each
+module imported, up to the first prompt being sent to the console. Enabled by
+launching an engine with the --startup-trace option.
+
+The import times are measured by replacing the builtin __import__ function
+while the trace is running. Each module is listed with the total time taken to
+import it (including any modules it imported) and its own time (excluding
+them).
+
+This module only uses builtin modules so it can be imported before anything
+else is loaded.
+"""
+#---Imports---------------------------------------------------------------------
+import sys
+import os
+import time
+import thread
+import __builtin__
+
+#---Globals---------------------------------------------------------------------
+_trace = None     #the running StartupTrace
+
+#-------------------------------------------------------------------------------
+class StartupTrace():
+    def __init__(self, t0=None, filename=None):
+        """
+        Trace the engine startup.
+            t0          -   start time (time.time()) of the trace, None uses the
+                            process start time if available.
+            filename    -   file to write the report to, None for stderr.
+        """
+        self.t_launch = process_start_time()
+        if t0 is None:
+            t0 = self.t_launch or time.time()
+        self.t0 = t0
+        self.filename = filename
+
+        self.phases = []    #list of (phase, time)
+        self.imports = []   #list of [name, depth, total, own]
+        self._stack = []    #imports in progress [name, depth, total, own]
+        self._import = None #original __import__
+        self._thread = None #thread imports are timed in
+
+    def start(self):
+        """
+        Start timing imports
+        """
+        self._import = __builtin__.__import__
+        self._thread = thread.get_ident()
+        __builtin__.__import__ = self._timed_import
+
+    def stop(self):
+        """
+        Stop timing imports
+        """
+        if self._import is not None:
+            __builtin__.__import__ = self._import
+            self._import = None
+
+    def mark(self, phase):
+        """
+        Record the end of a startup phase
+        """
+        self.phases.append( (phase, time.time()) )
+
+    def report(self):
+        """
+        Return the startup trace report as a string
+        """
+        lines = ['Engine startup trace (pid %d):'%os.getpid(), '']
+
+        #phases
+        lines.append('%-40s %10s %10s'%('Phase', 'time (ms)', 'at (ms)'))
+        last = self.t0
+        if self.t_launch is not None and self.t_launch < self.t0:
+            lines.append('%-40s %10.1f %10.1f'%('Interpreter startup',
+                                        (self.t0-self.t_launch)*1000, 0.0))
+        for phase, t in self.phases:
+            lines.append('%-40s %10.1f %10.1f'%(phase, (t-last)*1000,
+                                                        (t-self.t0)*1000))
+            last = t
+        lines.append('')
+
+        #imports (slowest first by own time)
+        lines.append('%-40s %10s %10s'%('Import', 'own (ms)', 'total (ms)'))
+        imports = sorted(self.imports, key=lambda item: item[3], reverse=True)
+        total = 0.0
+        for name, depth, t_total, t_own in imports:
+            lines.append('%-40s %10.1f %10.1f'%(name, t_own*1000, t_total*1000))
+            total = total + t_own
+        lines.append('%d modules imported in %.1f ms'%(len(imports), total*1000))
+        return '\n'.join(lines)+'\n'
+
+    def write_report(self):
+        """
+        Write the report to the file or stderr
+        """
+        report = self.report()
+        if self.filename is None:
+            sys.__stderr__.write(report)
+            return
+        f = open(self.filename, 'a')
+        try:
+            f.write(report)
+        finally:
+            f.close()
+
+    #---internal methods--------------------------------------------------------
+    def _timed_import(self, name, *args, **kwargs):
+        #only time imports in the main thread that may load a new module
+        if (name in sys.modules) or (thread.get_ident() != self._thread):
+            return self._import(name, *args, **kwargs)
+
+        item = [name, len(self._stack), 0.0, 0.0]
+        self._stack.append(item)
+        nmodules = len(sys.modules)
+        t = time.time()
+        try:
+            return self._import(name, *args, **kwargs)
+        finally:
+            item[2] = time.time()-t
+            item[3] = item[3] + item[2]
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][3] = self._stack[-1][3] - item[2]
+            #skip failed imports and relative imports of loaded modules
+            if len(sys.modules) > nmodules:
+                self.imports.append(item)
+
+#-------------------------------------------------------------------------------
+def process_start_time():
+    """
+    Returns the time (as time.time()) the process started or None if not known
+    (linux only).
+    """
+    try:
+        f = open('/proc/self/stat')
+        try:
+            stat = f.read()
+        finally:
+            f.close()
+        f = open('/proc/uptime')
+        try:
+            uptime = float(f.read().split()[0])
+        finally:
+            f.close()
+        #fields after the command name (which may contain spaces)
+        fields = stat[stat.rindex(')')+2:].split()
+        ticks = float(fields[19])
+        boot = time.time()-uptime
+        return boot + ticks/os.sysconf('SC_CLK_TCK')
+    except:
+        return None
+
+#-------------------------------------------------------------------------------
+def start(t0=None, filename=None):
+    """
+    Start tracing the engine startup.
+    """
+    global _trace
+    _trace = StartupTrace(t0, filename)
+    _trace.start()
+    return _trace
+
+def mark(phase):
+    """
+    Record the end of a startup phase if tracing.
+    """
+    if _trace is not None:
+        _trace.mark(phase)
+
+def finish():
+    """
+    Stop tracing and write the report if tracing.
+    """
+    global _trace
+    if _trace is None:
+        return
+    trace = _trace
+    _trace = None
+    trace.stop()
+    trace.write_report()
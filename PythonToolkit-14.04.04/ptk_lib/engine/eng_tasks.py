@@ -17,8 +17,20 @@ def AddPath(userdict,path):
     import sys
     sys.paths.append(path)
 
+Tasks that only read the engine state can be marked with the cacheable 
+decorator, consoles then reuse their results until the engine state changes.
 """
+#---task decorators-------------------------------------------------------------
+def cacheable(task):
+    """
+    Decorator marking a task as read only so its results can be cached by the
+    console until the engine state changes (see Console.run_task).
+    """
+    task.cacheable = True
+    return task
+
 #---common tasks----------------------------------------------------------------
+@cacheable
 def object_exists(globals, locals, name):
     """
     Engine task to check if an object exists in th users namespace
@@ -30,6 +42,7 @@ def object_exists(globals, locals, name):
         res = False
     return res
 
+@cacheable
 def get_type_string(globals, locals, name):
     """
     Engine task to return the type string of an object
@@ -78,3 +91,65 @@ def set_cwd(globals, locals,path):
         ok = False
     return ok
 
+
+def set_output_options(globals, locals, interval=None, maxsize=None, 
+                        policy=None, window=None, keep=None):
+    """
+    Engine task to set the output buffer flush interval (in seconds), maximum
+    size (in characters) and flow control options (see 
+    Engine.set_output_options)
+    """
+    import __main__
+    __main__._engine.find_engine(globals).set_output_options(interval, maxsize, policy, window, keep)
+    return True
+
+def get_output_stats(globals, locals):
+    """
+    Engine task to get the output buffer counters
+    """
+    import __main__
+    return __main__._engine.find_engine(globals).get_output_stats()
+
+def get_scheduler_stats(globals, locals):
+    """
+    Engine task to get the request scheduler wait/run time counters for each
+    queue
+    """
+    import __main__
+    return __main__._engine.find_engine(globals).get_scheduler_stats()
+
+def get_code_cache_stats(globals, locals):
+    """
+    Engine task to get the compiled code cache hit/miss counters
+    """
+    import __main__
+    return __main__._engine.find_engine(globals).get_code_cache_stats()
+
+def get_timeout_stats(globals, locals):
+    """
+    Engine task to get the number of timeouts for each request that has timed
+    out
+    """
+    import __main__
+    return __main__._engine.find_engine(globals).get_timeout_stats()
+
+def start_job(globals, locals, source):
+    """
+    Engine task to run the source in a background job, returns the job id
+    """
+    import __main__
+    return __main__._engine.find_engine(globals).jobs.start(source)
+
+def get_jobs(globals, locals):
+    """
+    Engine task to get the job table - a list of job info dictionaries
+    """
+    import __main__
+    return __main__._engine.find_engine(globals).jobs.get_table()
+
+def stop_job(globals, locals, jobid):
+    """
+    Engine task to stop a running background job
+    """
+    import __main__
+    return __main__._engine.find_engine(globals).jobs.stop(jobid)
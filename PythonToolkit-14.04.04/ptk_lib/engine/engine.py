@@ -45,18 +45,114 @@ import os
 import __main__
 import __builtin__                      #for adding builtin commands
 import marshal                          #for task/builtins
+import cPickle                          #for shared memory results
 import types                            #for task/builtins
 from threading import Event             #for readline events
+from threading import Lock, RLock, Thread   #for the output buffer
 import thread                           #to interupt, running code.
+import time                             #for the output buffer flush interval
+import platform                         #host name for the resource monitor
 
 from ptk_lib.message_bus import mb_protocol
 from ptk_lib.message_bus.mb_client import MBClient
 
 from eng_compiler import EngineCompiler
-from eng_debugger import EngineDebugger
-from eng_profiler import EngineProfiler
 import eng_messages                     #standard engine message types
 import eng_tasks                        #engine task utils  
+import eng_buffers                      #array transfer
+import eng_shm                          #shared memory transport
+import eng_startup                      #startup trace
+import eng_scheduler                    #request worker threads
+import eng_handles                      #object handles
+import eng_namespace                    #namespace change sets
+import eng_jobs                         #background jobs
+import eng_pmap                         #parallel map helper engines
+from eng_misc import EngineTimeoutError #request timeouts
+
+#The debugger and profiler (and the ctypes/inspect modules they use) are only
+#imported when first used. Until then these debugger messages are handled by
+#loading the debugger and calling its handler. {subject: handler name}
+DEBUGGER_HANDLERS = {
+    eng_messages.ENG_DEBUG_PAUSE    : 'msg_debug_pause',
+    eng_messages.ENG_DEBUG_RESUME   : 'msg_debug_resume',
+    eng_messages.ENG_DEBUG_END      : 'msg_debug_end',
+    eng_messages.ENG_DEBUG_STEP     : 'msg_debug_step',
+    eng_messages.ENG_DEBUG_STEPIN   : 'msg_debug_stepinto',
+    eng_messages.ENG_DEBUG_STEPOUT  : 'msg_debug_stepout',
+    eng_messages.ENG_DEBUG_SETSCOPE : 'msg_debug_setscope',
+    eng_messages.ENG_DEBUG_SETBP    : 'msg_dbg_setbp',
+    eng_messages.ENG_DEBUG_CLEARBP  : 'msg_dbg_clearbp',
+    eng_messages.ENG_DEBUG_EDITBP   : 'msg_dbg_editbp',
+}
+
+#non-blocking request subjects run on the scheduler's worker threads, other
+#requests are handled in order on the message thread (see msg_request).
+#Executions (ENG_EXECCOMMAND) change the user namespace so are not scheduled,
+#they stay ordered with the blocking requests and cannot run alongside a bulk
+#task reading the same objects.
+SCHEDULED_REQUESTS = set([
+    eng_messages.ENG_EVALCOMMAND,
+    eng_messages.ENG_RUNTASK,
+    eng_messages.ENG_RUNTASK_BATCH,
+    eng_messages.ENG_GETTASKS,
+    eng_messages.ENG_RUNTASK_STREAM,
+    eng_messages.ENG_RESOLVE,
+    eng_messages.ENG_PMAP_CHUNK,
+])
+
+#streamed task results are sent when this many seconds have passed since the 
+#last chunk even if the chunk is not full (see msg_run_task_stream)
+STREAM_INTERVAL = 0.1
+
+#-------------------------------------------------------------------------------
+# Output flow control
+#-------------------------------------------------------------------------------
+#policies (see Engine.set_output_options)
+OUTPUT_BLOCK = 'block'      #user code waits for the console to catch up
+OUTPUT_DROP  = 'drop'       #output is skipped until the console catches up
+
+def format_size(n):
+    """
+    Format a number of bytes/characters for display e.g. 3.2 MB
+    """
+    if n < 1024:
+        return '%d bytes'%n
+    if n < 1048576:
+        return '%.1f KB'%(n/1024.0)
+    return '%.1f MB'%(n/1048576.0)
+
+#-------------------------------------------------------------------------------
+# Request deadlines
+#-------------------------------------------------------------------------------
+def describe_request(subject, data):
+    """
+    Returns a short description of a request used to report timeouts; the task
+    name or the source evaluated/executed.
+    """
+    try:
+        if subject in (eng_messages.ENG_RUNTASK, eng_messages.ENG_EVALCOMMAND,
+                        eng_messages.ENG_EXECCOMMAND, 
+                        eng_messages.ENG_RUNTASK_STREAM):
+            return str(data[0])
+        if subject == eng_messages.ENG_RUNTASK_BATCH:
+            names = [item if isinstance(item, basestring) else item[0]
+                        for item in data[0]]
+            return 'batch: '+', '.join(names)
+    except:
+        pass
+    return str(subject)
+
+def _async_raise(tid, exctype):
+    """
+    Raise the exception type in the thread with the id given when it next runs
+    python code, exctype=None clears a pending exception.
+    """
+    import ctypes
+    if exctype is None:
+        ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_long(tid), None)
+    else:
+        ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_long(tid), 
+                                                ctypes.py_object(exctype))
 
 #-------------------------------------------------------------------------------
 # pseudo file object used to redirect stdio
@@ -84,11 +180,33 @@ class PseudoFile:
     def isatty(self):
         return 1
 
+#-------------------------------------------------------------------------------
+# message like object used to handle ENG_REQUEST messages
+#-------------------------------------------------------------------------------
+class RequestMsg:
+    def __init__(self, sender, subject, data, reqid=None):
+        """
+        Message like object used to pass the data of an ENG_REQUEST message to
+        the standard message handlers.
+        """
+        self.sender = sender
+        self.subject = subject
+        self.data = data
+        self.reqid = reqid
+
+    def get_from(self):
+        return self.sender
+
+    def get_data(self):
+        return self.data
+
 #-------------------------------------------------------------------------------
 # The main engine class
 #-------------------------------------------------------------------------------
 class Engine(MBClient):
     engtype = 'Embedded.base'
+    use_scheduler = True    #run non-blocking requests on worker threads
+    hosted = False          #hosted by the process engine (see ns_engine)
 
     def __init__(self, englabel='New engine', userdict={}, timeout=10):
         """
@@ -101,12 +219,13 @@ class Engine(MBClient):
         timeout     -   Timeout in seconds when connecting and waiting for 
                         message replies
         """
-        #check if an engine already exists in this process
-        if __main__.__dict__.has_key('_engine'):
+        #check if an engine already exists in this process - further engines
+        #must be namespace engines hosted by it (see new_namespace)
+        if (self.hosted is False) and __main__.__dict__.has_key('_engine'):
             raise Exception('An engine already exists (as __main__.engine) in this process! reuse!')
 
         #get node name for this engine.
-        node_name = 'Engine.'+str(os.getpid())
+        node_name = self.get_node_name()
 
         #client init
         MBClient.__init__(self, node_name, timeout)
@@ -142,6 +261,9 @@ class Engine(MBClient):
         #store registered engine tasks {name:func}
         self._tasks = {}
 
+        #message bus address when connected as a client (used by clone)
+        self._address = None
+
         #-----------------------------------------------------------------------
         # Sub components
         #-----------------------------------------------------------------------
@@ -150,10 +272,14 @@ class Engine(MBClient):
         self.compiler = EngineCompiler(self)
 
         #Debugger handles the exectution of code with the debugger enabled
-        self.debugger = EngineDebugger(self)
+        #(loaded on first use, see the debugger property)
+        self._debugger = None
+        for subject, name in DEBUGGER_HANDLERS.items():
+            self.set_handler(subject, self._lazy_debugger_handler(name))
 
         #Profiler handles the execution of code with the profiler enabled
-        self.profiler = EngineProfiler(self)
+        #(loaded on first use, see the profiler property)
+        self._profiler = None
 
         #-----------------------------------------------------------------------
         # Set up the working environment
@@ -163,7 +289,8 @@ class Engine(MBClient):
         
         #store the engine process object in the main namespace for use by 
         #extensions
-        __main__._engine = self
+        if self.hosted is False:
+            __main__._engine = self
 
         #register standard engine tasks
         self.register_task(eng_tasks.object_exists)
@@ -171,6 +298,14 @@ class Engine(MBClient):
         self.register_task(eng_tasks.execute_startup_script)
         self.register_task(eng_tasks.get_cwd)
         self.register_task(eng_tasks.set_cwd)
+        self.register_task(eng_tasks.set_output_options)
+        self.register_task(eng_tasks.get_output_stats)
+        self.register_task(eng_tasks.get_timeout_stats)
+        self.register_task(eng_tasks.get_scheduler_stats)
+        self.register_task(eng_tasks.get_code_cache_stats)
+        self.register_task(eng_tasks.start_job)
+        self.register_task(eng_tasks.get_jobs)
+        self.register_task(eng_tasks.stop_job)
 
         #-----------------------------------------------------------------------
         # attributes for redirecting standard input/output
@@ -190,6 +325,99 @@ class Engine(MBClient):
         self._old_stdout = sys.__stdout__
         self._old_stderr = sys.__stderr__
 
+        #-----------------------------------------------------------------------
+        # attributes for buffering output sent to the console
+        #-----------------------------------------------------------------------
+        #writes to stdout/stderr are collected in the output buffer and sent as
+        #a single CON_WRITE message per run of writes to the same stream. The
+        #buffer is flushed when it grows larger than out_maxsize, after 
+        #out_interval seconds and before any control message is sent to the 
+        #console (see send_msg) so the output order is unchanged.
+        #
+        #The output is sent by the flush thread, user code only waits (for
+        #the flush thread to take the buffer) if more than out_highwater
+        #characters are waiting, so it never blocks in a socket send and a 
+        #stop request is seen straight away. Output from code being stopped is
+        #discarded. Query replies do not wait for the output (see 
+        #eng_messages.get_priority).
+        self.out_interval = 0.05    #max time (s) output is held in the buffer
+        self.out_maxsize = 65536    #flush when this many characters are waiting
+        self.out_highwater = 262144 #user code waits above this many characters
+
+        self._outbuffer = []        #list of [subject, [strings]] runs
+        self._outsize = 0           #number of characters in the buffer
+        self._outlock = Lock()      #lock for the buffer (not an RLock as user
+                                    #code may be interrupted while holding it)
+        self._sendlock = RLock()    #lock for sending the output
+        self._ringlock = RLock()    #lock for writing to the shared memory ring
+        #flow control - the console acknowledges the output it has written
+        #(ENG_OUTPUT_ACK). When more than out_window characters sent are not 
+        #acknowledged the flush thread waits for the console. With the 
+        #OUTPUT_BLOCK policy user code then waits once out_highwater 
+        #characters are buffered, with OUTPUT_DROP only the last out_keep 
+        #characters are kept and a note of the amount skipped is sent instead.
+        self.out_policy = OUTPUT_BLOCK
+        self.out_window = 1048576   #max characters sent but not yet written
+        self.out_keep = 65536       #characters kept when dropping output
+        self._out_unacked = 0       #characters sent but not yet acknowledged
+        self._out_skipped = 0       #characters dropped since the last flush
+        self._out_dropped = 0       #total characters dropped
+        self._outcredit = Event()   #set when the console acknowledges output
+
+        #lock released to wake the flush thread (a plain lock rather than an 
+        #Event so user code is never interrupted inside the threading module)
+        self._outwake = thread.allocate_lock()
+        self._outwake.acquire()
+
+        #counters
+        self._out_writes = 0        #number of writes to stdout/stderr
+        self._out_msgs = 0          #number of CON_WRITE messages sent
+        self._out_shm = 0           #number of writes sent via shared memory
+
+        #shared memory ring buffer used instead of messages for output and 
+        #large results if the engine is on the same machine as the console 
+        #(see open_shared_ring). The ring is only used once the managing 
+        #console has mapped it (ENG_SHM_ENABLE) and only for that console.
+        self._shm = None            #opened ring
+        self._ring = None           #ring in use
+        self.shm_threshold = 65536  #min encoded result size to send via ring
+
+        #request deadlines - a request sent with a timeout is interrupted by the
+        #watchdog thread raising an EngineTimeoutError in the thread handling it
+        #(see _handle_request)
+        self._deadlines = {}        #{token: (deadline, thread id)}
+        self._fired = set()         #tokens of interrupted requests
+        self._deadlock = Lock()
+        self._deadcount = 0
+        self._watchevent = Event()  #set when a deadline is added
+        self._watchdog = None       #watchdog thread, started when first needed
+        self._timeouts = {}         #{request description: number of timeouts}
+
+        #worker threads for non-blocking requests (see msg_request)
+        self.scheduler = eng_scheduler.RequestScheduler()
+
+        #objects resolved to handles by the console, invalidated whenever user 
+        #code has run (see eng_handles)
+        self.handles = eng_handles.HandleRegistry()
+
+        #background jobs run in the user namespace on their own threads (see 
+        #eng_jobs)
+        self.jobs = eng_jobs.JobManager(self)
+
+        #helper engines for parallel maps (see eng_pmap)
+        self.helpers = eng_pmap.HelperPool(self)
+
+        #streamed tasks - (sender, reqid) of the streams running and of those 
+        #cancelled by the requesting node (see msg_run_task_stream)
+        self._streams = set()
+        self._streams_cancelled = set()
+
+        #thread used to flush the output buffer after out_interval
+        self._outthread = Thread(target=self._output_loop, 
+                                    name='Engine output')
+        self._outthread.setDaemon(True)
+        self._outthread.start()
+
         #-----------------------------------------------------------------------
         #Set up the interface/engine communications
         #   - compiler/debugger/profiler also register message handlers
@@ -209,6 +437,66 @@ class Engine(MBClient):
         self.set_handler(eng_messages.ENG_REGISTERTASK, self.msg_register_task)
         self.set_handler(eng_messages.ENG_ADDBUILTIN, self.msg_add_builtin)
         self.set_handler(eng_messages.ENG_GETTASKS, self.msg_get_tasks)
+        self.set_handler(eng_messages.ENG_RUNTASK_BATCH, self.msg_run_batch)
+        self.set_handler(eng_messages.ENG_SHM_ENABLE, self.msg_shm_enable)
+        self.set_handler(eng_messages.ENG_REQUEST, self.msg_request)
+        self.set_handler(eng_messages.ENG_DEADLINE, self.msg_deadline)
+        self.set_handler(eng_messages.ENG_CLONE, self.msg_clone)
+        self.set_handler(eng_messages.ENG_NEW_NAMESPACE, self.msg_new_namespace)
+        self.set_handler(eng_messages.ENG_OUTPUT_ACK, self.msg_output_ack)
+        self.set_handler(eng_messages.ENG_STREAM_CANCEL, self.msg_stream_cancel)
+        self.set_handler(eng_messages.ENG_RESOLVE, self.msg_resolve)
+        self.set_handler(eng_messages.ENG_HELPER_READY, 
+                            self.helpers.msg_helper_ready)
+        self.set_handler(eng_messages.CON_REPLY, self.helpers.msg_reply)
+
+        #handlers for messages that can also be sent as non-blocking requests 
+        #via ENG_REQUEST {subject: handler}
+        self._req_handlers = {}
+        self.set_request_handler(eng_messages.ENG_EXECCOMMAND, self.msg_exec)
+        self.set_request_handler(eng_messages.ENG_EVALCOMMAND, self.msg_eval)
+        self.set_request_handler(eng_messages.ENG_RUNTASK, self.msg_run_task)
+        self.set_request_handler(eng_messages.ENG_REGISTERTASK, 
+                                    self.msg_register_task)
+        self.set_request_handler(eng_messages.ENG_ADDBUILTIN, 
+                                    self.msg_add_builtin)
+        self.set_request_handler(eng_messages.ENG_GETTASKS, self.msg_get_tasks)
+        self.set_request_handler(eng_messages.ENG_RUNTASK_BATCH, 
+                                                        self.msg_run_batch)
+        self.set_request_handler(eng_messages.ENG_RUNTASK_STREAM, 
+                                                    self.msg_run_task_stream)
+        self.set_request_handler(eng_messages.ENG_RESOLVE, self.msg_resolve)
+        self.set_request_handler(eng_messages.ENG_DEBUG_TOGGLE, 
+                                    self.msg_toggle_debug)
+        self.set_request_handler(eng_messages.ENG_PMAP_CHUNK, 
+                                    self.msg_pmap_chunk)
+
+    #---------------------------------------------------------------------------
+    # Sub components loaded on first use
+    #---------------------------------------------------------------------------
+    def _get_debugger(self):
+        if self._debugger is None:
+            from eng_debugger import EngineDebugger
+            #replaces the lazy message handlers with its own
+            self._debugger = EngineDebugger(self)
+        return self._debugger
+    debugger = property(_get_debugger)
+
+    def _get_profiler(self):
+        if self._profiler is None:
+            from eng_profiler import EngineProfiler
+            self._profiler = EngineProfiler(self)
+        return self._profiler
+    profiler = property(_get_profiler)
+
+    def _lazy_debugger_handler(self, name):
+        """
+        Returns a message handler that loads the debugger and calls the debugger
+        message handler method name.
+        """
+        def handler(msg):
+            return getattr(self.debugger, name)(msg)
+        return handler
 
     #---------------------------------------------------------------------------
     # Connection/Disconnection
@@ -229,6 +517,7 @@ class Engine(MBClient):
 
         #set the console node for communications
         self.console = console
+        self._out_unacked = 0
 
         #subscribe to console node sys messages
         self.subscribe( mb_protocol.SYS_NODE_DISCONNECT+'.'+self.console, 
@@ -241,13 +530,20 @@ class Engine(MBClient):
         self.write_stdout( self.get_welcome())
         self.send_msg(self.console, eng_messages.CON_PROMPT,
                             (self.prompts[0],False))
+        eng_startup.mark('First prompt sent')
+        eng_startup.finish()
 
         #and return a result dictionary
         #{type, name/label, icon, pid} etc
         info =  {'engtype': self.engtype, 
                  'englabel': self.englabel,
                  'engicon': self.engicon,
-                 'pid': os.getpid()}
+                 'pid': os.getpid(),
+                 'host': platform.node(),
+                 'jobs': self.jobs.get_running(),
+                 'shm': None}
+        if self._shm is not None:
+            info['shm'] = self._shm.path
         return info
 
     def release(self):
@@ -258,12 +554,20 @@ class Engine(MBClient):
         if self.console is None:
             return True
 
+        #send any output still waiting in the buffer
+        self.flush_output()
+
+        #stop using the shared memory ring - a new console will not have it
+        self.close_shared_ring()
+
         #unsubscribe from the releasing console node sys messages
         self.unsubscribe( mb_protocol.SYS_NODE_DISCONNECT+'.'+self.console, 
                         self.msg_node_disconnect)
 
-        #set console to None
+        #set console to None (and wake the flush thread if it is waiting for
+        #the console to write output)
         self.console = None
+        self._outcredit.set()
 
         #restore stdio
         self.restore_stdio()
@@ -277,6 +581,13 @@ class Engine(MBClient):
         #call the node/client disconnect method to close the node properly.
         self.disconnect()
 
+    def connect(self, host, port, *args, **kwargs):
+        """
+        Overloaded connect method of client to store the message bus address.
+        """
+        self._address = (host, port)
+        return MBClient.connect(self, host, port, *args, **kwargs)
+
     def on_disconnect(self):
         """
         Overloaded on_disconnect method of client to preform engine tasks
@@ -302,6 +613,25 @@ class Engine(MBClient):
         #may want to disconnect and leave it running and connect again later. 
         #self.stop_code(quiet=True)
 
+    def send_msg(self, to, subject, *args, **kwargs):
+        """
+        Overloaded send_msg method of client to flush any buffered output first,
+        so control messages to the console (prompts etc) arrive after the 
+        output written before them. Query replies are sent straight away.
+        """
+        if eng_messages.get_priority(subject) != eng_messages.PRIORITY_QUERY:
+            self.flush_output()
+        return MBClient.send_msg(self, to, subject, *args, **kwargs)
+
+    def publish_msg(self, *args, **kwargs):
+        """
+        Overloaded publish_msg method of client to flush any buffered output 
+        first, so engine state messages arrive after the output written before
+        them.
+        """
+        self.flush_output()
+        return MBClient.publish_msg(self, *args, **kwargs)
+
     #---------------------------------------------------------------------------
     # Interface methods
     #---------------------------------------------------------------------------
@@ -349,8 +679,12 @@ class Engine(MBClient):
             log.warning('No managing console!')
             raise Exception('No managing console!')
 
+        #namespace before the command to publish the names changed
+        ns_before = eng_namespace.fingerprint(self._userdict)
+
         #set busy flag and send busy messages
         self.busy = True
+        self._stop = False
         
         #published message
         self.publish_msg(   eng_messages.ENGINE_STATE_BUSY+'.'+self.name, 
@@ -439,11 +773,15 @@ class Engine(MBClient):
         if softspace(sys.stdout, 0):
             print 
 
+        #user code may have rebound any name
+        self.handles.invalidate()
+
         #If exiting skip the rest.
         if self._stop_quiet is True:
             return
 
-        #send an engine done message
+        #send the names changed then an engine done message
+        self._publish_ns_changes(ns_before, code)
         self.publish_msg(   eng_messages.ENGINE_STATE_DONE+'.'+self.name, 
                             data=(self.debug, self.profile) )
      
@@ -455,6 +793,23 @@ class Engine(MBClient):
             log.exception('error ')
             pass
 
+    def _publish_ns_changes(self, before, code):
+        """
+        Compare the user namespace to the fingerprint taken before running the 
+        code and publish the names changed (ENGINE_NAMESPACE_CHANGED).
+        """
+        try:
+            after = eng_namespace.fingerprint(self._userdict)
+            changes = eng_namespace.diff(before, after, 
+                                            eng_namespace.code_names(code))
+        except:
+            log.exception('Could not compare the namespace')
+            return
+        if eng_namespace.is_empty(changes):
+            return
+        self.publish_msg( eng_messages.ENGINE_NAMESPACE_CHANGED+'.'+self.name,
+                            data=changes)
+
     def stop_code(self, quiet=False):
         """
         Attempt to stop the running code by raising a keyboard interrupt in
@@ -472,6 +827,12 @@ class Engine(MBClient):
         else:
             self._stop = True
 
+        #discard output waiting to be sent (this also stops the code waiting 
+        #for the output to be sent)
+        with self._outlock:
+            self._outbuffer = []
+            self._outsize = 0
+
         #make sure we are not stuck in readline(s) 
         if self._isreading:
             self._readevent.set()
@@ -504,11 +865,12 @@ class Engine(MBClient):
             raise Exception('No managing console!')
 
         globals = self._userdict
-        locals = self._userdict
+        locals = self.handles.wrap_locals(expression, self._userdict)
 
         #try to evaluate the expression
         try:
-            result = eval(expression, globals, locals)
+            code = self.compiler.cache.compile(expression, 'eval')
+            result = eval(code, globals, locals)
         except:
             result = None
         return result
@@ -531,9 +893,12 @@ class Engine(MBClient):
 
         #execute the expression
         try:
-            exec(expression, globals, locals)
+            code = self.compiler.cache.compile(expression, 'exec')
+            exec(code, globals, locals)
         except:
             pass
+        #names may have been rebound
+        self.handles.invalidate()
 
     def run_task(self,taskname, args=(), kwargs={}):
         """
@@ -548,6 +913,7 @@ class Engine(MBClient):
 
         #get the task
         task = self.get_task(taskname)
+        args, kwargs = self.handles.expand_args(args, kwargs)
 
         globals = self._userdict
         locals = self._userdict
@@ -561,12 +927,13 @@ class Engine(MBClient):
 
         return result
 
-    def register_task(self,task):
+    def register_task(self,task, replace=False):
         """
-        Register a task with the process.
+        Register a task with the process. If replace is True an existing task
+        with the same name is replaced.
         """
         log.debug('Registering task '+task.func_name)
-        if self._tasks.has_key(task.func_name):
+        if self._tasks.has_key(task.func_name) and (replace is False):
             result = False
         else:
             self._tasks[task.func_name]=task
@@ -584,6 +951,34 @@ class Engine(MBClient):
         task = self._tasks[taskname]
         return task
 
+    def set_request_handler(self, subject, handler):
+        """
+        Set the handler to use for the message subject when it is sent as a 
+        non-blocking ENG_REQUEST. The handler is called with a message like 
+        object and the value returned is sent back to the requesting node.
+        """
+        self._req_handlers[subject] = handler
+
+    def get_scheduler_stats(self):
+        """
+        Returns the request scheduler's per queue counters (see 
+        RequestScheduler.get_stats).
+        """
+        return self.scheduler.get_stats()
+
+    def get_code_cache_stats(self):
+        """
+        Returns the compiled code cache counters (see CodeCache.get_stats).
+        """
+        return self.compiler.cache.get_stats()
+
+    def get_timeout_stats(self):
+        """
+        Returns a dictionary of {request description: number of timeouts} for
+        the requests that have been interrupted after their timeout.
+        """
+        return dict(self._timeouts)
+
     def enable_debug(self,flag=True):
         """ Enable the debugger - returns debug state """
 
@@ -596,6 +991,10 @@ class Engine(MBClient):
             #cannot enable/disable debugging when running a command.
             return self.debug
 
+        #load the debugger before running any code with it
+        if flag is True:
+            self.debugger
+
         #engine is inactive set to flag
         self.debug = flag
 
@@ -611,6 +1010,10 @@ class Engine(MBClient):
         if self.busy is True:
             return self.profile
 
+        #load the profiler before running any code with it
+        if flag is True:
+            self.profiler
+
         #enable profiler/disable debugger
         self.profile = flag    
 
@@ -626,9 +1029,113 @@ class Engine(MBClient):
         may have changed. For example after running an engine task or exec 
         command that modifies engine objects.
         """
+        self.handles.invalidate()
         data = (self.busy, self.debug, self.profile)
         self.publish_msg( eng_messages.ENGINE_STATECHANGE+'.'+self.name, data)
 
+    #---------------------------------------------------------------------------
+    # request deadlines
+    #---------------------------------------------------------------------------
+    def _handle_request(self, sender, subject, data, timeout=None, reqid=None):
+        """
+        Handle the data using the request handler for the subject and return
+        the result. If a timeout (in seconds) is given the handler is 
+        interrupted once it expires and an EngineTimeoutError is returned.
+
+        The interrupt is an exception raised asynchronously in the handling
+        thread so it is only seen while python code is running, a handler 
+        blocked in a C call is only abandoned once the call returns.
+        """
+        handler = self._req_handlers.get(subject, None)
+        if handler is None:
+            return Exception('No request handler for: '+str(subject))
+
+        token = None
+        if timeout is not None:
+            token = self._arm_deadline(timeout)
+        fired = False
+        try:
+            try:
+                result = handler( RequestMsg(sender, subject, data, reqid) )
+            finally:
+                if token is not None:
+                    fired = self._disarm_deadline(token)
+        except EngineTimeoutError:
+            #interrupted before the deadline was disarmed
+            self._disarm_deadline(token)
+            fired = True
+        except Exception as e:
+            log.exception('request failed :'+str(subject))
+            result = e
+
+        #handlers may catch the exception and return a result
+        if fired is True:
+            result = self._request_timed_out(subject, data, timeout)
+        return result
+
+    def _arm_deadline(self, timeout):
+        """
+        Start a deadline for the current thread, returns a token to pass to 
+        _disarm_deadline.
+        """
+        with self._deadlock:
+            self._deadcount += 1
+            token = self._deadcount
+            self._deadlines[token] = (time.time()+timeout, thread.get_ident())
+            if self._watchdog is None:
+                self._watchdog = Thread(target=self._watchdog_loop,
+                                        name='Engine watchdog')
+                self._watchdog.setDaemon(True)
+                self._watchdog.start()
+        self._watchevent.set()
+        return token
+
+    def _disarm_deadline(self, token):
+        """
+        End a deadline, returns True if the thread was interrupted.
+        """
+        with self._deadlock:
+            self._deadlines.pop(token, None)
+            if token not in self._fired:
+                return False
+            self._fired.discard(token)
+            #clear the exception if it has not been raised yet
+            _async_raise(thread.get_ident(), None)
+        return True
+
+    def _watchdog_loop(self):
+        """
+        Watchdog thread - interrupts requests that have passed their deadline
+        """
+        while True:
+            self._watchevent.wait()
+            time.sleep(0.02)
+            with self._deadlock:
+                now = time.time()
+                for token, (deadline, tid) in self._deadlines.items():
+                    if now >= deadline:
+                        del self._deadlines[token]
+                        self._fired.add(token)
+                        _async_raise(tid, EngineTimeoutError)
+                if not self._deadlines:
+                    self._watchevent.clear()
+
+    def _request_timed_out(self, subject, data, timeout):
+        """
+        Record and report a request that was interrupted after its timeout,
+        returns the EngineTimeoutError to use as the result.
+        """
+        descrip = describe_request(subject, data)
+        self._timeouts[descrip] = self._timeouts.get(descrip, 0) + 1
+        log.warning('Request timed out after %.2fs: %s'%(timeout, descrip))
+        try:
+            self.publish_msg( eng_messages.ENGINE_REQUEST_TIMEOUT+'.'+self.name,
+                                (subject, descrip, timeout) )
+        except:
+            log.exception('Could not publish request timeout')
+        return EngineTimeoutError('Request timed out after %.2fs: %s'
+                                    %(timeout, descrip))
+
     #---------------------------------------------------------------------------
     # standard IO methods
     #---------------------------------------------------------------------------
@@ -707,27 +1214,267 @@ class Engine(MBClient):
 
     def write_stdout(self,string):
         """std out write redirects here"""
+        #output from background jobs is kept with the job
+        if eng_jobs.capture(string) is True:
+            return
         #check for a console
         if self.console is None:
             log.warning('No managing console!')
             raise Exception('No managing console!')
         #sys.__stdout__.write(string)
-        try:
-            self.send_msg(self.console, eng_messages.CON_WRITE_STDOUT,(string,))        
-        except:
-            pass        
+        self._buffer_output(eng_messages.CON_WRITE_STDOUT, string)
 
     def write_stderr(self,string):
         """std err write redirects here"""
+        #output from background jobs is kept with the job
+        if eng_jobs.capture(string, stderr=True) is True:
+            return
         #check for a console
         if self.console is None:
             log.warning('No managing console!')
             raise Exception('No managing console!')
         #sys.__stderr__.write(string)
+        self._buffer_output(eng_messages.CON_WRITE_STDERR, string)
+
+    def flush_output(self):
+        """
+        Send any output waiting in the output buffer to the console.
+        """
+        with self._sendlock:
+            with self._outlock:
+                if self._outsize == 0:
+                    return
+                buffer = self._outbuffer
+                self._outbuffer = []
+                self._outsize = 0
+                console = self.console
+
+                #note where output was dropped
+                if self._out_skipped > 0:
+                    note = ('\n[... %s of output skipped ...]\n'
+                                %format_size(self._out_skipped))
+                    buffer.insert(0, [eng_messages.CON_WRITE_STDERR, [note]])
+                    self._out_skipped = 0
+
+            #console released - nowhere to send the output.
+            if console is None:
+                return
+
+            notify = False  #records waiting in the shared memory ring
+            for subject, strings in buffer:
+                try:
+                    string = ''.join(strings)
+                    strings = [string]
+                except UnicodeError:
+                    #mixed byte/unicode strings - send seperately
+                    pass
+                for string in strings:
+                    with self._outlock:
+                        self._out_unacked += len(string)
+
+                    #try the shared memory ring first
+                    if subject==eng_messages.CON_WRITE_STDOUT:
+                        channel = eng_shm.SHM_STDOUT
+                    else:
+                        channel = eng_shm.SHM_STDERR
+                    with self._ringlock:
+                        written = ((self._ring is not None) and
+                                    self._ring.write_string(channel, string))
+                    if written:
+                        notify = True
+                        self._out_shm += 1
+                        continue
+
+                    #ring full - send the records already waiting first
+                    if notify is True:
+                        self._notify_ring()
+                        notify = False
+                    try:
+                        MBClient.send_msg(self, console, subject, (string,))
+                    except:
+                        pass
+                    self._out_msgs += 1
+
+            if notify is True:
+                self._notify_ring()
+
+    def open_shared_ring(self, path):
+        """
+        Use the shared memory ring buffer file given (created by the console) 
+        for output and large results. Returns True if successful, otherwise
+        the engine continues to use messages only.
+        """
+        try:
+            self._shm = eng_shm.SharedRing(path)
+        except:
+            log.exception('Could not open shared memory ring: '+str(path))
+            self._shm = None
+            return False
+        return True
+
+    def close_shared_ring(self):
+        """
+        Stop using the shared memory ring, messages are used from now on.
+        """
+        with self._sendlock:
+            self.flush_output()
+            with self._ringlock:
+                self._ring = None
+                if self._shm is not None:
+                    self._shm.close()
+                    self._shm = None
+
+    def _notify_ring(self):
+        """
+        Wake the console to read the records waiting in the shared memory ring.
+        """
         try:
-            self.send_msg(self.console, eng_messages.CON_WRITE_STDERR,(string,))
+            MBClient.send_msg(self, self.console, eng_messages.CON_SHM_NOTIFY,
+                                ())
         except:
-            pass        
+            pass
+
+    def set_output_options(self, interval=None, maxsize=None, policy=None,
+                            window=None, keep=None):
+        """
+        Set the output buffer flush interval (in seconds) and the maximum 
+        number of characters held before flushing. An interval of 0 disables
+        the buffering.
+
+        Flow control options:
+            policy  -   what to do when the console falls behind by more than
+                        window characters; OUTPUT_BLOCK to make the writing 
+                        code wait, OUTPUT_DROP to skip output keeping only the
+                        last keep characters.
+        """
+        if interval is not None:
+            self.out_interval = float(interval)
+        if maxsize is not None:
+            self.out_maxsize = int(maxsize)
+        if policy is not None:
+            if policy not in (OUTPUT_BLOCK, OUTPUT_DROP):
+                raise Exception('Unknown output policy: '+str(policy))
+            self.out_policy = policy
+        if window is not None:
+            self.out_window = int(window)
+        if keep is not None:
+            self.out_keep = int(keep)
+        #send anything waiting using the new settings
+        self.flush_output()
+
+    def get_output_stats(self):
+        """
+        Returns a dictionary of output buffer counters:
+            writes      -   number of writes to stdout/stderr
+            messages    -   number of CON_WRITE messages sent to the console
+            shared      -   number of writes sent via the shared memory ring
+            saved       -   number of messages saved by buffering
+            policy      -   flow control policy
+            unwritten   -   characters sent but not yet written by the console
+            skipped     -   characters skipped by the OUTPUT_DROP policy
+        """
+        with self._outlock:
+            writes = self._out_writes
+            msgs = self._out_msgs + len(self._outbuffer)
+            shared = self._out_shm
+            unacked = self._out_unacked
+            dropped = self._out_dropped
+        return {'writes': writes, 'messages': msgs, 'shared': shared,
+                'saved': writes-msgs-shared, 'policy': self.out_policy,
+                'unwritten': unacked, 'skipped': dropped}
+
+    def _buffer_output(self, subject, string):
+        """
+        Add a string to the output buffer for the stream given by the 
+        CON_WRITE_* subject.
+        """
+        with self._outlock:
+            #code is being stopped - discard its output
+            if self._stop is True:
+                return
+            self._out_writes += 1
+            #add to the previous run if it is the same stream
+            if self._outbuffer and (self._outbuffer[-1][0] == subject):
+                self._outbuffer[-1][1].append(string)
+            else:
+                self._outbuffer.append( [subject, [string]] )
+            self._outsize += len(string)
+
+            #console is behind (or output is arriving faster than it can be 
+            #sent) - keep only the last out_keep characters
+            if ((self.out_policy == OUTPUT_DROP) and 
+                    (self._outsize > self.out_keep) and
+                    (self._output_behind() or 
+                    (self._outsize > self.out_highwater))):
+                self._trim_output()
+
+        #buffering is disabled
+        if self.out_interval <= 0:
+            self.flush_output()
+            return
+
+        #wake the flush thread
+        try:
+            self._outwake.release()
+        except thread.error:
+            #already awake
+            pass
+
+        #too much output waiting - wait for the flush thread to take it (but
+        #not for it to be sent)
+        while ((self._outsize >= self.out_highwater) and (self._stop is False)
+                and (self.console is not None) 
+                and (self.out_policy == OUTPUT_BLOCK)):
+            time.sleep(0.005)
+
+    def _output_behind(self):
+        """
+        Returns True if the console is more than out_window characters behind 
+        writing the output sent.
+        """
+        return (self.console is not None) and (self._out_unacked >= self.out_window)
+
+    def _trim_output(self):
+        """
+        Drop the oldest output in the buffer leaving the last out_keep 
+        characters (called with the _outlock held).
+        """
+        while self._outsize > self.out_keep:
+            subject, strings = self._outbuffer[0]
+            size = sum( [len(string) for string in strings] )
+            n = self._outsize - self.out_keep
+            if n >= size:
+                #drop the whole run
+                self._outbuffer.pop(0)
+            else:
+                #drop the start of the run
+                try:
+                    string = ''.join(strings)
+                except UnicodeError:
+                    string = u''.join([unicode(s, 'utf-8', 'replace') 
+                            if isinstance(s, str) else s for s in strings])
+                self._outbuffer[0][1] = [string[n:]]
+                size = n
+            self._outsize -= size
+            self._out_skipped += size
+            self._out_dropped += size
+
+    def _output_loop(self):
+        """
+        Flush thread - waits for output and then flushes the buffer after the
+        flush interval (or straight away if it is larger than out_maxsize).
+        """
+        while True:
+            self._outwake.acquire()
+            if self._outsize < self.out_maxsize:
+                time.sleep(self.out_interval)
+
+            #wait for the console to catch up
+            while self._output_behind():
+                self._outcredit.wait(0.1)
+                self._outcredit.clear()
+
+            self.flush_output()
 
     def redirect_stdio(self):
         """
@@ -773,6 +1520,41 @@ class Engine(MBClient):
         """ 
         pass
 
+    def clone(self, englabel=None):
+        """
+        Fork the engine process into a new engine node which connects to the 
+        message bus with a copy of the user namespace. Returns the new engine 
+        node name.
+
+        Only engines without a gui mainloop can be safely forked so this is 
+        implemented by the pyEngine.
+        """
+        raise Exception('Engine type does not support cloning: '+self.engtype)
+
+    def new_namespace(self, englabel=None):
+        """
+        Create a namespace engine hosted by this engine's process; a new engine
+        node with its own user namespace which shares the imported modules and 
+        runs commands one at a time with the other engines in the process.
+        Returns the new engine node name.
+
+        Commands are run by the process engine's mainloop so this is 
+        implemented by the pyEngine.
+        """
+        raise Exception('Engine type does not support namespace engines: '+self.engtype)
+
+    def find_engine(self, userdict):
+        """
+        Returns the engine in this process whose user namespace is the 
+        dictionary given (used by engine tasks to find the engine they are run
+        by, see eng_tasks).
+        """
+        return self
+
+    def get_node_name(self):
+        """Returns the message bus node name to use for this engine"""
+        return 'Engine.'+str(os.getpid())
+
     def get_welcome(self):
         """Return the standard part of engines welcome message"""
         ver = sys.version
@@ -807,6 +1589,20 @@ class Engine(MBClient):
             #node was controlling console
             self.release(self.console)
 
+    def msg_shm_enable(self, msg):
+        """
+        The managing console has (or has not) mapped the shared memory ring.
+        """
+        flag, = msg.get_data()
+        if (flag is False) or (self._shm is None):
+            self.close_shared_ring()
+            return False
+        with self._sendlock:
+            self.flush_output()
+            with self._ringlock:
+                self._ring = self._shm
+        return True
+
     def msg_push(self, msg):
         """Process a line from the console"""
         line, = msg.get_data()
@@ -878,7 +1674,7 @@ class Engine(MBClient):
                 result = self.evaluate(expression)
         except Exception as e:
             return e
-        return result
+        return eng_buffers.pack(result)
 
     def msg_run_task(self, msg):
         """Run an pre-registered engine task and return the result"""
@@ -890,23 +1686,149 @@ class Engine(MBClient):
             taskname,args,kwargs = msg.data
             level = None
 
-        #if debugging use the debugger interfaces
         try:
-            if self.debug and self.busy:
-                result = self.debugger.run_task(taskname, args, kwargs, level)
-            else:
-                result = self.run_task(taskname, args, kwargs)
+            result = self._run_task_full(taskname, args, kwargs, level)
         except Exception as e:
             return e
+        return eng_buffers.pack(result)
+
+    def _run_task_full(self, taskname, args, kwargs, level):
+        """
+        Run a task (using the debugger interfaces if debugging) and return the
+        result, generator tasks are run in full and return a list.
+        """
+        if self.debug and self.busy:
+            result = self.debugger.run_task(taskname, args, kwargs, level)
+        else:
+            result = self.run_task(taskname, args, kwargs)
+        if isinstance(result, types.GeneratorType):
+            result = list(result)
         return result
 
+    def msg_run_task_stream(self, msg):
+        """
+        Run a pre-registered engine task returning an iterable (usually a 
+        generator) and send the items to the requesting node in CON_REPLY_CHUNK
+        messages as they are produced. A chunk is sent when it has chunksize 
+        items or STREAM_INTERVAL seconds have passed since the last chunk. 
+        Returns the number of items sent.
+
+        Only available as an ENG_REQUEST as the chunks are sent with the 
+        request id.
+        """
+        taskname, args, kwargs, level, chunksize = msg.data
+        if msg.reqid is None:
+            raise Exception('Streamed tasks must be sent as an ENG_REQUEST')
+
+        #if debugging use the debugger interfaces
+        if self.debug and self.busy:
+            result = self.debugger.run_task(taskname, args, kwargs, level)
+        else:
+            result = self.run_task(taskname, args, kwargs)
+
+        key = (msg.sender, msg.reqid)
+        self._streams.add(key)
+        nsent = 0
+        seq = 0
+        items = []
+        try:
+            t_last = time.time()
+            for item in iter(result):
+                if key in self._streams_cancelled:
+                    items = []
+                    break
+                items.append(item)
+                if ((len(items) >= chunksize) or 
+                        (time.time()-t_last >= STREAM_INTERVAL)):
+                    self.send_msg(msg.sender, eng_messages.CON_REPLY_CHUNK,
+                                (msg.reqid, seq, eng_buffers.pack(items)))
+                    nsent = nsent + len(items)
+                    seq = seq + 1
+                    items = []
+                    t_last = time.time()
+            if items:
+                self.send_msg(msg.sender, eng_messages.CON_REPLY_CHUNK,
+                                (msg.reqid, seq, eng_buffers.pack(items)))
+                nsent = nsent + len(items)
+        finally:
+            self._streams.discard(key)
+            self._streams_cancelled.discard(key)
+        return nsent
+
+    def msg_run_batch(self, msg):
+        """
+        Run a list of tasks and/or evaluate expressions returning a list of the
+        results, an item that fails returns the exception without stopping the
+        rest of the batch.
+        """
+        #data is a list of items plus optional level argument for use with 
+        #the debugger
+        if len(msg.data)==2:
+            items, level = msg.data
+        else:
+            items, = msg.data
+            level = None
+
+        #if debugging use the debugger interfaces
+        debug = (self.debug and self.busy)
+
+        results = []
+        for item in items:
+            try:
+                if isinstance(item, basestring):
+                    #an expression to evaluate
+                    if debug:
+                        result = self.debugger.evaluate(item, level)
+                    else:
+                        result = self.evaluate(item)
+                else:
+                    #a task (taskname, args, kwargs) args/kwargs are optional
+                    taskname = item[0]
+                    args = ()
+                    kwargs = {}
+                    if len(item)>1:
+                        args = item[1]
+                    if len(item)>2:
+                        kwargs = item[2]
+                    result = self._run_task_full(taskname, args, kwargs,
+                                                    level)
+            except Exception as e:
+                result = e
+            results.append(result)
+        return eng_buffers.pack(results)
+
+    def _send_ring_reply(self, reqid, result):
+        """
+        Send a request result via the shared memory ring if it is larger than
+        shm_threshold. Returns False if the result should be sent as a message.
+        """
+        try:
+            data = cPickle.dumps((reqid, result), cPickle.HIGHEST_PROTOCOL)
+        except:
+            return False
+        if len(data) < self.shm_threshold:
+            return False
+
+        #the result does not wait for output waiting to be sent
+        with self._ringlock:
+            if self._ring is None:
+                return False
+            if self._ring.write(eng_shm.SHM_REPLY, data) is False:
+                return False
+        self._notify_ring()
+        return True
+
     def msg_register_task(self, msg):
         """Register a new task with the engine"""
-        #data is name and marshalled code object
+        #data is marshalled code object and optional replace flag
         s = msg.data[0]
+        if len(msg.data)==2:
+            replace = msg.data[1]
+        else:
+            replace = False
         c = marshal.loads(s)
         task = types.FunctionType(c,{'__builtins__':__builtins__},None)
-        result = self.register_task(task)
+        result = self.register_task(task, replace)
         return result
 
     def msg_get_tasks(self, msg):
@@ -920,6 +1842,120 @@ class Engine(MBClient):
         cmd = types.FunctionType(code,{'__builtins__':__builtins__},None)
         __builtin__.__dict__[name] = cmd
         return True
+
+    def msg_pmap_chunk(self, msg):
+        """
+        Run a parallel map function over a chunk of items (this engine is a 
+        helper, see eng_pmap)
+        """
+        return eng_pmap.run_chunk(self, msg.get_data())
+
+    def msg_output_ack(self, msg):
+        """
+        Message handler for ENG_OUTPUT_ACK
+        """
+        nchars, = msg.get_data()
+        with self._outlock:
+            self._out_unacked = max(0, self._out_unacked-nchars)
+        self._outcredit.set()
+
+    def msg_stream_cancel(self, msg):
+        """
+        Message handler for ENG_STREAM_CANCEL
+        """
+        reqid, = msg.get_data()
+        key = (msg.get_from(), reqid)
+        if key in self._streams:
+            self._streams_cancelled.add(key)
+
+    def msg_resolve(self, msg):
+        """
+        Message handler for ENG_RESOLVE
+        """
+        #data can have optional level argument for use with debugger
+        if len(msg.data)==2:
+            address, level = msg.data
+        else:
+            address, = msg.data
+            level = None
+
+        try:
+            if self.debug and self.busy:
+                name,frame,globals,locals = self.debugger.get_scope(level)
+                scope = id(frame)
+            else:
+                globals = locals = self._userdict
+                scope = None
+            return self.handles.resolve(address, globals, locals, scope)
+        except Exception as e:
+            return e
+
+    def msg_clone(self, msg):
+        """
+        Message handler for ENG_CLONE
+        """
+        englabel, = msg.get_data()
+        return self.clone(englabel)
+
+    def msg_new_namespace(self, msg):
+        """
+        Message handler for ENG_NEW_NAMESPACE
+        """
+        englabel, = msg.get_data()
+        return self.new_namespace(englabel)
+
+    def msg_deadline(self, msg):
+        """
+        A blocking request with a timeout, handle the data using the handler for
+        the subject given and return the result.
+        """
+        timeout, subject, data = msg.get_data()
+        return self._handle_request(msg.get_from(), subject, data, timeout)
+
+    def msg_request(self, msg):
+        """
+        A non-blocking request, handle the data using the handler for the 
+        subject given and send the result back in a CON_REPLY message.
+        """
+        #data has an optional timeout and scheduler queue name
+        reqdata = msg.get_data()
+        reqid, subject, data = reqdata[:3]
+        timeout = None
+        queue = eng_scheduler.QUEUE_INTERACTIVE
+        if len(reqdata)>3:
+            timeout = reqdata[3]
+        if len(reqdata)>4:
+            queue = reqdata[4]
+        sender = msg.get_from()
+
+        #tasks/evaluations run on a worker thread for the queue
+        if (self.use_scheduler is True) and (subject in SCHEDULED_REQUESTS):
+            self.scheduler.submit(queue, self._run_request, sender, reqid, 
+                                    subject, data, timeout)
+        else:
+            self._run_request(sender, reqid, subject, data, timeout)
+
+    def _run_request(self, sender, reqid, subject, data, timeout):
+        """
+        Handle a non-blocking request and send the result back to the sender.
+        """
+        result = self._handle_request(sender, subject, data, timeout, reqid)
+
+        #large results to the managing console go via the shared memory ring
+        if (self._ring is not None) and (sender==self.console):
+            if self._send_ring_reply(reqid, result) is True:
+                return
+
+        try:
+            self.send_msg(sender, eng_messages.CON_REPLY, (reqid, result))
+        except:
+            #result could not be sent (unpicklable?) - send an error instead
+            log.exception('Could not send request reply')
+            err = Exception('Could not send result for: '+str(subject))
+            try:
+                self.send_msg(sender, eng_messages.CON_REPLY, (reqid, err))
+            except:
+                pass
     
 #-------------------------------------------------------------------------------
 # PTK engine mixin class - adds remote engine functionaility via a 2nd MsgChannel
@@ -1053,4 +2089,5 @@ class Engine(MBClient):
 #    def msg_remote_toggle(self, msg):
 #        #create a remote channel
 #        pass
-#
\ No newline at end of file
+#
+
@@ -19,15 +19,24 @@ class PseudoEvent():
     engine. This prevents the readline/readlines and debugger from blocking
     when waiting for user input.
 
-    This calls the doyield function and sleeps until the event is set.
+    If the engine was given an event loop class, wait runs a nested event loop
+    which set() exits (via the callafter function so it can be called from any
+    thread) - the GUI keeps running and the wait ends as soon as the event is
+    set without polling. Otherwise this calls the doyield function and sleeps
+    until the event is set.
     """
     def __init__(self, eng):
         self._eng = eng
         self._doyield = eng._doyield
+        self._eventloop = eng._eventloop
+        self._callafter = eng._callafter
         self._set = False
+        self._loop = None           #nested event loop running in wait
 
     def set(self):
         self._set = True
+        if self._eventloop is not None:
+            self._callafter(self._wake)
 
     def clear(self):
         self._set = False
@@ -36,15 +45,31 @@ class PseudoEvent():
         if timeout is not None:
             raise NotImplementedError('Timeout not implemented')
         log.debug('waiting: '+str(self._doyield))
+        if self._eventloop is None:
+            while (self._set is False) and (self._eng._stop is False):
+                self._doyield()
+                time.sleep(0.05)
+            return
+
         while (self._set is False) and (self._eng._stop is False):
-            self._doyield()
-            time.sleep(0.05)
+            self._loop = self._eventloop()
+            try:
+                self._loop.Run()
+            finally:
+                self._loop = None
+
+    def _wake(self):
+        """Exit the nested event loop (called in the GUI thread)"""
+        if (self._loop is not None) and self._loop.IsRunning():
+            self._loop.Exit()
 
 #-------------------------------------------------------------------------------
 class InternalEngine(Engine):
     engtype = 'Internal'
+    use_scheduler = False   #requests must run in the GUI thread
 
-    def __init__(self, userdict={}, doyield=None, timeout=10):
+    def __init__(self, userdict={}, doyield=None, timeout=10, eventloop=None,
+                    callafter=None):
         """
         Create an internal engine object.
 
@@ -52,18 +77,30 @@ class InternalEngine(Engine):
         doyield     -   A callable to yield to a running mainloop (i.e. wx.Yield)
                         Used to allow the GUI to update and return stdinput and
                         ensure message are sent in the correct order.
+        eventloop   -   Event loop class (i.e. wx.EventLoop) used to wait for
+                        user input in a nested event loop instead of polling 
+                        with doyield, or None.
+        callafter   -   A thread safe callable to run a function in the GUI 
+                        thread (i.e. wx.CallAfter), needed with eventloop.
         """        
         #call base class init
         Engine.__init__(self, englabel='Internal', userdict=userdict)
 
         #store reference to the user supplied callables
         self._doyield = doyield
+        self._eventloop = eventloop
+        self._callafter = callafter
 
         #for internal engines we need to replace the readevent and debugger
         #resume events and the send_msg/publish_msg methods to allow the GUI 
         #interface a chance to run
         self._readevent = PseudoEvent(self)
 
+        #the console writes (and acknowledges) the output in the GUI thread 
+        #that also runs the user code, so it cannot catch up while code is
+        #running - do not wait for it (see _output_behind)
+        self.out_highwater = sys.maxint
+
     #---------------------------------------------------------------------------
     def run_code(self,code):
         """
@@ -111,6 +148,13 @@ class InternalEngine(Engine):
         self.write_stderr('Debugger is not available in Internal engine')
         return False
 
+    def _output_behind(self):
+        """
+        Overloaded flow control check - the console cannot acknowledge output
+        while user code is running in the GUI thread so never wait for it.
+        """
+        return False
+
     #---------------------------------------------------------------------------
     def on_disconnect(self):
         """
@@ -0,0 +1,129 @@
+"""
+NamespaceEngine:
+
+A lightweight engine hosted by a pyEngine process. Each namespace engine is a
+separate engine node (and console page) with its own user namespace but shares
+the process, and so the imported modules, with the pyEngine that created it
+(see pyEngine.new_namespace) and any other namespace engines it hosts.
+
+- Commands are passed to the host's mainloop and run one at a time; a command
+  waits while another engine in the process is running (or paused in the
+  debugger).
+- While a command runs the standard streams are redirected to the namespace
+  engine and __main__._engine refers to it, so builtin commands (view, clear
+  etc) work as in a process engine.
+- Closing the process (kill) closes all engines in it. The process exits when
+  the host and all the namespace engines have disconnected.
+"""
+#---Logging---------------------------------------------------------------------
+import logging
+log = logging.getLogger(__name__)
+
+#-------------------------------------------------------------------------------
+import os
+import sys
+import __main__
+
+from engine import Engine
+import eng_messages
+
+class NamespaceEngine(Engine):
+    engtype = 'PTK.ns'
+    hosted = True
+
+    def __init__(self, host, nsid, englabel=None, timeout=10):
+        """
+        Create a namespace engine hosted by the pyEngine given.
+            host    -   the pyEngine running the process mainloop
+            nsid    -   number of the namespace in the process (used in the
+                        node name)
+        """
+        self.host = host
+        self.nsid = nsid
+        Engine.__init__(self, englabel, {}, timeout)
+
+    #---overload base methods---------------------------------------------------
+    def get_node_name(self):
+        """Returns the message bus node name to use for this engine"""
+        return 'Engine.'+str(os.getpid())+'.'+str(self.nsid)
+
+    def run_code(self, code):
+        """
+        Run some compiled code as the user - queued in the host's mainloop.
+        """
+        self.host.run_hosted(self, code)
+
+    def stop_code(self, quiet=False):
+        """
+        Stop the running code, or discard the command if it is still waiting
+        for another engine in the process to finish.
+        """
+        if (self.busy is False) and self.host.cancel_hosted(self):
+            if quiet is False:
+                self.write_stderr('STOP: Command cancelled before it started.\n\n')
+                self.send_msg(self.console, eng_messages.CON_PROMPT,
+                                (self.prompts[0], False,))
+            return
+        Engine.stop_code(self, quiet)
+
+    def redirect_stdio(self):
+        """
+        The streams are only redirected while this engine's command runs (see
+        run_hosted_code), the host's redirection is left in place.
+        """
+        pass
+
+    def restore_stdio(self):
+        pass
+
+    def new_namespace(self, englabel=None):
+        """Create another namespace engine in this process"""
+        return self.host.new_namespace(englabel)
+
+    def find_engine(self, userdict):
+        """
+        Returns the engine in this process whose user namespace is the
+        dictionary given.
+        """
+        return self.host.find_engine(userdict)
+
+    def on_disconnect(self):
+        """
+        The engine node disconnected from the message bus.
+        """
+        Engine.on_disconnect(self)
+        self.stop_code(quiet=True)
+        self.host.remove_namespace(self)
+
+    def on_err_disconnect(self):
+        """
+        The engine node disconnected from the message bus.
+        """
+        Engine.on_err_disconnect(self)
+        self.stop_code(quiet=True)
+        self.host.remove_namespace(self)
+
+    def get_welcome(self):
+        """Return the engines welcome message"""
+        welcome = Engine.get_welcome(self)
+        welcome = welcome + ( "\n\nRunning as a namespace engine in the process of"
+                    " '"+str(self.host.englabel)+"' (imported modules are "
+                    "shared, commands run one at a time)\n")
+        return welcome
+
+    #---internal methods--------------------------------------------------------
+    def run_hosted_code(self, code):
+        """
+        Run the code with the standard streams redirected to this engine
+        (called in the host's mainloop).
+        """
+        old = (sys.stdin, sys.stdout, sys.stderr)
+        old_engine = __main__._engine
+        sys.stdin, sys.stdout, sys.stderr = (self._stdin, self._stdout,
+                                                self._stderr)
+        __main__._engine = self
+        try:
+            self._run_code(code)
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = old
+            __main__._engine = old_engine
@@ -3,13 +3,22 @@ pyEngine:
 
 A basic python engine for use with PTK with no gui mainloops running
 - uses a threading.Event() object to wake mainloop and run user command.
+- can be cloned by forking the process (on posix systems), the clone shares 
+unchanged memory pages with the original engine (copy-on-write).
+- can host namespace engines; further engine nodes with their own user 
+namespace in this process whose commands are run by the mainloop (see 
+ns_engine).
 """
 #---Logging---------------------------------------------------------------------
 import logging
 log = logging.getLogger(__name__)
 
 #-------------------------------------------------------------------------------
+import os
+import stat
 import threading
+import __main__
+
 from engine import Engine
 
 class pyEngine(Engine):
@@ -24,6 +33,18 @@ class pyEngine(Engine):
         self._codeevent = threading.Event() #event to indicate code to run
         self._code = None  #code object to run in mainloop as the user
         self._exit = False #exit flag
+        self._timeout = timeout
+
+        #clone request waiting for the mainloop [englabel, done event, result]
+        self._clone = None
+
+        #namespace engines hosted by this process {node name: NamespaceEngine}
+        #and the commands they are waiting to run [(engine, code)]
+        self._namespaces = {}
+        self._hosted = []
+        self._hostlock = threading.Lock()
+        self._nscount = 0
+        self._disconnected = False
 
     #---Main interface----------------------------------------------------------
     def start_main_loop(self):
@@ -43,10 +64,22 @@ class pyEngine(Engine):
             if self._exit is True:
                 break
 
-            #run code
-            self._run_code(self._code) 
-            self._code = None
+            #fork the process if a clone was requested
+            if self._clone is not None:
+                self._codeevent.clear()
+                if (self._code is not None) or self._hosted:
+                    self._codeevent.set()
+                self._fork_clone()
+                continue
+
+            #run code - this engine's command then those waiting in the hosted
+            #namespace engines
             self._codeevent.clear()
+            code = self._code
+            self._code = None
+            if code is not None:
+                self._run_code(code)
+            self._run_hosted()
 
         log.info('Mainloop ended')
 
@@ -59,16 +92,81 @@ class pyEngine(Engine):
         self._code=code 
         self._codeevent.set()
 
+    def clone(self, englabel=None):
+        """
+        Fork the engine process into a new engine node which connects to the 
+        message bus with a copy of the user namespace. Returns the new engine 
+        node name.
+
+        The fork is done by the mainloop, so the engine must not be busy.
+        """
+        if hasattr(os, 'fork') is False:
+            raise Exception('Cloning engines requires os.fork (posix only)')
+        if self._address is None:
+            raise Exception('Only engines connected to a message bus can be cloned')
+        if self.busy is True:
+            raise Exception('Engine is busy')
+        if self._clone is not None:
+            raise Exception('Engine is already being cloned')
+
+        if englabel is None:
+            englabel = str(self.englabel)+' (clone)'
+        req = [englabel, threading.Event(), None]
+        self._clone = req
+        self._codeevent.set()
+        req[1].wait()
+
+        if isinstance(req[2], Exception):
+            raise req[2]
+        return req[2]
+
+    def new_namespace(self, englabel=None):
+        """
+        Create a namespace engine hosted by this process; a new engine node 
+        with its own user namespace which connects to the message bus. Returns
+        the new engine node name.
+        """
+        if self._address is None:
+            raise Exception('Only engines connected to a message bus can host namespaces')
+        from ns_engine import NamespaceEngine
+
+        with self._hostlock:
+            self._nscount = self._nscount + 1
+            nsid = self._nscount
+        if englabel is None:
+            englabel = str(self.englabel)+' ['+str(nsid)+']'
+
+        eng = NamespaceEngine(self, nsid, englabel, self._timeout)
+        with self._hostlock:
+            self._namespaces[eng.name] = eng
+        host, port = self._address
+        try:
+            eng.connect(host, port)
+        except:
+            with self._hostlock:
+                self._namespaces.pop(eng.name, None)
+            raise
+        return eng.name
+
+    def find_engine(self, userdict):
+        """
+        Returns the engine in this process whose user namespace is the 
+        dictionary given.
+        """
+        for eng in self._namespaces.values():
+            if eng._userdict is userdict:
+                return eng
+        return self
+
     def on_disconnect(self):
         """
         The engine node disconnected from the message bus.
         This will wake the main loop.
         """
         Engine.on_disconnect(self)
-        log.info('Exiting process')
-        self._exit = True
         self.stop_code(quiet=True)
-        self._codeevent.set() #trigger the event to wake up the mainloop
+        self._disconnected = True
+        self._check_exit()
 
     def on_err_disconnect(self):
         """
@@ -76,13 +174,158 @@ class pyEngine(Engine):
         This will wake the main loop.
         """
         Engine.on_err_disconnect(self)
-        log.info('Exiting process')
-        self._exit = True
         self.stop_code(quiet=True)
-        self._codeevent.set() #trigger the event to wake up the mainloop
+        self._disconnected = True
+        self._check_exit()
 
     def get_welcome(self):
         """Return the engines welcome message"""
         welcome = Engine.get_welcome(self) + "\n\nRunning as an external engine process\n"
         return welcome
 
+    #---namespace engines-------------------------------------------------------
+    def run_hosted(self, eng, code):
+        """
+        Queue a command from a hosted namespace engine to be run by the 
+        mainloop.
+        """
+        with self._hostlock:
+            self._hosted.append( (eng, code) )
+        self._codeevent.set()
+
+    def cancel_hosted(self, eng):
+        """
+        Discard a command from the namespace engine given that is still waiting
+        to run, returns True if a command was discarded.
+        """
+        with self._hostlock:
+            waiting = [item for item in self._hosted if item[0] is eng]
+            for item in waiting:
+                self._hosted.remove(item)
+        return bool(waiting)
+
+    def remove_namespace(self, eng):
+        """
+        Called when a hosted namespace engine disconnects.
+        """
+        self.cancel_hosted(eng)
+        with self._hostlock:
+            self._namespaces.pop(eng.name, None)
+        self._check_exit()
+
+    #---internal methods--------------------------------------------------------
+    def _run_hosted(self):
+        """
+        Run the commands waiting in hosted namespace engines one at a time 
+        (called in the mainloop).
+        """
+        while self._exit is False:
+            with self._hostlock:
+                if self._hosted == []:
+                    return
+                eng, code = self._hosted.pop(0)
+            eng.run_hosted_code(code)
+
+    def _check_exit(self):
+        """
+        Exit the mainloop once this engine and all the namespace engines it 
+        hosts have disconnected.
+        """
+        if (self._disconnected is False) or self._namespaces:
+            return
+        log.info('Exiting process')
+        self._exit = True
+        self._codeevent.set() #trigger the event to wake up the mainloop
+
+    def _fork_clone(self):
+        """
+        Fork the process for the waiting clone request (called in the mainloop)
+        """
+        req = self._clone
+        self._clone = None
+
+        #send output now so it is not sent again by the clone
+        self.flush_output()
+
+        try:
+            r,w = os.pipe()
+            pid = os.fork()
+        except Exception as e:
+            log.exception('Failed to fork engine process')
+            req[2] = e
+            req[1].set()
+            return
+
+        if pid == 0:
+            #intermediate process - fork again so the clone is adopted by init
+            #rather than left as a zombie of this engine, then pass the pid 
+            #back and exit
+            os.close(r)
+            try:
+                pid = os.fork()
+            except:
+                os._exit(1)
+            if pid != 0:
+                os.write(w, str(pid))
+                os._exit(0)
+
+            #the clone
+            os.close(w)
+            try:
+                self._init_clone(req[0])
+            except:
+                log.exception('Failed to start cloned engine')
+                os._exit(1)
+            return
+
+        #original engine - wait for the clone pid
+        os.close(w)
+        data = os.read(r, 64)
+        os.close(r)
+        os.waitpid(pid, 0)
+        if data:
+            req[2] = 'Engine.'+data
+        else:
+            req[2] = Exception('Failed to fork engine process')
+        req[1].set()
+
+    def _init_clone(self, englabel):
+        """
+        Set up the forked process as a new engine node using the existing user
+        namespace. Only the mainloop thread exists in the new process.
+        """
+        #detach from the message bus connection and shared memory ring of the
+        #original engine, these stay open in the original process
+        self._detach_sockets()
+        if self._shm is not None:
+            self._shm.close()
+        self.restore_stdio()
+
+        #reinitialise as a new engine and connect
+        host, port = self._address
+        del __main__._engine
+        pyEngine.__init__(self, englabel, self._userdict, self._timeout)
+        self.connect(host, port)
+
+    def _detach_sockets(self):
+        """
+        Replace the sockets inherited from the original engine process with 
+        /dev/null so that closing them here does not affect the original 
+        engine and the file descriptors are not reused while the old socket 
+        objects still exist.
+        """
+        try:
+            fds = [int(fd) for fd in os.listdir('/proc/self/fd')]
+        except OSError:
+            fds = range(3, 1024)
+
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in fds:
+            if fd == devnull:
+                continue
+            try:
+                if stat.S_ISSOCK(os.fstat(fd).st_mode):
+                    os.dup2(devnull, fd)
+            except OSError:
+                pass
+        os.close(devnull)